@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from agents.context import ContextPolicy
+from agents.generator import EpisodeState, Generator
+from environments.EnvPool import EnvPool
+from prompts.Prompt import Prompt
+from utils.telemetry import NULL_TELEMETRY
+
+class AsyncGenerator(Generator):
+    """
+    Runs many independent Generator episodes concurrently against an async client (e.g. AsyncOpenAI).
+    Every episode owns its own environment and EpisodeState; only the prompt/playbook and configuration are shared.
+    With stream=True tool calls are dispatched while the response is streaming, see Generator.
+    """
+    def __init__(self, client, model, env_factory, prompt: Prompt, concurrency=8, context_policy: ContextPolicy = None, telemetry=NULL_TELEMETRY, mode="step", max_plan_moves=32, stream=False, budget=None, router=None):
+        super().__init__(client, model, None, prompt, context_policy=context_policy, telemetry=telemetry, mode=mode, max_plan_moves=max_plan_moves, stream=stream, budget=budget, router=router)
+        self.env_factory = env_factory # Callable returning a fresh environment per episode, or an EnvPool to reuse them
+        self.concurrency = concurrency
+
+    async def run_episode(self, game_environment, debug=False) -> EpisodeState:
+        """Async variant of Generator.run on the given environment, returns the finished EpisodeState."""
+        episode = self._start_episode(game_environment)
+        while episode.end_reason is None:
+            model, messages, move_budget = self._next_request(episode, debug)
+            start = time.perf_counter()
+            pending = []
+            if self.stream:
+                completion, dispatch = await self._stream_async(episode, model, messages, pending, start, move_budget, debug)
+            else:
+                completion, dispatch = await self._request(model, messages), None
+            self._finish_step(episode, completion, messages, model, pending, start, move_budget, dispatch, debug)
+        return episode
+
+    async def _stream_async(self, episode, model, messages, pending, start, move_budget, debug=False):
+        """Async variant of Generator._stream."""
+        assembler, dispatch = self._stream_start(episode, pending, start, move_budget, debug)
+        async for chunk in await self._request(model, messages, stream=True):
+            dispatch(assembler.feed(chunk))
+        return self._stream_end(assembler, dispatch, debug)
+
+    async def run_many(self, n_episodes, concurrency=None, seeds=None, debug=False):
+        """
+        Runs n_episodes episodes with at most `concurrency` of them waiting on the client at once.
+
+        Args:
+            n_episodes: Number of episodes to run.
+            concurrency: Upper bound of episodes in flight. Defaults to self.concurrency.
+            seeds: Optional list of reset seeds, one per episode.
+            debug: Print the per-step output of every episode.
+
+        Returns:
+            list: (contextMessage, steps) per episode, in episode order.
+            The prompt tokens sent per step are stored per episode in self.step_tokens, the time to the
+            first tool dispatch per step in self.time_to_action, the model per step in self.step_models and the end
+            reason in self.end_reasons.
+        """
+        if seeds is not None and len(seeds) != n_episodes:
+            raise ValueError(f"Expected {n_episodes} seeds, got {len(seeds)}")
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def episode(i):
+            async with semaphore:
+                pooled = isinstance(self.env_factory, EnvPool)
+                game_environment = self.env_factory.acquire() if pooled else self.env_factory()
+                game_environment.reset(seed=seeds[i] if seeds is not None else None)
+                try:
+                    return await self.run_episode(game_environment, debug=debug)
+                finally:
+                    if pooled:
+                        self.env_factory.release(game_environment)
+                    else:
+                        game_environment.close()
+
+        episodes = await asyncio.gather(*(episode(i) for i in range(n_episodes)))
+        self.step_tokens = [state.step_tokens for state in episodes]
+        self.time_to_action = [state.time_to_action for state in episodes]
+        self.step_models = [state.step_models for state in episodes]
+        self.end_reasons = [state.end_reason for state in episodes]
+        return [(state.contextMessage, state.steps) for state in episodes]
+
+    def run_many_sync(self, n_episodes, concurrency=None, seeds=None, debug=False):
+        """Blocking wrapper around run_many for scripts. Inside a notebook use `await run_many(...)` instead."""
+        return asyncio.run(self.run_many(n_episodes, concurrency=concurrency, seeds=seeds, debug=debug))
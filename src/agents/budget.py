@@ -0,0 +1,75 @@
+import json
+from collections import Counter
+
+CYCLE_ACTIONS = ("stop", "reprompt")
+
+class EpisodeBudget:
+    """
+    Upper bounds of one Generator episode, checked after every LLM call. None disables a bound.
+    An episode can overshoot a bound by at most one LLM call (plan mode never executes more moves than max_steps allows).
+
+    Args:
+        max_steps: Moves per episode.
+        max_prompt_tokens: Prompt tokens summed over the LLM calls of the episode.
+        max_seconds: Wall time of the episode.
+        cycle_limit: How often the same move may be tried from the same position before it counts as a cycle.
+        on_cycle: "stop" ends the episode, "reprompt" first tells the model about the cycle and only ends the
+            episode if the move is repeated cycle_limit more times.
+    """
+    def __init__(self, max_steps=None, max_prompt_tokens=None, max_seconds=None, cycle_limit=None, on_cycle="stop"):
+        if on_cycle not in CYCLE_ACTIONS:
+            raise ValueError(f"Unknown on_cycle '{on_cycle}', expected one of {CYCLE_ACTIONS}")
+        if cycle_limit is not None and cycle_limit < 2:
+            raise ValueError("cycle_limit must be at least 2")
+        self.max_steps = max_steps
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_seconds = max_seconds
+        self.cycle_limit = cycle_limit
+        self.on_cycle = on_cycle
+
+    def exceeded(self, steps, prompt_tokens, seconds):
+        """The first exceeded bound (an entry of utils.trajectory.END_REASONS), None if the episode may go on."""
+        if self.max_steps is not None and steps >= self.max_steps:
+            return "max_steps"
+        if self.max_prompt_tokens is not None and prompt_tokens >= self.max_prompt_tokens:
+            return "max_prompt_tokens"
+        if self.max_seconds is not None and seconds >= self.max_seconds:
+            return "max_seconds"
+        return None
+
+    def remaining_steps(self, steps):
+        return None if self.max_steps is None else max(0, self.max_steps - steps)
+
+
+class CycleDetector:
+    """
+    Counts (position, move) pairs of the executed moves, e.g. walking into the same wall again and again.
+    Reads the tool messages the Generator appends, so it works for single moves and executed plans alike.
+    """
+    def __init__(self, limit, start=None):
+        self.limit = limit
+        self.position = tuple(start) if start is not None else None
+        self.counts = Counter()
+        self.warned = set()
+
+    def observe(self, messages):
+        """
+        Feeds the tool messages of one LLM call.
+
+        Returns:
+            (position, move, count) of the most repeated pair that reached the limit in these messages, or None.
+        """
+        worst = None
+        for message in messages:
+            if message.get("role") != "tool":
+                continue
+            try:
+                position = tuple(json.loads(message["content"])["position"])
+            except (TypeError, ValueError, KeyError):
+                continue
+            key = (self.position, message.get("tool_name"))
+            self.counts[key] += 1
+            if self.position is not None and self.counts[key] >= self.limit and (worst is None or self.counts[key] > worst[2]):
+                worst = (*key, self.counts[key])
+            self.position = position
+        return worst
@@ -0,0 +1,79 @@
+import json
+from collections import Counter
+
+class ContextPolicy:
+    """
+    Decides which part of the Generator trajectory is sent to the model on each step.
+    The trajectory itself (contextMessage) is never modified, so the Reflector still gets all of it.
+    The default sends the whole trajectory.
+    """
+    def build(self, contextMessage):
+        return contextMessage
+
+
+class SlidingWindowContext(ContextPolicy):
+    """Sends the generator system prompt plus the last k steps (assistant message and its tool results)."""
+    def __init__(self, k=8):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+
+    def build(self, contextMessage):
+        _, recent = split_steps(contextMessage, self.k)
+        return contextMessage[:1] + recent
+
+
+class SummaryContext(SlidingWindowContext):
+    """
+    Like SlidingWindowContext, but steps that drop out of the window are folded into one compact summary
+    message of the positions visited, slips observed and moves attempted.
+    """
+    def build(self, contextMessage):
+        older, recent = split_steps(contextMessage, self.k)
+        if not older:
+            return contextMessage[:1] + recent
+        return contextMessage[:1] + [{"role": "system", "content": summarize_steps(older)}] + recent
+
+
+CONTEXT_POLICIES = {
+    "full": ContextPolicy,
+    "window": SlidingWindowContext,
+    "summary": SummaryContext,
+}
+
+
+def split_steps(contextMessage, k):
+    """Splits the trajectory after the system prompt into (older, last k steps). A step starts with an assistant message."""
+    step_starts = [i for i in range(1, len(contextMessage)) if contextMessage[i].get("role") == "assistant"]
+    if len(step_starts) <= k:
+        return [], contextMessage[1:]
+    cut = step_starts[-k]
+    return contextMessage[1:cut], contextMessage[cut:]
+
+
+def summarize_steps(messages) -> str:
+    positions = {} # Distinct positions in order of the first visit -> number of visits
+    slips = []
+    moves = Counter()
+    for message in messages:
+        if message.get("role") != "tool":
+            continue
+        moves[message.get("tool_name")] += 1
+        try:
+            result = json.loads(message["content"])
+        except (TypeError, ValueError):
+            continue
+        position = tuple(result.get("position", ()))
+        if position:
+            positions[position] = positions.get(position, 0) + 1
+        if result.get("slipped"):
+            slips.append((message.get("tool_name"), position))
+
+    lines = [f"SUMMARY OF THE {sum(moves.values())} EARLIER MOVES (older steps were folded to save context)"]
+    lines.append("Moves attempted: " + ", ".join(f"{name} x{count}" for name, count in moves.most_common()))
+    lines.append("Positions visited (row, col) x visits: " + ", ".join(f"({r},{c})x{n}" for (r, c), n in positions.items()))
+    if slips:
+        lines.append(f"Slips observed ({len(slips)}): " + ", ".join(f"{name} ended at ({p[0]},{p[1]})" for name, p in slips if p))
+    else:
+        lines.append("Slips observed: none")
+    return "\n".join(lines)
@@ -1,12 +1,16 @@
 import json
+import time
 
 from prompts.Prompt import Prompt
+from utils.telemetry import NULL_TELEMETRY
 
 class Curator:
-    def __init__(self, client, model, prompt: Prompt):
+    def __init__(self, client, model, prompt: Prompt, telemetry=NULL_TELEMETRY, bullet_ids=None):
         self.client = client
         self.model = model
         self.prompt = prompt
+        self.telemetry = telemetry
+        self.bullet_ids = bullet_ids # Bullets shown to the model, the whole playbook if None
         
         self.TOOL_MAPPING = {
           "ADD": self.prompt.addFromPlaybook,
@@ -16,28 +20,36 @@ class Curator:
 
         
     def run(self, debug=False): 
-        contextMessage = self.prompt.getCuratorPrompt()
+        contextMessage = self.prompt.getCuratorPrompt(self.bullet_ids)
         
-        response = self.client.chat.completions.create(
+        start = time.perf_counter() if self.telemetry.enabled else 0.0
+        completion = self.client.chat.completions.create(
             model=self.model,
             messages=contextMessage,
             tools=self.prompt.getCuratorTools()
-        ).choices[0].message
+        )
+        latency = time.perf_counter() - start if self.telemetry.enabled else 0.0
+        response = completion.choices[0].message
         
         if debug:
             print(f"== Response: {response}")
             
+        tool_start = time.perf_counter() if self.telemetry.enabled else 0.0
         if response.tool_calls:
            
             if(debug):
                 print(f"== Num_Tools: {len( response.tool_calls)}")
                         
-            for tool_call in response.tool_calls:
-                tool_name = tool_call.function.name
-                tool_response = self.TOOL_MAPPING[tool_name](**(json.loads(tool_call.function.arguments))) if tool_call.function.arguments is not None else self.TOOL_MAPPING[tool_name]()
-                
-                if(debug):
-                    print(f"== Tool: {tool_name}")
-                    print(f"== Tool Parameters: {tool_call.function.arguments}")  
+            with self.prompt.transaction(): # one playbook write for all tool calls of this turn
+                for tool_call in response.tool_calls:
+                    tool_name = tool_call.function.name
+                    tool_response = self.TOOL_MAPPING[tool_name](**(json.loads(tool_call.function.arguments))) if tool_call.function.arguments is not None else self.TOOL_MAPPING[tool_name]()
+                    
+                    if(debug):
+                        print(f"== Tool: {tool_name}")
+                        print(f"== Tool Parameters: {tool_call.function.arguments}")  
+
+        if self.telemetry.enabled:
+            self.telemetry.record("curator", self.model, completion, latency, tool_calls=len(response.tool_calls or []), tool_time=time.perf_counter() - tool_start)
 
         return response.content
\ No newline at end of file
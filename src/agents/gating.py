@@ -0,0 +1,134 @@
+import json
+import re
+from collections import deque
+
+from prompts.BulletIndex import shingles
+from prompts.Prompt import Prompt
+from utils.tokens import estimate_tokens
+
+GATED_FIELDS = ("key_insight", "correct_approach")
+BULLET_LINE_TOKENS = 24 # id and counters of a rendered bullet line, see Prompt.getPlaybookAsString
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def statements(reflection, min_chars=8) -> list:
+    """
+    Sentences of the GATED_FIELDS of a reflection (single or batch), None if the reflection is not valid JSON.
+    Fragments shorter than min_chars ("Yes.", list markers) are dropped; a field without a longer sentence is
+    kept as one statement, so a short key_insight is still checked instead of silently passing the gate.
+    """
+    try:
+        reflection_obj = json.loads(reflection)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(reflection_obj, dict):
+        return None
+    sentences = []
+    for field in GATED_FIELDS:
+        text = reflection_obj.get(field)
+        if isinstance(text, str):
+            field_sentences = [sentence.strip() for sentence in _SENTENCE.split(text) if len(sentence.strip()) >= min_chars]
+            sentences += field_sentences or ([text.strip()] if text.strip() else [])
+    return sentences
+
+
+class CuratorGate:
+    """
+    Local check before every Curator call. The sentences of the reflection's key_insight and correct_approach
+    are compared with the current bullets and the last `history` reflections by shingle containment (the share
+    of a sentence's character shingles found in one bullet or earlier sentence, see prompts.BulletIndex).
+    A sentence below `threshold` is new.
+
+    Without a new sentence the Curator is skipped; the reflection's bullet_tags were already counted by
+    Prompt.setReflection. Otherwise the Curator is shown only the bullets the reflection tagged plus the
+    max_bullets bullets overlapping most with the new sentences. A reflection that is not valid JSON or has no
+    gated field always goes to the Curator with the whole playbook.
+
+    self.reviews, self.skipped and self.tokens_saved count per run. tokens_saved is estimated from the bullets
+    left out (and the trajectory and reflection of a skipped call) without rendering the curator prompt.
+    summary() includes the recent reflections, so restore() continues with the same history after a resume.
+
+    Args:
+        threshold: Containment from which a sentence counts as already known.
+        history: Number of earlier reflections a sentence is compared with.
+        max_bullets: Untagged bullets shown to the Curator; the whole playbook if it has no more bullets than that.
+    """
+    def __init__(self, threshold=0.6, history=8, max_bullets=20, shingle_size=5):
+        self.threshold = threshold
+        self.max_bullets = max_bullets
+        self.shingle_size = shingle_size
+        self._history = deque(maxlen=history) # (sentence, shingle set) of every earlier reflection
+        self._bullet_tokens = {} # bullet id -> (content, estimated tokens of its rendered line)
+        self.reviews = 0
+        self.skipped = 0
+        self.tokens_saved = 0
+
+    def review(self, prompt: Prompt):
+        """
+        Decides the Curator call for the reflection currently set on the prompt.
+
+        Returns:
+            (run, bullet_ids): run is False if the Curator can be skipped; bullet_ids are the bullets to show,
+            None for the whole playbook.
+        """
+        self.reviews += 1
+        sentences = statements(prompt.reflection)
+        if not sentences:
+            return True, None
+        sentence_shingles = [shingles(sentence, self.shingle_size) for sentence in sentences]
+        novel = [sentence for sentence, shingle_set in zip(sentences, sentence_shingles) if not self._known(prompt, sentence, shingle_set)]
+        self._history.append(list(zip(sentences, sentence_shingles)))
+        bullets = prompt.getBullets()
+        if not novel:
+            self.skipped += 1
+            self.tokens_saved += self._tokens(bullets, bullets) + estimate_tokens(prompt.getTrajectoryText()) + estimate_tokens(prompt.reflection)
+            return False, None
+        bullet_ids = self._relevant(prompt, novel)
+        if bullet_ids is not None:
+            shown = set(bullet_ids)
+            self.tokens_saved += self._tokens(bullets, [bullet_id for bullet_id in bullets if bullet_id not in shown])
+        return True, bullet_ids
+
+    def _tokens(self, bullets, bullet_ids) -> int:
+        """Estimated tokens of the rendered lines of bullet_ids, memoized per bullet content."""
+        total = 0
+        for bullet_id in bullet_ids:
+            content = bullets[bullet_id].get("content", "")
+            cached = self._bullet_tokens.get(bullet_id)
+            if cached is None or cached[0] != content:
+                cached = self._bullet_tokens[bullet_id] = (content, estimate_tokens(content) + BULLET_LINE_TOKENS)
+            total += cached[1]
+        return total
+
+    def _known(self, prompt, sentence, shingle_set):
+        if any(covered >= self.threshold for covered, _ in prompt.bullet_index.overlaps(sentence).values()):
+            return True
+        return any(len(shingle_set & earlier) >= self.threshold * len(shingle_set)
+                   for reflection in self._history for _, earlier in reflection if shingle_set)
+
+    def _relevant(self, prompt, novel):
+        """Tagged bullets plus the max_bullets bullets whose content overlaps most with the new sentences."""
+        bullets = prompt.getBullets()
+        if len(bullets) <= self.max_bullets:
+            return None
+        overlaps = prompt.bullet_index.overlaps(" ".join(novel))
+        ranked = sorted(overlaps, key=lambda bullet_id: overlaps[bullet_id][1], reverse=True)[:self.max_bullets]
+        tagged = [bullet_id for bullet_id in prompt.reflection_tags if bullet_id in bullets]
+        return list(dict.fromkeys(tagged + ranked))
+
+    def summary(self) -> dict:
+        return {
+            "reviews": self.reviews,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.reviews if self.reviews else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "history": [[sentence for sentence, _ in reflection] for reflection in self._history],
+        }
+
+    def restore(self, summary: dict):
+        self.reviews = summary.get("reviews", 0)
+        self.skipped = summary.get("skipped", 0)
+        self.tokens_saved = summary.get("tokens_saved", 0)
+        self._history.clear()
+        for sentences in summary.get("history", []):
+            self._history.append([(sentence, shingles(sentence, self.shingle_size)) for sentence in sentences])
@@ -1,68 +1,305 @@
 import json
+import time
 
+from agents.budget import CycleDetector, EpisodeBudget
+from agents.context import ContextPolicy
+from agents.routing import ModelRouter, slipped
+from agents.streaming import ToolCallAssembler
 from prompts.Prompt import Prompt
+from utils.telemetry import NULL_TELEMETRY
+from utils.tokens import estimate_tokens
+
+MODES = ("step", "plan")
+
+
+class EpisodeState:
+    """Everything one episode changes; concurrent AsyncGenerator episodes share only the Generator's configuration."""
+    def __init__(self, game_environment, contextMessage, detector):
+        self.game_environment = game_environment
+        self.contextMessage = contextMessage
+        self.detector = detector # agents.budget.CycleDetector, None without cycle limit
+        self.step_tokens = [] # Prompt tokens per LLM call
+        self.time_to_action = [] # Seconds to the first tool dispatch per LLM call (None without tool call)
+        self.step_models = [] # Model per LLM call
+        self.counter = 1 # Number of the next LLM call
+        self.steps = 0 # Moves so far
+        self.pending = [] # Tool messages of the last LLM call
+        self.retry = False # The router retries the last call with the large model
+        self.end_reason = None
+        self.run_start = time.perf_counter()
+
+
+class ToolDispatch:
+    """Executes the tool calls of one LLM call (one by one while streaming) and keeps their outcome."""
+    def __init__(self, generator, game_environment, pending, start, move_budget=None, debug=False, streamed=False):
+        self.generator = generator
+        self.game_environment = game_environment
+        self.pending = pending
+        self.start = start
+        self.move_budget = move_budget
+        self.debug = debug
+        self.streamed = streamed
+        self.isTerminated = False
+        self.failed = False
+        self.tool_time = 0.0
+        self.time_to_action = None
+
+    def __call__(self, tool_calls):
+        for tool_call in tool_calls:
+            if self.failed:
+                return
+            if self.time_to_action is None:
+                self.time_to_action = time.perf_counter() - self.start
+                if self.debug and self.streamed: # ends the line of streamed text
+                    print()
+            tool_start = time.perf_counter()
+            self.isTerminated, self.failed = self.generator._execute_tool_calls(self.game_environment, [tool_call], self.pending, self.debug, self.move_budget)
+            self.tool_time += time.perf_counter() - tool_start
+
 
 class Generator:
-    def __init__(self, client, model, game_environment, prompt: Prompt):
+    """
+    Plays one episode with the LLM: one call per move (mode="step") or per plan of moves (mode="plan").
+    stream, budget and router are optional, see agents.streaming, agents.budget and agents.routing.
+    """
+    def __init__(self, client, model, game_environment, prompt: Prompt, context_policy: ContextPolicy = None, telemetry=NULL_TELEMETRY, mode="step", max_plan_moves=32, stream=False, budget: EpisodeBudget = None, router: ModelRouter = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown generator mode '{mode}', expected one of {MODES}")
         self.client = client
         self.model = model
         self.prompt = prompt
         self.game_environment = game_environment
-        
-    def run(self, debug=False): 
-        contextMessage = self.prompt.getGeneratorPrompt(self.game_environment.get_state_description())
+        self.context_policy = context_policy or ContextPolicy() # Full trajectory by default
+        self.step_tokens = [] # Prompt tokens sent per step of the last run
+        self.telemetry = telemetry
+        self.mode = mode
+        self.max_plan_moves = max_plan_moves
+        self.stream = stream
+        self.time_to_action = [] # Seconds from request to the first tool dispatch per LLM call of the last run (None without tool call)
+        self.budget = budget or EpisodeBudget() # Unbounded by default
+        self.end_reason = None
+        self.router = router
+        self.step_models = [] # Model of every LLM call of the last run, including calls the router retried
 
-        counter = 1     
-        isTerminated = False
-        
-        while not isTerminated:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=contextMessage,
-                tools=self.prompt.getGeneratorTools()
-            ).choices[0].message
-            if debug:
-                print(f"== Step {counter} ==")
+    def _initial_prompt(self, game_environment):
+        if self.mode == "plan":
+            return self.prompt.getPlannerPrompt(game_environment.get_state_description())
+        return self.prompt.getGeneratorPrompt(game_environment.get_state_description())
+
+    def _tools(self):
+        return self.prompt.getPlannerTools() if self.mode == "plan" else self.prompt.getGeneratorTools()
+
+    def _route(self, game_environment, pending, retry, debug=False):
+        """Model of the next LLM call; pending holds the tool messages of the previous call."""
+        if self.router is None:
+            return self.model
+        model, reason = self.router.route(game_environment, slip=slipped(pending), retry=retry)
+        if(debug):
+            print(f"== Model: {model} ({reason})")
+        return model
+
+    def run(self, debug=False):
+        """Returns (contextMessage, steps); self.end_reason tells why the episode ended."""
+        episode = self._start_episode(self.game_environment)
+        self.step_tokens, self.time_to_action, self.step_models = episode.step_tokens, episode.time_to_action, episode.step_models
+        while episode.end_reason is None:
+            model, messages, move_budget = self._next_request(episode, debug)
+            start = time.perf_counter()
+            pending = []
+            if self.stream:
+                completion, dispatch = self._stream(episode, model, messages, pending, start, move_budget, debug)
+            else:
+                completion, dispatch = self._request(model, messages), None
+            self._finish_step(episode, completion, messages, model, pending, start, move_budget, dispatch, debug)
+        self.end_reason = episode.end_reason
+        return episode.contextMessage, episode.steps
+
+    def _start_episode(self, game_environment):
+        return EpisodeState(game_environment, self._initial_prompt(game_environment), self._cycle_detector(game_environment))
+
+    def _next_request(self, episode, debug=False):
+        """(model, messages, move budget) of the next LLM call of the episode."""
+        model = self._route(episode.game_environment, episode.pending, episode.retry, debug)
+        return model, self.context_policy.build(episode.contextMessage), self.budget.remaining_steps(episode.steps)
+
+    def _request(self, model, messages, stream=False):
+        """The completion request; returns a coroutine for async clients."""
+        if stream:
+            return self.client.chat.completions.create(model=model, messages=messages, tools=self._tools(), stream=True, stream_options={"include_usage": True})
+        return self.client.chat.completions.create(model=model, messages=messages, tools=self._tools())
+
+    def _finish_step(self, episode, completion, messages, model, pending, start, move_budget, dispatch=None, debug=False):
+        """Books one LLM call: its tool calls (unless streamed), metrics, trajectory messages and the end check."""
+        latency = time.perf_counter() - start
+        response = completion.choices[0].message
+        episode.step_tokens.append(self._prompt_tokens(completion, messages))
+        episode.step_models.append(model)
+        if debug:
+            print(f"== Step {episode.counter} ==")
+            print(f"== Prompt Tokens: {episode.step_tokens[-1]}")
+            if dispatch is None: # streamed text was printed as it arrived
                 print(f"== Response: {response.content}")
+        if dispatch is None:
+            dispatch = ToolDispatch(self, episode.game_environment, pending, start, move_budget, debug)
+            dispatch(response.tool_calls or [])
+        episode.time_to_action.append(dispatch.time_to_action)
+        if self.telemetry.enabled:
+            self._record(completion, latency, episode.counter, response.tool_calls, dispatch.tool_time, dispatch.time_to_action, model)
+        episode.counter += 1
+        episode.pending = pending
+        episode.retry = self.router is not None and self.router.should_retry(model, pending)
+        if episode.retry:
+            if(debug):
+                print(f"== No usable move from {model}, retrying with {self.router.large_model}")
+            return
 
-            contextMessage.append({"role": response.role, "content": response.content})
+        episode.contextMessage.append(self._assistant_message(response, model))
+        episode.contextMessage.extend(pending)
+        episode.steps += max(1, sum(1 for message in pending if message.get("role") == "tool"))
+        episode.end_reason = self._check_end(episode.contextMessage, pending, episode.steps, sum(episode.step_tokens), time.perf_counter() - episode.run_start,
+                                             episode.detector, dispatch.isTerminated, dispatch.failed, debug)
 
-            # Handle tool calls
-            if response.tool_calls:
-                
-                try:
-                    if(debug):
-                            print(f"== Num_Tools: {len( response.tool_calls)}")
-
-                    for tool_call in response.tool_calls:
-                        tool_name = tool_call.function.name
-                        tool_response = self.game_environment.ACTION_MAP[tool_name](**(json.loads(tool_call.function.arguments))) if tool_call.function.arguments is not None else self.game_environment.ACTION_MAP[tool_name]()
-                        isTerminated = tool_response["isTerminated"]
-                        contextMessage.append({
-                          "role": "tool",
-                          "tool_call_id": tool_call.id,
-                          "tool_name": tool_name,
-                          "tool_arguments": tool_call.function.arguments,
-                          "content": json.dumps(tool_response),
-                        })
-
-                        if(debug):
-                            print(f"== Tool: {tool_name}")
-                            print(f"== Tool Parameters: {tool_call.function.arguments}")  
-                            print(f'== New State:\n {tool_response["state"]}')   
-                            print("======")  
-                except Exception as e:
-                    contextMessage.append({
-                        "role": "system",
-                        "content": f"An error occurred during tool execution: {str(e)}"
-                    })
+    @staticmethod
+    def _assistant_message(response, model) -> dict:
+        """The response as trajectory message, with the reasoning of reasoning models (streamed or not) if it has any."""
+        message = {"role": response.role, "content": response.content, "model": model}
+        reasoning = getattr(response, "reasoning", None)
+        if reasoning:
+            message["reasoning"] = reasoning
+        return message
+
+    @staticmethod
+    def _start_position(game_environment):
+        env = game_environment.env.unwrapped
+        return divmod(int(env.s), env.desc.shape[1])
+
+    def _cycle_detector(self, game_environment):
+        if self.budget.cycle_limit is None:
+            return None
+        return CycleDetector(self.budget.cycle_limit, self._start_position(game_environment))
+
+    def _check_end(self, contextMessage, pending, steps, prompt_tokens, seconds, detector, isTerminated, failed, debug=False):
+        """The END_REASONS entry if the episode ends after this call, else None; a budget stop is logged in contextMessage."""
+        if failed:
+            return "error"
+        if isTerminated:
+            return "terminated"
+        reason = self.budget.exceeded(steps, prompt_tokens, seconds)
+        detail = {"max_steps": f"{steps} moves", "max_prompt_tokens": f"{prompt_tokens} prompt tokens", "max_seconds": f"{seconds:.1f}s"}.get(reason)
+        cycle = detector.observe(pending) if detector is not None else None
+        if reason is None and cycle is not None:
+            (row, col), move, count = cycle
+            detail = f"{move} tried {count} times from ({row},{col})"
+            if self.budget.on_cycle == "reprompt" and count < 2 * detector.limit:
+                if (cycle[0], move) not in detector.warned:
+                    detector.warned.add((cycle[0], move))
+                    contextMessage.append({"role": "user", "content": f"You have tried {detail} without getting anywhere. Choose a different move."})
                     if(debug):
-                        print(f"== Error occurred during tool execution! Terminating this iteration!")
-                        print(f"== {str(e)}")
+                        print(f"== Cycle: {detail}, re-prompting")
+            else:
+                reason = "cycle"
+        if reason is None:
+            return None
+        contextMessage.append({"role": "user", "content": f"EPISODE STOPPED before reaching a terminal state ({reason}: {detail}).", "end_reason": reason})
+        if(debug):
+            print(f"== Episode stopped: {reason} ({detail})")
+        return reason
+
+    def _stream(self, episode, model, messages, pending, start, move_budget, debug=False):
+        """Streams one completion and executes each tool call once it is complete; returns (completion, dispatch)."""
+        assembler, dispatch = self._stream_start(episode, pending, start, move_budget, debug)
+        for chunk in self._request(model, messages, stream=True):
+            dispatch(assembler.feed(chunk))
+        return self._stream_end(assembler, dispatch, debug)
+
+    def _stream_start(self, episode, pending, start, move_budget, debug=False):
+        if debug:
+            print("== Response (streamed): ", end="")
+        assembler = ToolCallAssembler(on_text=(lambda text: print(text, end="", flush=True)) if debug else None)
+        return assembler, ToolDispatch(self, episode.game_environment, pending, start, move_budget, debug, streamed=True)
+
+    @staticmethod
+    def _stream_end(assembler, dispatch, debug=False):
+        dispatch(assembler.finish())
+        if debug and dispatch.time_to_action is None:
+            print()
+        return assembler.completion(), dispatch
+
+    def _record(self, completion, latency, step, tool_calls, tool_time, time_to_action=None, model=None):
+        self.telemetry.record("generator", model or self.model, completion, latency, step=step, tool_calls=len(tool_calls or []), tool_time=tool_time, time_to_action=time_to_action)
+
+    @staticmethod
+    def _prompt_tokens(completion, messages) -> int:
+        """Prompt tokens reported by the provider, estimated locally if the response carries no usage."""
+        usage = getattr(completion, "usage", None)
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            return usage.prompt_tokens
+        return estimate_tokens(messages)
+
+    def _execute_tool_calls(self, game_environment, tool_calls, contextMessage, debug=False, move_budget=None):
+        """Returns (isTerminated, failed); failed if a tool raised and the episode has to end."""
+        isTerminated = False
+        try:
+            if(debug):
+                    print(f"== Num_Tools: {len(tool_calls)}")
+
+            for tool_call in tool_calls:
+                tool_name = tool_call.function.name
+                if tool_name == "execute_plan":
+                    isTerminated = self._execute_plan(game_environment, tool_call, contextMessage, debug, move_budget)
+                    continue
+                tool_response = game_environment.ACTION_MAP[tool_name](**(json.loads(tool_call.function.arguments))) if tool_call.function.arguments is not None else game_environment.ACTION_MAP[tool_name]()
+                isTerminated = tool_response["isTerminated"]
+                contextMessage.append({
+                  "role": "tool",
+                  "tool_call_id": tool_call.id,
+                  "tool_name": tool_name,
+                  "tool_arguments": tool_call.function.arguments,
+                  "content": json.dumps(tool_response),
+                })
 
-                    return contextMessage, counter
+                if(debug):
+                    print(f"== Tool: {tool_name}")
+                    print(f"== Tool Parameters: {tool_call.function.arguments}")
+                    print(f'== New State:\n {tool_response["state"]}')
+                    print("======")
+        except Exception as e:
+            contextMessage.append({
+                "role": "system",
+                "content": f"An error occurred during tool execution: {str(e)}"
+            })
+            if(debug):
+                print(f"== Error occurred during tool execution! Terminating this iteration!")
+                print(f"== {str(e)}")
+            return isTerminated, True
 
-            if isTerminated:
-                return contextMessage, counter
+        return isTerminated, False
 
-            counter+=1
\ No newline at end of file
+    def _execute_plan(self, game_environment, tool_call, contextMessage, debug=False, move_budget=None):
+        """Runs the planned moves until the position leaves the plan or the episode ends; returns isTerminated."""
+        limit = self.max_plan_moves if move_budget is None else min(self.max_plan_moves, move_budget)
+        moves = json.loads(tool_call.function.arguments or "{}").get("moves", [])[:limit]
+        if not moves:
+            raise ValueError("execute_plan needs at least one move")
+        for i, planned in enumerate(moves):
+            tool_name = planned["move"]
+            tool_response = game_environment.ACTION_MAP[tool_name]()
+            expected = planned.get("expected_position")
+            diverged = tool_response["slipped"] or (expected is not None and list(expected) != tool_response["position"])
+            contextMessage.append({
+              "role": "tool",
+              "tool_call_id": tool_call.id,
+              "tool_name": tool_name,
+              "tool_arguments": json.dumps(planned),
+              "plan_step": f"{i + 1}/{len(moves)}",
+              "content": json.dumps(tool_response),
+            })
+            if(debug):
+                print(f"== Plan Step {i + 1}/{len(moves)}: {tool_name}, expected {expected}, reached {tool_response['position']}{' (diverged)' if diverged else ''}")
+            if tool_response["isTerminated"]:
+                return True
+            if diverged:
+                if(debug):
+                    print(f"== Plan diverged after {i + 1} of {len(moves)} moves, re-planning")
+                return False
+        return False
@@ -1,18 +1,26 @@
+import time
+
 from prompts.Prompt import Prompt
+from utils.telemetry import NULL_TELEMETRY
 
 class Reflector:
-    def __init__(self, client, model, prompt: Prompt):
+    def __init__(self, client, model, prompt: Prompt, telemetry=NULL_TELEMETRY):
         self.client = client
         self.model = model
         self.prompt = prompt
+        self.telemetry = telemetry
         
     def run(self, debug=False): 
         contextMessage = self.prompt.getReflectorPrompt()
 
-        response = self.client.chat.completions.create(
+        start = time.perf_counter() if self.telemetry.enabled else 0.0
+        completion = self.client.chat.completions.create(
             model=self.model,
             messages=contextMessage
-        ).choices[0].message
+        )
+        if self.telemetry.enabled:
+            self.telemetry.record("reflector", self.model, completion, time.perf_counter() - start)
+        response = completion.choices[0].message
         if debug:
             print(f"== Response: {response.content}")
 
@@ -0,0 +1,79 @@
+import json
+from collections import deque
+from functools import lru_cache
+
+ROUTE_REASONS = ("safe", "near_hole", "slip", "invalid_tool_call")
+
+
+@lru_cache(maxsize=64)
+def _hazard_distances(rows) -> tuple:
+    """Moves from every cell to the nearest H (breadth first from all holes), row major; a large number without holes."""
+    nrow, ncol = len(rows), len(rows[0])
+    distance = [nrow * ncol] * (nrow * ncol)
+    frontier = deque()
+    for r in range(nrow):
+        for c in range(ncol):
+            if rows[r][c] == "H":
+                distance[r * ncol + c] = 0
+                frontier.append((r, c))
+    while frontier:
+        r, c = frontier.popleft()
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < nrow and 0 <= nc < ncol and distance[nr * ncol + nc] > distance[r * ncol + c] + 1:
+                distance[nr * ncol + nc] = distance[r * ncol + c] + 1
+                frontier.append((nr, nc))
+    return tuple(distance)
+
+
+def hazard_distance(desc, position) -> int:
+    """Moves from position (row major index) to the nearest hole of the map desc (gym's byte array or rows of strings)."""
+    rows = tuple("".join(cell.decode() if isinstance(cell, bytes) else cell for cell in row) for row in desc)
+    return _hazard_distances(rows)[int(position)]
+
+
+def slipped(pending) -> bool:
+    """Whether a move of the last LLM call slipped, from its tool messages."""
+    for message in pending:
+        if message.get("role") != "tool":
+            continue
+        try:
+            if json.loads(message["content"]).get("slipped"):
+                return True
+        except (TypeError, ValueError, AttributeError):
+            continue
+    return False
+
+
+class ModelRouter:
+    """
+    Model cascade of the Generator: small_model serves the calls from safe states, large_model the risky ones.
+    A state is safe if the player is at least safe_distance moves away from the nearest hole. The large model
+    also serves the call after a slip and retries a call the small model answered without a usable move
+    (missing or invalid tool call), in which case the small model's answer is dropped from the trajectory.
+
+    Args:
+        small_model: Fast, cheap model for safe states.
+        large_model: Model for states next to holes, after slips and for retries.
+        safe_distance: Minimum distance to a hole (in moves) of a safe state.
+    """
+    def __init__(self, small_model, large_model, safe_distance=2):
+        if safe_distance < 1:
+            raise ValueError("safe_distance must be at least 1")
+        self.small_model = small_model
+        self.large_model = large_model
+        self.safe_distance = safe_distance
+
+    def route(self, game_environment, slip=False, retry=False):
+        """(model, reason) of the next LLM call, reason is one of ROUTE_REASONS."""
+        if retry:
+            return self.large_model, "invalid_tool_call"
+        if slip:
+            return self.large_model, "slip"
+        env = game_environment.env.unwrapped
+        if hazard_distance(env.desc, env.s) < self.safe_distance:
+            return self.large_model, "near_hole"
+        return self.small_model, "safe"
+
+    def should_retry(self, model, pending) -> bool:
+        """Whether the answer of model has to be retried with the large model: the small model moved nowhere."""
+        return model != self.large_model and not any(message.get("role") == "tool" for message in pending)
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+
+class ToolCallAssembler:
+    """
+    Assembles a streamed chat completion (stream=True) chunk by chunk.
+    feed() returns the tool calls that became complete with this chunk, so they can be dispatched while the rest
+    of the response is still streaming. A tool call is complete once its arguments parse as JSON, a later tool call
+    starts or the stream ends (tools without parameters may stream no arguments at all).
+
+    Args:
+        on_text: Called with every content (or reasoning) delta as it arrives, e.g. to print debug output.
+    """
+    def __init__(self, on_text=None):
+        self.on_text = on_text
+        self.role = "assistant"
+        self.content = []
+        self.reasoning = []
+        self.usage = None
+        self.model = None
+        self.finish_reason = None
+        self._calls = {} # index -> {"id", "name", "arguments"}
+        self._done = set()
+
+    def feed(self, chunk):
+        self.model = getattr(chunk, "model", None) or self.model
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        completed = []
+        for choice in getattr(chunk, "choices", None) or []:
+            delta = choice.delta
+            self.role = getattr(delta, "role", None) or self.role
+            for field, parts in (("content", self.content), ("reasoning", self.reasoning)):
+                text = getattr(delta, field, None)
+                if text:
+                    parts.append(text)
+                    if self.on_text is not None:
+                        self.on_text(text)
+            for tool_delta in getattr(delta, "tool_calls", None) or []:
+                # A new index means every earlier tool call is complete
+                completed += self._complete(lambda index: index < tool_delta.index)
+                call = self._calls.setdefault(tool_delta.index, {"id": None, "name": "", "arguments": ""})
+                call["id"] = getattr(tool_delta, "id", None) or call["id"]
+                function = getattr(tool_delta, "function", None)
+                if function is not None:
+                    call["name"] += getattr(function, "name", None) or ""
+                    call["arguments"] += getattr(function, "arguments", None) or ""
+                if call["name"] and call["arguments"] and _parses(call["arguments"]):
+                    completed += self._complete(lambda index: index == tool_delta.index)
+            if getattr(choice, "finish_reason", None):
+                self.finish_reason = choice.finish_reason
+        return completed
+
+    def finish(self):
+        """Tool calls that were still open when the stream ended."""
+        return self._complete(lambda index: True)
+
+    def _complete(self, selected):
+        completed = []
+        for index in sorted(self._calls):
+            if index not in self._done and selected(index) and self._calls[index]["name"]:
+                self._done.add(index)
+                completed.append(self._tool_call(index))
+        return completed
+
+    def _tool_call(self, index):
+        call = self._calls[index]
+        return SimpleNamespace(id=call["id"] or f"call_{index}", type="function",
+                               function=SimpleNamespace(name=call["name"], arguments=call["arguments"] or None))
+
+    def message(self):
+        tool_calls = [self._tool_call(index) for index in sorted(self._calls) if self._calls[index]["name"]]
+        return SimpleNamespace(role=self.role, content="".join(self.content) or None, reasoning="".join(self.reasoning) or None, tool_calls=tool_calls or None)
+
+    def completion(self):
+        """The assembled response in the shape of a non streamed ChatCompletion."""
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(index=0, message=self.message(), finish_reason=self.finish_reason)],
+            usage=self.usage,
+        )
+
+
+def _parses(arguments):
+    try:
+        json.loads(arguments)
+    except ValueError:
+        return False
+    return True
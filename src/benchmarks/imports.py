@@ -0,0 +1,61 @@
+"""
+Import time of the packages, each measured in a fresh interpreter with `python -X importtime`.
+Reports the cumulative time of every module and its most expensive dependencies; exits with 1 if a module
+takes longer than --max-ms (e.g. to catch a heavy import that slipped in at module level).
+
+Run from src/:
+    python -m benchmarks.imports
+    python -m benchmarks.imports --modules environments.FrozenLake --max-ms 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "environments.FrozenLake",
+    "environments.EnvPool",
+    "prompts.FrozenLakePrompt",
+    "agents.generator",
+    "agents.async_generator",
+    "experiment",
+]
+
+
+def import_times(module, repeat=3):
+    """(cumulative microseconds of module, {imported module: cumulative microseconds}) of the fastest of repeat runs."""
+    best = None
+    for _ in range(repeat):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, env=env, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative)
+        if best is None or times[module] < best[0]:
+            best = (times[module], times)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--top", type=int, default=3, help="Most expensive top level dependencies shown per module")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if a module takes longer to import")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        total, times = import_times(module)
+        # Third party packages (no dot) and the repo's own modules, without the module itself
+        heavy = sorted(((us, name) for name, us in times.items() if name != module and "." not in name), reverse=True)[:args.top]
+        over = args.max_ms is not None and total / 1000 > args.max_ms
+        failed |= over
+        print(f"{module:<28} {total / 1000:>8.1f}ms{'  OVER BUDGET' if over else ''}   " + ", ".join(f"{name} {us / 1000:.1f}ms" for us, name in heavy))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
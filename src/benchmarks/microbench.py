@@ -0,0 +1,229 @@
+"""
+Microbenchmarks of the Prompt/playbook and environment hot paths on synthetic playbooks (10 to 10,000 bullets)
+and maps (4x4 to 64x64), without network or LLM. Every case reports operations per second (best of --repeat
+timed runs of at least --min-time seconds) and the peak memory allocated by one operation (tracemalloc).
+
+--save writes the results as baseline, --compare fails (exit code 1) if a case got slower by more than
+--threshold or its peak memory grew by more than --threshold (and at least 64 KiB) against the baseline.
+Baselines are machine specific, save one before the change and compare after it on the same machine.
+
+Run from src/:
+    python -m benchmarks.microbench --save
+    python -m benchmarks.microbench --compare --threshold 0.25
+    python -m benchmarks.microbench --only playbook --bullets 10 1000 --store sqlite
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from environments.FrozenLake import FrozenLake, Move
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+from prompts.PlaybookStore import JsonPlaybookStore, SqlitePlaybookStore
+
+BASELINE_PATH = "benchmarks/microbench_baseline.json"
+WORDS = ("hole edge slip slippery goal wall corner row column path avoid risk safe left right up down probability "
+         "perpendicular retry detour boundary adjacent move plan position distance trajectory frozen tile").split()
+MOVES = list(Move)
+
+
+def synthetic_content(rng, words=18):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + f" #{rng.getrandbits(32):08x}"
+
+
+def synthetic_playbook(n_bullets, seed=0, sections=8):
+    rng = random.Random(seed)
+    playbook = {"sections": [{"title": f"Section {i}", "bulletpoints": []} for i in range(sections)]}
+    for i in range(n_bullets):
+        playbook["sections"][i % sections]["bulletpoints"].append({
+            "id": f"{i:08x}-0000-4000-8000-{rng.getrandbits(48):012x}",
+            "content": synthetic_content(rng),
+            "helpful": rng.randrange(5),
+            "harmful": rng.randrange(3),
+        })
+    return playbook
+
+
+def synthetic_map(size, seed=0, hole_rate=0.15):
+    """Square map with random holes and a hole free staircase path from S (top left) to G (bottom right)."""
+    rng = random.Random(seed)
+    grid = [["H" if rng.random() < hole_rate else "F" for _ in range(size)] for _ in range(size)]
+    for i in range(size):
+        grid[i][i] = "F"
+        if i + 1 < size:
+            grid[i][i + 1] = "F"
+    grid[0][0], grid[-1][-1] = "S", "G"
+    return ["".join(row) for row in grid]
+
+
+def measure(operation, min_time, repeat):
+    """(operations per second, peak bytes of one operation). operation() runs one operation."""
+    best = 0.0
+    for _ in range(repeat):
+        count, start = 0, time.perf_counter()
+        while True:
+            operation()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, count / elapsed)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        operation()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return best, max(0, peak)
+
+
+def make_prompt(workdir, n_bullets, store):
+    playbook = synthetic_playbook(n_bullets)
+    if store == "sqlite":
+        path = os.path.join(workdir, f"playbook_{n_bullets}.sqlite")
+        SqlitePlaybookStore(path).save(playbook)
+        prompt_store = SqlitePlaybookStore(path)
+    else:
+        path = os.path.join(workdir, f"playbook_{n_bullets}.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(playbook, file)
+        prompt_store = JsonPlaybookStore(path)
+    return FrozenLakePrompt(playbook_path=path, store=prompt_store)
+
+
+def playbook_cases(n_bullets, store, workdir):
+    """(name, operation) of the playbook hot paths on a playbook of n_bullets, in run order."""
+    prompt = make_prompt(workdir, n_bullets, store)
+    rng = random.Random(1)
+    ids = list(prompt.getBullets())
+    added = []
+
+    def set_reflection():
+        tags = [{"id": rng.choice(ids), "tag": rng.choice(["helpful", "harmful"])} for _ in range(10)]
+        prompt.setReflection(json.dumps({"key_insight": "benchmark", "bullet_tags": tags}))
+
+    def add():
+        added.append(prompt.addFromPlaybook(f"Section {rng.randrange(8)}", synthetic_content(rng)))
+
+    def modify():
+        prompt.modifyFromPlaybook(rng.choice(ids), synthetic_content(rng))
+
+    def remove():
+        # Removes the bullets the add case created, re-adding one whenever they run out
+        if not added:
+            add()
+        prompt.removeFromPlaybook(added.pop())
+
+    return [
+        ("getPlaybookAsString", prompt.getPlaybookAsString),
+        ("setReflection", set_reflection),
+        ("addFromPlaybook", add),
+        ("modifyFromPlaybook", modify),
+        ("removeFromPlaybook", remove),
+        ("writePlaybookToFile", prompt.writePlaybookToFile),
+        ("refreshPlaybook", prompt.refreshPlaybook),
+        ("readPlaybookFromFile", prompt.readPlaybookFromFile),
+    ]
+
+
+def environment_cases(size, engine):
+    game = FrozenLake.from_map(synthetic_map(size), success_rate=0.7, engine=engine)
+    game.reset(seed=0)
+    rng = random.Random(2)
+
+    def execute_action():
+        result = game.execute_action(rng.choice(MOVES))
+        if result["isTerminated"]:
+            game.reset(seed=rng.getrandbits(16))
+
+    return game, [
+        ("get_state_description", game.get_state_description),
+        ("execute_action", execute_action),
+    ]
+
+
+def run(args):
+    results = {}
+
+    def record(name, operation):
+        ops, peak = measure(operation, args.min_time, args.repeat)
+        results[name] = {"ops_per_second": ops, "peak_bytes": peak}
+        print(f"{name:<52} {ops:>14,.1f} ops/s {peak / 1024:>12,.1f} KiB")
+
+    if args.only in (None, "playbook"):
+        workdir = tempfile.mkdtemp(prefix="microbench_")
+        try:
+            for n_bullets in args.bullets:
+                for case, operation in playbook_cases(n_bullets, args.store, workdir):
+                    record(f"playbook/{args.store}/{n_bullets}/{case}", operation)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if args.only in (None, "environment"):
+        for engine in args.engines:
+            for size in args.map_sizes:
+                game, cases = environment_cases(size, engine)
+                try:
+                    for case, operation in cases:
+                        record(f"environment/{engine}/{size}x{size}/{case}", operation)
+                finally:
+                    game.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of the cases that regressed against the baseline, with the reason."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ops_per_second"] < base["ops_per_second"] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_second']:,.1f} ops/s, baseline {base['ops_per_second']:,.1f}")
+        grown = result["peak_bytes"] - base["peak_bytes"]
+        if grown > 64 * 1024 and result["peak_bytes"] > base["peak_bytes"] * (1 + threshold):
+            regressions.append(f"{name}: peak {result['peak_bytes'] / 1024:,.1f} KiB, baseline {base['peak_bytes'] / 1024:,.1f} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["playbook", "environment"], default=None)
+    parser.add_argument("--bullets", nargs="+", type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--map-sizes", nargs="+", type=int, default=[4, 8, 16, 32, 64])
+    parser.add_argument("--engines", nargs="+", choices=["gym", "tabular"], default=["gym", "tabular"])
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, the best counts")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Save the results as baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail on regressions against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown (and memory growth)")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline): # keep the cases this run skipped
+            with open(args.baseline, "r", encoding="utf-8") as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=4)
+    sys.exit(1 if args.compare and regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
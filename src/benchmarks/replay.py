@@ -0,0 +1,67 @@
+"""
+Record/replay check of the response cache: runs --iterations of the learning loop with fixed seeds against the
+offline client through a CachedClient (read_through) into a fresh cache, then runs them again from the same
+initial playbook with cache_only. Every request of the replay has to hit the cache; exits with 1 on the first miss.
+Anything that makes the prompts of a seeded run differ between runs (random ids, timestamps, ...) shows up here.
+
+Run from src/:
+    python -m benchmarks.replay --iterations 6 --map small_map
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from clients.CachedClient import CACHE_ONLY, READ_THROUGH, CacheMissError, CachedClient
+from clients.OfflineClient import OfflineClient
+from environments.FrozenLake import FrozenLake
+from environments.maps import MAPS
+from experiment import Experiment
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+
+
+def run_loop(client, map_name, iterations, seed, playbook_path, workdir):
+    """The learning loop on a fresh copy of the playbook, returns the final playbook."""
+    run_playbook = os.path.join(workdir, "playbook.json")
+    if os.path.exists(playbook_path):
+        shutil.copy(playbook_path, run_playbook)
+    elif os.path.exists(run_playbook):
+        os.remove(run_playbook)
+    game = FrozenLake.from_map(MAPS[map_name])
+    try:
+        experiment = Experiment(client, game, FrozenLakePrompt(playbook_path=run_playbook))
+        experiment.run(iterations, seed=seed)
+        return experiment.prompt.playbook
+    finally:
+        game.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=6)
+    parser.add_argument("--map", dest="map_name", choices=sorted(MAPS), default="small_map")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--playbook", default="res/playbook.json", help="Initial playbook of both runs (not modified)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    cache_dir = os.path.join(workdir, "cache")
+    try:
+        recorder = CachedClient(OfflineClient(seed=args.seed), cache_dir=cache_dir, mode=READ_THROUGH)
+        recorded = run_loop(recorder, args.map_name, args.iterations, args.seed, args.playbook, workdir)
+        print(f"record: {recorder.stats()['misses']} requests stored")
+        replayer = CachedClient(OfflineClient(seed=args.seed), cache_dir=cache_dir, mode=CACHE_ONLY)
+        try:
+            replayed = run_loop(replayer, args.map_name, args.iterations, args.seed, args.playbook, workdir)
+        except CacheMissError as e:
+            print(f"replay: MISS after {replayer.hits} hits ({e})")
+            sys.exit(1)
+        print(f"replay: {replayer.hits} hits, 0 misses, same final playbook: {replayed == recorded}")
+        sys.exit(0 if replayed == recorded else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Consistency check of a playbook shared by several workers: two prompts on one SqlitePlaybookStore (as parallel
+runner workers use it) edit the playbook, every check compares what each prompt holds with the database.
+Exits with 1 if a check fails.
+
+Run from src/:
+    python -m benchmarks.shared_playbook
+"""
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+from prompts.PlaybookStore import SqlitePlaybookStore
+
+
+def stored_ids(path) -> set:
+    store = SqlitePlaybookStore(path)
+    try:
+        return {bp["id"] for sec in store.load()["sections"] for bp in sec["bulletpoints"]}
+    finally:
+        store.close()
+
+
+def check_same_add(path):
+    """Both workers ADD the same bullet: two distinct ids, both stored."""
+    a, b = FrozenLakePrompt(store=SqlitePlaybookStore(path)), FrozenLakePrompt(store=SqlitePlaybookStore(path))
+    id_a = a.addFromPlaybook("Hazards", "Keep one column away from the holes on row two.")
+    id_b = b.addFromPlaybook("Hazards", "Keep one column away from the holes on row two.")
+    ids = stored_ids(path)
+    return id_a != id_b and {id_a, id_b} <= ids and id_b in b.getBullets()
+
+
+def check_save_keeps_other_writers(path):
+    """A worker restores an older playbook (checkpoint resume): the bullets and counters the other worker committed stay."""
+    a, b = FrozenLakePrompt(store=SqlitePlaybookStore(path)), FrozenLakePrompt(store=SqlitePlaybookStore(path))
+    kept = a.addFromPlaybook("Hazards", "Keep one column away from the holes on row two.")
+    checkpoint = copy.deepcopy(a.playbook)
+    b.refreshPlaybook()
+    added = b.addFromPlaybook("Goal", "Approach the goal from above, never along the bottom edge.")
+    b.setReflection(json.dumps({"bullet_tags": [{"id": kept, "tag": "helpful"}]}))
+    a.setPlaybook(checkpoint)
+    a.refreshPlaybook()
+    return {kept, added} <= stored_ids(path) and a.getBullets()[kept]["helpful"] == 1
+
+
+def check_rollback(path):
+    """A curator turn fails half way: the store rolls back and the prompt holds the stored playbook again."""
+    prompt = FrozenLakePrompt(store=SqlitePlaybookStore(path))
+    kept = prompt.addFromPlaybook("Hazards", "Keep one column away from the holes on row two.")
+    try:
+        with prompt.transaction():
+            prompt.addFromPlaybook("Goal", "Approach the goal from above, never along the bottom edge.")
+            prompt.modifyFromPlaybook(kept, "Changed in the failed turn.")
+            raise RuntimeError("tool failed")
+    except RuntimeError:
+        pass
+    return set(prompt.getBullets()) == stored_ids(path) == {kept} and prompt.getBullets()[kept]["content"].startswith("Keep")
+
+
+CHECKS = [
+    ("same ADD from two workers", check_same_add),
+    ("full save next to another writer", check_save_keeps_other_writers),
+    ("rollback of a failed transaction", check_rollback),
+]
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="shared_playbook_")
+    failed = 0
+    try:
+        for i, (name, check) in enumerate(CHECKS):
+            try:
+                ok = check(os.path.join(workdir, f"playbook_{i}.sqlite"))
+            except Exception as e:
+                ok = False
+                name += f" ({type(e).__name__}: {e})"
+            failed += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
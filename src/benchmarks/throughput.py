@@ -0,0 +1,166 @@
+"""
+End-to-end throughput benchmark of the Generator -> Reflector -> Curator loop against the offline client.
+Model latency is injected by the OfflineClient and subtracted from the wall time of every stage,
+the remainder is the overhead of the framework itself (prompt building, env stepping, playbook IO, ...).
+
+Run from src/:
+    python -m benchmarks.throughput --iterations 20 --map big_map --latency 0.05
+    python -m benchmarks.throughput --latency 0.05 --cascade 0.25   # small model at a quarter of the latency
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from agents.budget import CYCLE_ACTIONS, EpisodeBudget
+from agents.context import CONTEXT_POLICIES
+from agents.gating import CuratorGate
+from agents.routing import ModelRouter
+from clients.OfflineClient import OfflineClient
+from environments.FrozenLake import FrozenLake
+from environments.maps import MAPS
+from experiment import Experiment, STAGES
+from pipeline import PipelinedExperiment
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+from prompts.PlaybookRetriever import PlaybookRetriever
+
+SMALL_MODEL = "offline/small"
+LARGE_MODEL = "offline/large"
+
+
+def run_benchmark(iterations=10, map_name="small_map", latency=0.0, policy="shortest_path", success_rate=0.7, seed=0, playbook_path="res/playbook.json", context="full", batch_size=1, generator_mode="step", stream=False, budget=None, retriever=None, max_staleness=None, cascade=None, curator_gate=False):
+    router = None
+    if cascade is not None: # the small model answers in cascade times the latency of the large one
+        router = ModelRouter(SMALL_MODEL, LARGE_MODEL)
+        latency = (lambda base: lambda request: base * cascade if request["model"] == SMALL_MODEL else base)(latency)
+    client = OfflineClient(policy=policy, latency=latency, seed=seed)
+    game = FrozenLake.from_map(MAPS[map_name], success_rate=success_rate)
+
+    # Work on a copy, the benchmark must not touch the real playbook
+    workdir = tempfile.mkdtemp(prefix="throughput_")
+    bench_playbook = os.path.join(workdir, "playbook.json")
+    if os.path.exists(playbook_path):
+        shutil.copy(playbook_path, bench_playbook)
+    prompt = FrozenLakePrompt(playbook_path=bench_playbook, retriever=retriever)
+    options = dict(model=LARGE_MODEL, context_policy=CONTEXT_POLICIES[context](), batch_size=batch_size, generator_mode=generator_mode, generator_stream=stream, budget=budget, router=router, curator_gate=CuratorGate() if curator_gate else None)
+    if max_staleness is not None:
+        return _run_pipelined(PipelinedExperiment(client, game, prompt, max_staleness=max_staleness, **options), iterations, seed, game, workdir)
+    experiment = Experiment(client, game, prompt, **options)
+
+    stage_calls = {
+        "generator": lambda i: experiment.generate(seed=seed + i * batch_size),
+        "reflector": lambda i: experiment.reflect(),
+        "curator": lambda i: experiment.curate(),
+    }
+    wall = {stage: 0.0 for stage in STAGES}
+    model = {stage: 0.0 for stage in STAGES}
+    calls = {stage: 0 for stage in STAGES}
+
+    start = time.perf_counter()
+    try:
+        for i in range(iterations):
+            for stage in STAGES:
+                model_before, calls_before = client.model_time, client.calls
+                stage_start = time.perf_counter()
+                stage_calls[stage](i)
+                wall[stage] += time.perf_counter() - stage_start
+                model[stage] += client.model_time - model_before
+                calls[stage] += client.calls - calls_before
+    finally:
+        game.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    total = time.perf_counter() - start
+
+    return _result(experiment, iterations, total, {
+        stage: {
+            "wall": wall[stage],
+            "model": model[stage],
+            "overhead": wall[stage] - model[stage],
+            "calls": calls[stage],
+        } for stage in STAGES
+    })
+
+
+def _run_pipelined(experiment, iterations, seed, game, workdir):
+    """The stages overlap, so only their busy time is reported (model time and calls are not split per stage)."""
+    start = time.perf_counter()
+    try:
+        experiment.run(iterations, seed=seed)
+    finally:
+        game.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    total = time.perf_counter() - start
+    result = _result(experiment, iterations, total, {stage: {"wall": sum(experiment.timings[stage]), "model": None, "overhead": None, "calls": None} for stage in STAGES})
+    result["staleness"] = dict(Counter(experiment.staleness))
+    return result
+
+
+def _result(experiment, iterations, total, stages):
+    return {
+        "iterations": iterations,
+        "total_seconds": total,
+        "iterations_per_second": iterations / total if total > 0 else float("inf"),
+        "episodes": len(experiment.steps),
+        "steps": sum(experiment.steps),
+        "generator_prompt_tokens": sum(sum(tokens) for tokens in experiment.step_tokens),
+        "end_reasons": dict(Counter(experiment.end_reasons)),
+        "time_to_action": [t for episode in experiment.time_to_action for t in episode if t is not None],
+        "curator_gate": experiment.curator_gate.summary() if experiment.curator_gate is not None else None,
+        "generator_models": dict(Counter(model for episode in experiment.step_models for model in episode)),
+        "stages": stages,
+    }
+
+
+def print_report(result):
+    print(f"iterations: {result['iterations']}, episodes: {result['episodes']}, generator steps: {result['steps']}, generator prompt tokens: {result['generator_prompt_tokens']}")
+    print("episode end reasons: " + ", ".join(f"{reason} {count}" for reason, count in result["end_reasons"].items()))
+    print("generator calls per model: " + ", ".join(f"{model} {count}" for model, count in result["generator_models"].items()))
+    if result["time_to_action"]:
+        print(f"generator time to action: mean {1000 * sum(result['time_to_action']) / len(result['time_to_action']):.1f}ms over {len(result['time_to_action'])} calls")
+    if result["curator_gate"] is not None:
+        gate = result["curator_gate"]
+        print(f"curator gate: skipped {gate['skipped']}/{gate['reviews']} ({gate['skip_rate']:.0%}), ~{gate['tokens_saved']} prompt tokens saved")
+    print(f"total: {result['total_seconds']:.3f}s, {result['iterations_per_second']:.2f} iterations/s")
+    if "staleness" in result:
+        print("pipelined, batches per staleness: " + ", ".join(f"{stale}: {count}" for stale, count in sorted(result["staleness"].items())))
+        for stage, s in result["stages"].items():
+            print(f"{stage:<10} busy {s['wall']:>8.3f}s")
+        return
+    print(f"{'stage':<10} {'calls':>7} {'wall [s]':>10} {'model [s]':>10} {'overhead [s]':>13} {'overhead/call [ms]':>19}")
+    for stage, s in result["stages"].items():
+        per_call = 1000 * s["overhead"] / s["calls"] if s["calls"] else 0.0
+        print(f"{stage:<10} {s['calls']:>7} {s['wall']:>10.3f} {s['model']:>10.3f} {s['overhead']:>13.3f} {per_call:>19.3f}")
+    overhead = sum(s["overhead"] for s in result["stages"].values())
+    print(f"framework overhead: {overhead:.3f}s ({100 * overhead / result['total_seconds']:.1f}% of wall time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--map", dest="map_name", choices=sorted(MAPS), default="small_map")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected model latency per call in seconds")
+    parser.add_argument("--policy", default="shortest_path", choices=["shortest_path", "random"])
+    parser.add_argument("--success-rate", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--context", choices=sorted(CONTEXT_POLICIES), default="full", help="Generator context policy")
+    parser.add_argument("--batch-size", type=int, default=1, help="Episodes per reflector/curator call")
+    parser.add_argument("--generator-mode", choices=["step", "plan"], default="step", help="One LLM call per move or plan-and-execute")
+    parser.add_argument("--stream", action="store_true", help="Stream generator completions, dispatch moves early")
+    parser.add_argument("--max-steps", type=int, default=None, help="Moves per episode")
+    parser.add_argument("--cycle-limit", type=int, default=None, help="Repetitions of the same move from the same position that count as a cycle")
+    parser.add_argument("--on-cycle", choices=CYCLE_ACTIONS, default="stop")
+    parser.add_argument("--retrieve-k", type=int, default=None, help="Show the Generator and Reflector only the k most relevant bullets")
+    parser.add_argument("--retrieve-tokens", type=int, default=1500)
+    parser.add_argument("--pipeline", type=int, default=None, metavar="MAX_STALENESS", help="Run the stages concurrently (pipeline.PipelinedExperiment)")
+    parser.add_argument("--curator-gate", action="store_true", help="Skip the Curator for reflections without anything new (agents.gating)")
+    parser.add_argument("--cascade", type=float, default=None, metavar="SMALL_LATENCY", help="Route safe generator steps to a small model with this share of the latency (agents.routing)")
+    args = parser.parse_args()
+    retriever = PlaybookRetriever(k=args.retrieve_k, max_tokens=args.retrieve_tokens) if args.retrieve_k else None
+    budget = EpisodeBudget(max_steps=args.max_steps, cycle_limit=args.cycle_limit, on_cycle=args.on_cycle)
+    print_report(run_benchmark(args.iterations, args.map_name, args.latency, args.policy, args.success_rate, args.seed, context=args.context, batch_size=args.batch_size, generator_mode=args.generator_mode, stream=args.stream, budget=budget, retriever=retriever, max_staleness=args.pipeline, cascade=args.cascade, curator_gate=args.curator_gate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+from clients.ClientWrapper import ClientWrapper
+
+READ_THROUGH = "read_through" # Serve hits from disk, call the client on a miss and store the response
+WRITE_ONLY = "write_only"     # Always call the client, store every response (refreshes the cache)
+CACHE_ONLY = "cache_only"     # Never call the client, a miss raises CacheMissError (offline replay)
+MODES = (READ_THROUGH, WRITE_ONLY, CACHE_ONLY)
+
+# Request parameters that do not influence the completion and therefore are not part of the key
+_NON_SEMANTIC_PARAMS = {"timeout", "extra_headers", "extra_query", "extra_body", "stream_options"}
+
+
+class CacheMissError(KeyError):
+    pass
+
+
+class DiskCache:
+    """
+    Content addressed response store. Every entry is one JSON file named after the sha256 of its request.
+    The file mtime doubles as the LRU timestamp: hits touch the file, eviction deletes the oldest files
+    until the store is back below 90% of max_bytes, so that eviction does not run on every following put.
+    """
+    def __init__(self, cache_dir="res/llm_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes = {}
+        for shard in os.scandir(cache_dir):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".json"):
+                        self._sizes[entry.name[:-5]] = entry.stat().st_size
+        self.total_bytes = sum(self._sizes.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass # evicted by a concurrent writer in the meantime, the data is still valid
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(data, separators=(",", ":"))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.total_bytes += len(payload) - self._sizes.get(key, 0)
+            self._sizes[key] = len(payload)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        by_age = sorted(self._sizes, key=lambda k: self._mtime(k))
+        for key in by_age:
+            if self.total_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def _mtime(self, key):
+        try:
+            return os.stat(self._path(key)).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def __len__(self):
+        return len(self._sizes)
+
+
+def request_key(kwargs) -> str:
+    """Hashes the semantic request parameters (model, messages, tools, sampling parameters, ...)."""
+    relevant = {k: v for k, v in kwargs.items() if k not in _NON_SEMANTIC_PARAMS and v is not None}
+    canonical = json.dumps(relevant, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_to_jsonable)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _to_jsonable(obj):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if isinstance(obj, SimpleNamespace):
+        return vars(obj)
+    return str(obj)
+
+
+def _dump_response(response):
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json")
+    return json.loads(json.dumps(response, default=_to_jsonable))
+
+
+def _load_response(data):
+    try:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+    except Exception:
+        return json.loads(json.dumps(data), object_hook=lambda d: SimpleNamespace(**d))
+
+
+class CachedClient(ClientWrapper):
+    """
+    Caching wrapper around a synchronous OpenAI compatible client.
+    Streaming requests bypass the cache. A seeded run replays with CACHE_ONLY as long as it sends the same
+    prompts (bullet ids are derived from their content for that), benchmarks.replay checks the round trip.
+
+    Usage:
+        client = CachedClient(OpenAI(...), cache_dir="res/llm_cache", mode=READ_THROUGH)
+        Generator(client, model, game, prompt)
+        print(client.stats())
+    """
+    def __init__(self, client, cache_dir="res/llm_cache", max_bytes=512 * 1024 * 1024, mode=READ_THROUGH, cache=None):
+        super().__init__(client)
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.cache = cache if cache is not None else DiskCache(cache_dir, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return self.client.chat.completions.create(**kwargs)
+        key = request_key(kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        response = self.client.chat.completions.create(**kwargs)
+        self.cache.put(key, _dump_response(response))
+        return response
+
+    def _lookup(self, key):
+        if self.mode != WRITE_ONLY:
+            data = self.cache.get(key)
+            if data is not None:
+                self.hits += 1
+                return _load_response(data)
+        self.misses += 1
+        if self.mode == CACHE_ONLY:
+            raise CacheMissError(f"No cached response for request {key}")
+        return None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.cache),
+            "bytes": self.cache.total_bytes,
+            "evictions": self.cache.evictions,
+        }
+
+
+class AsyncCachedClient(CachedClient):
+    """Same as CachedClient for async clients such as AsyncOpenAI (see AsyncGenerator)."""
+    async def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return await self.client.chat.completions.create(**kwargs)
+        key = request_key(kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        response = await self.client.chat.completions.create(**kwargs)
+        self.cache.put(key, _dump_response(response))
+        return response
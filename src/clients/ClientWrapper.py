@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+class ClientWrapper:
+    """
+    Base class for wrappers around an OpenAI compatible client.
+    Exposes `chat.completions.create` so that a wrapper can be handed to Generator, Reflector and Curator
+    wherever a bare client is expected. Subclasses override create().
+    """
+    def __init__(self, client):
+        self.client = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        return self.client.chat.completions.create(**kwargs)
+
+    def __getattr__(self, name):
+        # Everything except chat completions is forwarded to the wrapped client
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from utils.tokens import estimate_tokens
+
+MOVES = {
+    "move_left": (0, -1),
+    "move_down": (1, 0),
+    "move_right": (0, 1),
+    "move_up": (-1, 0),
+}
+_BULLET_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_STATE = re.compile(r"STATE_START\n(.*?)\nSTATE_END", re.S)
+_BATCH = re.compile(r"^TRAJECTORY (\d+) OF (\d+)$", re.M)
+
+
+def parse_grid(state: str):
+    """Parses a FrozenLake.get_state_description grid into (cells, player (row, col))."""
+    cells, player = [], None
+    for r, line in enumerate(state.strip("\n").split("\n")):
+        row = []
+        for c in range(len(line) // 3):
+            token = line[3 * c: 3 * c + 3]
+            if token.startswith("["):
+                player = (r, c)
+            row.append(token[1])
+        cells.append(row)
+    return cells, player
+
+
+def shortest_path(state: str):
+    """Shortest hole-free path to G (BFS over the grid) as [(move, (row, col) reached), ...], None if G is unreachable."""
+    cells, player = parse_grid(state)
+    if player is None:
+        return None
+    nrow, ncol = len(cells), len(cells[0])
+    previous = {player: None} # cell -> (previous cell, move)
+    queue = deque([player])
+    while queue:
+        r, c = queue.popleft()
+        if cells[r][c] == "G":
+            path, cell = [], (r, c)
+            while previous[cell] is not None:
+                path.append((previous[cell][1], cell))
+                cell = previous[cell][0]
+            return path[::-1]
+        for name, (dr, dc) in MOVES.items():
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < nrow and 0 <= nc < ncol and (nr, nc) not in previous and cells[nr][nc] != "H":
+                previous[(nr, nc)] = ((r, c), name)
+                queue.append((nr, nc))
+    return None
+
+
+def shortest_path_move(state: str):
+    """First move of a shortest hole-free path to G, None if G is unreachable or the player is on it."""
+    path = shortest_path(state)
+    return path[0][0] if path else None
+
+
+class OfflineClient:
+    """
+    In-process stand-in for an OpenAI compatible client, no network involved.
+    The agent is recognised from the request: generator (move_* tools), planner (execute_plan tool),
+    curator (ADD/REMOVE/MODIFY tools) or reflector (no tools).
+
+    Args:
+        policy: "shortest_path", "random" or a list of move tool names that is replayed in a loop.
+        latency: Seconds slept per call to simulate the model, or a callable({"model", "messages", "tools"}) -> seconds.
+            With stream=True a share of first_token of it passes before the first chunk, the rest is spread evenly
+            over the remaining chunks (content word by word, then the tool calls, then finish reason and usage).
+        first_token: Share of the latency until the first streamed chunk.
+        seed: Seed of the random choices (random moves, bullet tags, curator operations).
+    """
+    def __init__(self, policy="shortest_path", latency=0.0, first_token=0.2, seed=0):
+        self.policy = policy
+        self.latency = latency
+        self.first_token = first_token
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.model_time = 0.0 # Total injected latency
+        self._script_pos = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, tools=None, stream=False, **kwargs):
+        delay = self._delay(messages, tools, model)
+        if stream:
+            return self._stream(self._respond(model, messages, tools), delay)
+        if delay > 0:
+            time.sleep(delay)
+        return self._respond(model, messages, tools)
+
+    def _stream(self, completion, delay):
+        for wait, chunk in self._chunks(completion, delay):
+            if wait > 0:
+                time.sleep(wait)
+            yield chunk
+
+    def _chunks(self, completion, delay):
+        """(seconds to wait, chunk) pairs in the shape of OpenAI ChatCompletionChunks for a finished completion."""
+        choice = completion.choices[0]
+        message = choice.message
+
+        def chunk(usage=None, finish_reason=None, **delta):
+            choices = [] if usage is not None else [SimpleNamespace(index=0, delta=SimpleNamespace(**delta), finish_reason=finish_reason)]
+            return SimpleNamespace(id=completion.id, object="chat.completion.chunk", created=completion.created, model=completion.model, choices=choices, usage=usage)
+
+        chunks = [chunk(role="assistant", content="")]
+        chunks += [chunk(content=word) for word in re.findall(r"\S+\s*", message.content or "")]
+        for index, tool_call in enumerate(message.tool_calls or []):
+            arguments = tool_call.function.arguments or ""
+            half = len(arguments) // 2
+            chunks.append(chunk(tool_calls=[SimpleNamespace(index=index, id=tool_call.id, type="function", function=SimpleNamespace(name=tool_call.function.name, arguments=""))]))
+            for part in (arguments[:half], arguments[half:]):
+                if part:
+                    chunks.append(chunk(tool_calls=[SimpleNamespace(index=index, id=None, type=None, function=SimpleNamespace(name=None, arguments=part))]))
+        chunks.append(chunk(finish_reason=choice.finish_reason))
+        chunks.append(chunk(usage=completion.usage))
+
+        rest = delay * (1 - self.first_token) / max(1, len(chunks) - 1)
+        return [(delay * self.first_token if i == 0 else rest, c) for i, c in enumerate(chunks)]
+
+    def _delay(self, messages, tools, model=None):
+        self.calls += 1
+        delay = self.latency({"model": model, "messages": messages, "tools": tools}) if callable(self.latency) else self.latency
+        self.model_time += delay
+        return delay
+
+    def _respond(self, model, messages, tools):
+        tool_names = {t["function"]["name"] for t in tools or []}
+        if "move_left" in tool_names:
+            content, tool_calls = self._generator(messages)
+        elif "execute_plan" in tool_names:
+            content, tool_calls = self._planner(messages)
+        elif "ADD" in tool_names:
+            content, tool_calls = self._curator(messages)
+        else:
+            content, tool_calls = self._reflector(messages), None
+
+        message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+        prompt_tokens = estimate_tokens(messages)
+        completion_tokens = estimate_tokens(content or "") + 8 * len(tool_calls or [])
+        return SimpleNamespace(
+            id=f"offline-{self.calls}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="tool_calls" if tool_calls else "stop")],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def _tool_call(self, name, arguments):
+        return SimpleNamespace(
+            id=f"call_{self.calls}_{self.rng.getrandbits(32):08x}",
+            type="function",
+            function=SimpleNamespace(name=name, arguments=json.dumps(arguments)),
+        )
+
+    def _generator(self, messages):
+        if isinstance(self.policy, (list, tuple)):
+            move = self.policy[self._script_pos % len(self.policy)]
+            self._script_pos += 1
+        else:
+            move = shortest_path_move(self._latest_state(messages)) if self.policy == "shortest_path" else None
+            move = move or self.rng.choice(list(MOVES))
+        return f"Offline policy '{self.policy}' chooses {move}.", [self._tool_call(move, {})]
+
+    def _planner(self, messages):
+        """The whole shortest path as one plan (a single random move for the random policy or without a path)."""
+        state = self._latest_state(messages)
+        path = shortest_path(state) if self.policy == "shortest_path" else None
+        if not path:
+            _, (r, c) = parse_grid(state)
+            move = self.rng.choice(list(MOVES))
+            path = [(move, (r + MOVES[move][0], c + MOVES[move][1]))]
+        moves = [{"move": move, "expected_position": list(position)} for move, position in path]
+        return f"Offline policy '{self.policy}' plans {len(moves)} moves.", [self._tool_call("execute_plan", {"moves": moves})]
+
+    def _latest_state(self, messages):
+        for message in reversed(messages):
+            if message.get("role") == "tool":
+                return json.loads(message["content"])["state"]
+            match = _STATE.search(message.get("content") or "")
+            if match:
+                return match.group(1)
+        return ""
+
+    def _bullet_ids(self, messages):
+        return list(dict.fromkeys(_BULLET_ID.findall(messages[0].get("content") or "")))
+
+    def _reflector(self, messages):
+        bullet_ids = self._bullet_ids(messages)
+        batch = _BATCH.search(messages[0].get("content") or "")
+        if batch:
+            return json.dumps({
+                "trajectories": [{"index": i, "outcome_analysis": "Offline analysis.", "bullet_tags": self._bullet_tags(bullet_ids)} for i in range(1, int(batch.group(2)) + 1)],
+                "reasoning": "Offline batch reflection.",
+                "error_identification": "None identified offline.",
+                "root_cause_analysis": "None identified offline.",
+                "correct_approach": "Move along the shortest path that keeps a distance to holes.",
+                "key_insight": f"Offline insight {self.rng.getrandbits(16)}",
+            })
+        bullet_tags = self._bullet_tags(bullet_ids)
+        return json.dumps({
+            "reasoning": "Offline reflection.",
+            "error_identification": "None identified offline.",
+            "root_cause_analysis": "None identified offline.",
+            "correct_approach": "Move along the shortest path that keeps a distance to holes.",
+            "key_insight": f"Offline insight {self.rng.getrandbits(16)}",
+            "bullet_tags": bullet_tags,
+        })
+
+    def _bullet_tags(self, bullet_ids):
+        return [{"id": bid, "tag": self.rng.choice(["helpful", "harmful"])} for bid in bullet_ids if self.rng.random() < 0.5]
+
+    def _curator(self, messages):
+        bullet_ids = self._bullet_ids(messages)
+        tool_calls = [self._tool_call("ADD", {"section": "Offline Strategies", "content": f"Offline strategy {self.rng.getrandbits(16)}"})]
+        if bullet_ids and self.rng.random() < 0.5:
+            tool_calls.append(self._tool_call("MODIFY", {"bullet_id": self.rng.choice(bullet_ids), "content": f"Offline modification {self.rng.getrandbits(16)}"}))
+        if len(bullet_ids) > 10:
+            tool_calls.append(self._tool_call("REMOVE", {"bullet_id": self.rng.choice(bullet_ids)}))
+        return None, tool_calls
+
+
+class AsyncOfflineClient(OfflineClient):
+    """OfflineClient for async callers such as AsyncGenerator, latency is awaited instead of slept."""
+    async def create(self, model, messages, tools=None, stream=False, **kwargs):
+        delay = self._delay(messages, tools, model)
+        if stream:
+            return self._stream_async(self._respond(model, messages, tools), delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._respond(model, messages, tools)
+
+    async def _stream_async(self, completion, delay):
+        for wait, chunk in self._chunks(completion, delay):
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield chunk
@@ -0,0 +1,223 @@
+import asyncio
+import random
+import threading
+import time
+
+from clients.ClientWrapper import ClientWrapper
+from utils.telemetry import usage_tokens
+from utils.tokens import estimate_tokens
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute, holding at most `capacity` (one minute by default).
+    reserve() books the tokens immediately and returns how long the caller has to wait before using them,
+    so waiting callers are served in order and the wait can be slept or awaited. A request larger than the
+    capacity is admitted once the bucket is full and leaves it in debt.
+    """
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            missing = min(amount, self.capacity) - (self._level + amount)
+            return max(0.0, missing / self.rate)
+
+    def refund(self, amount: float):
+        """Returns over-reserved tokens, e.g. when the actual usage was below the estimate (negative amount charges more)."""
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+
+class RateLimiter:
+    """Requests per minute and tokens per minute limits of one provider account, shared by all agents of a process."""
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.reserve(tokens))
+        return max(waits)
+
+    def settle(self, estimated: int, actual: int):
+        if self.tokens is not None and actual:
+            self.tokens.refund(estimated - actual)
+
+    def release(self, tokens: int):
+        """Gives back the tokens of an attempt that failed without using them; its request slot stays booked."""
+        if self.tokens is not None and tokens:
+            self.tokens.refund(tokens)
+
+
+def is_transient(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are worth retrying; bad requests and auth errors are not."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS_CODES
+    try:
+        import openai
+        if isinstance(error, openai.APIConnectionError): # includes APITimeoutError
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds from the Retry-After header of a 429/503 response, if the provider sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedClient(ClientWrapper):
+    """
+    Shared client layer for Generator, Reflector and Curator: waits for the rpm/tpm token buckets before every
+    request, adds a per call timeout and retries transient errors with full jitter exponential backoff
+    (or the provider's Retry-After). Wrap one client per process and hand it to all agents.
+
+    Usage:
+        client = RateLimitedClient(make_openai_client(base_url, api_key), rpm=500, tpm=200_000)
+        Experiment(client, game, prompt)
+        print(client.stats())
+
+    Args:
+        rpm, tpm: Requests and tokens per minute, None for no limit. Tokens are estimated from the request
+            (prompt plus max_tokens or expected_completion_tokens) and corrected with the reported usage.
+        timeout: Seconds per call, passed as `timeout` unless the caller sets one.
+    """
+    def __init__(self, client, rpm=None, tpm=None, max_retries=6, base_delay=0.5, max_delay=30.0, timeout=120.0, expected_completion_tokens=1024, limiter=None, seed=None):
+        super().__init__(client)
+        self.limiter = limiter if limiter is not None else RateLimiter(rpm, tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.expected_completion_tokens = expected_completion_tokens
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+    def _prepare(self, kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        if self.limiter.tokens is None:
+            return kwargs, 0
+        completion_tokens = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or self.expected_completion_tokens
+        return kwargs, estimate_tokens(kwargs.get("messages", "")) + completion_tokens
+
+    def _throttle(self, estimated):
+        wait = self.limiter.reserve(estimated)
+        with self._lock:
+            self.attempts += 1
+            self.throttled_seconds += wait
+        return wait
+
+    def _backoff(self, error, attempt, estimated):
+        """Delay before the next attempt, or None if the error is permanent or the retries are used up."""
+        self.limiter.release(estimated) # the next attempt reserves its tokens again
+        if attempt >= self.max_retries or not is_transient(error):
+            with self._lock:
+                self.failures += 1
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            delay = self.rng.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+        return delay
+
+    def _settle(self, estimated, response):
+        if estimated and getattr(response, "usage", None) is not None: # streams keep the estimate, their usage arrives last
+            prompt_tokens, completion_tokens, _ = usage_tokens(response)
+            self.limiter.settle(estimated, prompt_tokens + completion_tokens)
+
+    def create(self, **kwargs):
+        kwargs, estimated = self._prepare(kwargs)
+        attempt = 0
+        while True:
+            wait = self._throttle(estimated)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt, estimated)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(estimated, response)
+            return response
+
+    def stats(self):
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "failures": self.failures,
+            "throttled_seconds": self.throttled_seconds,
+            "backoff_seconds": self.backoff_seconds,
+        }
+
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """Same as RateLimitedClient for async clients such as AsyncOpenAI (see AsyncGenerator), waits are awaited."""
+    async def create(self, **kwargs):
+        kwargs, estimated = self._prepare(kwargs)
+        attempt = 0
+        while True:
+            wait = self._throttle(estimated)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt, estimated)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(estimated, response)
+            return response
+
+
+def make_openai_client(base_url=None, api_key=None, timeout=120.0, connect_timeout=10.0, max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0, use_async=False):
+    """
+    OpenAI client with a keep-alive connection pool sized for concurrent workers. The SDK's own retries
+    are disabled, RateLimitedClient retries instead.
+    """
+    import httpx # installed with openai
+    import openai
+    http_client_class = openai.DefaultAsyncHttpxClient if use_async else openai.DefaultHttpxClient
+    http_client = http_client_class(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections, keepalive_expiry=keepalive_expiry),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+    client_class = openai.AsyncOpenAI if use_async else openai.OpenAI
+    return client_class(base_url=base_url, api_key=api_key, max_retries=0, timeout=httpx.Timeout(timeout, connect=connect_timeout), http_client=http_client)
@@ -0,0 +1,63 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+from environments.EnvironmentBase import EnvironmentBase
+
+class EnvPool:
+    """
+    Hands out reusable environments, so episodes do not pay the construction of a new env each time.
+    An environment is reset by its next user (Generator episodes call reset(seed) first), it is never shared
+    by two users at once. The pool grows on demand; size environments can be built up front with warm().
+
+    Args:
+        factory: Callable returning a fresh environment, e.g. lambda: FrozenLake.from_map(MAPS["big_map"]).
+        size: Number of environments built right away.
+    """
+    def __init__(self, factory: Callable[[], EnvironmentBase], size=0):
+        self.factory = factory
+        self._idle = []
+        self._all = []
+        self._lock = threading.Lock()
+        self.warm(size)
+
+    def __len__(self):
+        return len(self._all)
+
+    def warm(self, size):
+        """Builds environments (including the wrapped env) until the pool holds at least size of them."""
+        while len(self._all) < size:
+            environment = self._build()
+            with self._lock:
+                self._idle.append(environment)
+
+    def _build(self):
+        environment = self.factory()
+        environment.env # envs are built lazily, force it
+        with self._lock:
+            self._all.append(environment)
+        return environment
+
+    def acquire(self) -> EnvironmentBase:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._build()
+
+    def release(self, environment: EnvironmentBase):
+        with self._lock:
+            self._idle.append(environment)
+
+    @contextmanager
+    def lease(self):
+        environment = self.acquire()
+        try:
+            yield environment
+        finally:
+            self.release(environment)
+
+    def close(self):
+        with self._lock:
+            environments, self._all, self._idle = self._all, [], []
+        for environment in environments:
+            environment.close()
@@ -1,8 +1,8 @@
-import gymnasium as gym
-
+from functools import partial
 from typing import Dict, Callable, Any
 from enum import Enum
 from environments.EnvironmentBase import EnvironmentBase
+from environments.StateEncoder import StateEncoder, get_encoder
 
 class Move(Enum):
     LEFT = 0
@@ -10,16 +10,60 @@ class Move(Enum):
     RIGHT = 2
     UP = 3
     
+
+def make_gym_env(desc=None, map_name="4x4", is_slippery=True, success_rate=1.0/3.0, reward_schedule=(1, 0, 0)):
+    """gymnasium's FrozenLake-v1 in ansi render mode. gymnasium is imported on the first call, not with this module."""
+    import gymnasium as gym
+    return gym.make("FrozenLake-v1",
+                    render_mode="ansi",
+                    desc=desc,
+                    map_name=map_name,
+                    is_slippery=is_slippery,
+                    success_rate=success_rate,
+                    reward_schedule=reward_schedule)
+
+
 class FrozenLake(EnvironmentBase):
-    def __init__(self, env = gym.make("FrozenLake-v1",
-                      render_mode="ansi", 
-                      desc=None,
-                      map_name="4x4",
-                      is_slippery=True,
-                      success_rate=1.0/3.0,
-                      reward_schedule=(1, 0, 0))):
+    """
+    Either wraps the given env or builds its own one with env_factory on first use (default: the slippery
+    4x4 map of gymnasium), so constructing a FrozenLake is cheap and no two instances share an env.
+    """
+    def __init__(self, env=None, encoding="grid", env_factory: Callable = None):
+        self._env_factory = env_factory or make_gym_env
         super().__init__(env)
-        
+        self.encoding = encoding # "grid", "coordinates" or "diff", see environments.StateEncoder
+        self._encoder = None
+
+    @property
+    def env(self):
+        if self._env is None:
+            self._env = self._env_factory()
+        return self._env
+
+    @env.setter
+    def env(self, env):
+        self._env = env
+
+    @classmethod
+    def from_map(cls, desc, is_slippery=True, success_rate=0.7, reward_schedule=(1, 0, 0), engine="gym", encoding="grid"):
+        """
+        Creates a FrozenLake on a custom map, e.g. one of environments.maps.MAPS. The env is built on first use.
+        engine="tabular" steps the compiled NumPy tables of environments.TabularFrozenLake instead of gymnasium.
+        """
+        return cls(env_factory=map_env_factory(desc, is_slippery, success_rate, reward_schedule, engine), encoding=encoding)
+
+    def close(self):
+        """Closes the env; the next access of self.env builds a fresh one from the factory."""
+        if self._env is not None:
+            self._env.close()
+            self._env = None
+
+    @property
+    def encoder(self) -> StateEncoder:
+        if self._encoder is None:
+            self._encoder = get_encoder(self.encoding, self.env.unwrapped.desc)
+        return self._encoder
+
     @property
     def ACTION_MAP(self) -> Dict[str, Callable]:
         return {
@@ -29,37 +73,27 @@ class FrozenLake(EnvironmentBase):
             "move_down": self.move_down
         }
 
-    def get_state_description(self, player_pos: int | None = None) -> str:
+    def get_state_description(self, player_pos: int | None = None, previous_pos: int | None = None) -> str:
         """
-        Alternative implementation that rebuilds the grid from desc.
-        This is used too depict the current player position in the FrozenLake environment for an LLM.
+        Depicts the player position in the FrozenLake environment for an LLM, in the encoding of this instance.
+        The default "grid" encoding is the map with the player cell in brackets.
 
         Args:
-            env: The FrozenLake gymnasium environment
+            player_pos: Position to depict, the current position by default.
+            previous_pos: Position before the last move, only used by the "diff" encoding.
 
         Returns:
             str: Modified environment description with player position marked
         """
         if player_pos is None:
             player_pos = self.env.unwrapped.s
-        desc = self.env.unwrapped.desc
-        nrow, ncol = desc.shape
-
-        row = player_pos // ncol
-        col = player_pos % ncol
-
-        result = []
-        for r in range(nrow):
-            line = ""
-            for c in range(ncol):
-                cell = desc[r][c].decode('utf-8') if isinstance(desc[r][c], bytes) else desc[r][c]
-                if r == row and c == col:
-                    line += f"[{cell}]"
-                else:
-                    line += f" {cell} "
-            result.append(line)
-
-        return '\n'.join(result)
+        return self.encoder.encode(player_pos, previous_pos)
+
+    def get_state_tokens(self, player_pos: int | None = None, previous_pos: int | None = None) -> int:
+        """Token count of get_state_description for the same arguments."""
+        if player_pos is None:
+            player_pos = self.env.unwrapped.s
+        return self.encoder.token_count(player_pos, previous_pos)
     
     def move_left(self):
         return self.execute_action(Move.LEFT)
@@ -70,15 +104,47 @@ class FrozenLake(EnvironmentBase):
     def move_down(self):
         return self.execute_action(Move.DOWN)
     
+    def intended_position(self, player_pos: int, action: Move) -> int:
+        """The position the action leads to on non-slippery ice (moves into the border keep the player in place)."""
+        nrow, ncol = self.env.unwrapped.desc.shape
+        row, col = divmod(int(player_pos), ncol)
+        if action == Move.LEFT:
+            col = max(col - 1, 0)
+        elif action == Move.DOWN:
+            row = min(row + 1, nrow - 1)
+        elif action == Move.RIGHT:
+            col = min(col + 1, ncol - 1)
+        elif action == Move.UP:
+            row = max(row - 1, 0)
+        return row * ncol + col
+
     def execute_action(self, action: Move) -> Dict[str, Any]:
+        previous = int(self.env.unwrapped.s)
+        intended = self.intended_position(previous, action)
         observation, reward, isTerminated, truncated, info = self.env.step(action.value)
-        state = self.get_state_description(player_pos=observation)
+        state = self.get_state_description(player_pos=observation, previous_pos=previous)
+        ncol = self.env.unwrapped.desc.shape[1]
         answer = {
             "state": state,
             "reward": reward,
-            "isTerminated": isTerminated
+            "isTerminated": isTerminated,
+            "position": list(divmod(int(observation), ncol)), # [row, col]
+            "slipped": bool(int(observation) != intended)
         }
         return answer
 
 
+
+def _tabular_env(desc, is_slippery, success_rate, reward_schedule):
+    from environments.TabularFrozenLake import TabularFrozenLakeEnv
+    return TabularFrozenLakeEnv.from_map(desc, is_slippery, success_rate, reward_schedule)
+
+
+def map_env_factory(desc, is_slippery=True, success_rate=0.7, reward_schedule=(1, 0, 0), engine="gym") -> Callable:
+    """Picklable factory of fresh envs on a custom map, for FrozenLake(env_factory=...) and environments.EnvPool."""
+    if engine == "tabular":
+        return partial(_tabular_env, desc, is_slippery, success_rate, reward_schedule)
+    return partial(make_gym_env, desc=desc, map_name=None, is_slippery=is_slippery, success_rate=success_rate, reward_schedule=reward_schedule)
+
+
 assert issubclass(FrozenLake, EnvironmentBase)
\ No newline at end of file
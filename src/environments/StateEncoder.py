@@ -0,0 +1,140 @@
+from abc import ABC, abstractmethod
+
+from utils.tokens import estimate_tokens
+
+# Renders of at most this many characters (summed over all states) are built eagerly, bigger maps are memoized on first use
+PRECOMPUTE_CHAR_BUDGET = 4 * 1024 * 1024
+
+
+class StateEncoder(ABC):
+    """
+    Turns a FrozenLake player position into the text the LLM sees.
+    The map is decoded once per encoder and every encoding is memoized per state (or per state pair for diffs),
+    so encoding during an episode is a lookup.
+    """
+    def __init__(self, desc):
+        self.rows = decode_desc(desc)
+        self.nrow = len(self.rows)
+        self.ncol = len(self.rows[0])
+        self.n_states = self.nrow * self.ncol
+        self._cache = {}
+        self._tokens = {}
+
+    def encode(self, player_pos: int, previous_pos: int | None = None) -> str:
+        key = self._key(int(player_pos), None if previous_pos is None else int(previous_pos))
+        text = self._cache.get(key)
+        if text is None:
+            text = self._cache[key] = self._render(*key)
+        return text
+
+    def token_count(self, player_pos: int, previous_pos: int | None = None) -> int:
+        """Tokens of encode(player_pos, previous_pos)."""
+        key = self._key(int(player_pos), None if previous_pos is None else int(previous_pos))
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            tokens = self._tokens[key] = estimate_tokens(self.encode(*key))
+        return tokens
+
+    def mean_token_count(self) -> float:
+        """Average tokens of a state on this map, to compare encodings."""
+        return sum(self.token_count(s, s) for s in range(self.n_states)) / self.n_states
+
+    def precompute(self):
+        for s in range(self.n_states):
+            self.encode(s)
+
+    def _key(self, player_pos, previous_pos):
+        return (player_pos, None)
+
+    @abstractmethod
+    def _render(self, player_pos: int, previous_pos: int | None) -> str:
+        pass
+
+    def find(self, letter: str):
+        return [(r, c) for r, row in enumerate(self.rows) for c, cell in enumerate(row) if cell == letter]
+
+
+class GridEncoder(StateEncoder):
+    """The full grid with the player cell in brackets, the original FrozenLake.get_state_description format."""
+    def __init__(self, desc):
+        super().__init__(desc)
+        # Every cell is 3 characters wide and every line ends with '\n', so a cell has a fixed offset
+        self._base = '\n'.join(''.join(f" {cell} " for cell in row) for row in self.rows)
+        if self.n_states * len(self._base) <= PRECOMPUTE_CHAR_BUDGET:
+            self.precompute()
+
+    def _render(self, player_pos, previous_pos):
+        row, col = divmod(player_pos, self.ncol)
+        offset = row * (3 * self.ncol + 1) + 3 * col
+        return f"{self._base[:offset]}[{self.rows[row][col]}]{self._base[offset + 3:]}"
+
+
+class CoordinatesEncoder(StateEncoder):
+    """Player and goal coordinates plus the holes and borders around the player."""
+    def __init__(self, desc, radius=2):
+        super().__init__(desc)
+        self.radius = radius
+        self._goals = self.find("G")
+        self.precompute()
+
+    def _render(self, player_pos, previous_pos):
+        row, col = divmod(player_pos, self.ncol)
+        holes = [
+            f"({r},{c})"
+            for r in range(max(row - self.radius, 0), min(row + self.radius + 1, self.nrow))
+            for c in range(max(col - self.radius, 0), min(col + self.radius + 1, self.ncol))
+            if self.rows[r][c] == "H"
+        ]
+        borders = [name for name, blocked in (("up", row == 0), ("down", row == self.nrow - 1), ("left", col == 0), ("right", col == self.ncol - 1)) if blocked]
+        return '\n'.join([
+            f"Map: {self.nrow} rows x {self.ncol} cols, (row,col) from top-left (0,0)",
+            f"Player: ({row},{col}) on {self.rows[row][col]}",
+            "Goal: " + ", ".join(f"({r},{c})" for r, c in self._goals),
+            f"Holes within {self.radius}: " + (", ".join(holes) if holes else "none"),
+            "Border: " + (", ".join(borders) if borders else "none"),
+        ])
+
+
+class DiffEncoder(StateEncoder):
+    """
+    The full grid for the first state of an episode, afterwards only what changed: where the player moved.
+    The grid in the generator prompt stays the reference map for the model.
+    """
+    def __init__(self, desc):
+        super().__init__(desc)
+        self._grid = GridEncoder(desc)
+
+    def _key(self, player_pos, previous_pos):
+        return (player_pos, previous_pos)
+
+    def _render(self, player_pos, previous_pos):
+        if previous_pos is None:
+            return self._grid.encode(player_pos)
+        row, col = divmod(player_pos, self.ncol)
+        if previous_pos == player_pos:
+            return f"Player stayed at ({row},{col}) on {self.rows[row][col]}"
+        prev_row, prev_col = divmod(previous_pos, self.ncol)
+        return f"Player moved from ({prev_row},{prev_col}) to ({row},{col}) on {self.rows[row][col]}"
+
+
+ENCODINGS = {
+    "grid": GridEncoder,
+    "coordinates": CoordinatesEncoder,
+    "diff": DiffEncoder,
+}
+
+_ENCODERS = {}
+
+def decode_desc(desc):
+    """Map rows as strings, from a list of strings or gymnasium's byte array desc."""
+    return tuple(''.join(c.decode('utf-8') if isinstance(c, bytes) else c for c in row) for row in desc)
+
+def get_encoder(encoding: str, desc) -> StateEncoder:
+    """Returns the shared encoder of this encoding and map, so the renders are built once per map."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown state encoding '{encoding}', expected one of {list(ENCODINGS)}")
+    key = (encoding, decode_desc(desc))
+    encoder = _ENCODERS.get(key)
+    if encoder is None:
+        encoder = _ENCODERS[key] = ENCODINGS[encoding](key[1])
+    return encoder
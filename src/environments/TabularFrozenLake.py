@@ -0,0 +1,242 @@
+import numpy as np
+
+from typing import Any, Dict, Tuple
+
+LEFT, DOWN, RIGHT, UP = 0, 1, 2, 3
+N_ACTIONS = 4
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Vectorized splitmix64 finalizer (uint64 arithmetic wraps around)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+
+class TransitionTables:
+    """
+    FrozenLake dynamics compiled into dense arrays. Every (state, action) has K outcome slots,
+    unused slots have probability 0.
+
+    Attributes:
+        desc: The map as a numpy byte array, like env.unwrapped.desc.
+        next_state: int64 [nS, nA, K]
+        prob: float64 [nS, nA, K]
+        cum_prob: float64 [nS, nA, K], cumulative prob used for sampling
+        reward: float64 [nS, nA, K]
+        terminated: bool [nS, nA, K]
+        initial_distrib: float64 [nS]
+    """
+    def __init__(self, desc, next_state, prob, reward, terminated, initial_distrib):
+        self.desc = desc
+        self.nrow, self.ncol = desc.shape
+        self.n_states = self.nrow * self.ncol
+        self.next_state = next_state
+        self.prob = prob
+        self.cum_prob = np.cumsum(prob, axis=2)
+        self.cum_prob[:, :, -1] = 1.0 # guards against float round off in the last slot
+        self.reward = reward
+        self.terminated = terminated
+        self.initial_distrib = initial_distrib
+
+    @classmethod
+    def from_desc(cls, desc, is_slippery=True, success_rate=1.0/3.0, reward_schedule=(1, 0, 0)):
+        """Compiles the dynamics of gymnasium's FrozenLakeEnv from a map (list of strings or byte array)."""
+        desc = np.asarray(desc, dtype="c")
+        nrow, ncol = desc.shape
+        n_states = nrow * ncol
+        rows, cols = np.divmod(np.arange(n_states), ncol)
+        letters = desc.ravel()
+        is_terminal_cell = (letters == b"G") | (letters == b"H")
+        cell_reward = np.where(letters == b"G", reward_schedule[0], np.where(letters == b"H", reward_schedule[1], reward_schedule[2])).astype(np.float64)
+
+        # Deterministic successor of every (state, direction)
+        moved = np.empty((n_states, N_ACTIONS), dtype=np.int64)
+        moved[:, LEFT] = rows * ncol + np.maximum(cols - 1, 0)
+        moved[:, DOWN] = np.minimum(rows + 1, nrow - 1) * ncol + cols
+        moved[:, RIGHT] = rows * ncol + np.minimum(cols + 1, ncol - 1)
+        moved[:, UP] = np.maximum(rows - 1, 0) * ncol + cols
+
+        actions = np.arange(N_ACTIONS)
+        if is_slippery:
+            directions = np.stack([(actions - 1) % N_ACTIONS, actions, (actions + 1) % N_ACTIONS], axis=1) # [nA, 3]
+            fail_rate = (1.0 - success_rate) / 2.0
+            slot_prob = np.array([fail_rate, success_rate, fail_rate])
+        else:
+            directions = actions[:, None]
+            slot_prob = np.array([1.0])
+        next_state = moved[:, directions] # [nS, nA, K]
+        prob = np.broadcast_to(slot_prob, next_state.shape).copy()
+        reward = cell_reward[next_state]
+        terminated = is_terminal_cell[next_state]
+
+        # Holes and the goal are absorbing
+        next_state[is_terminal_cell] = np.arange(n_states)[is_terminal_cell, None, None]
+        prob[is_terminal_cell] = 0.0
+        prob[is_terminal_cell, :, 0] = 1.0
+        reward[is_terminal_cell] = 0.0
+        terminated[is_terminal_cell] = True
+
+        initial_distrib = (letters == b"S").astype(np.float64)
+        initial_distrib /= initial_distrib.sum()
+        return cls(desc, next_state, prob, reward, terminated, initial_distrib)
+
+    @classmethod
+    def from_env(cls, env):
+        """Compiles env.unwrapped.P of any gymnasium toy text FrozenLake env."""
+        unwrapped = env.unwrapped
+        P = unwrapped.P
+        n_states, n_actions = len(P), len(P[0])
+        k = max(len(P[s][a]) for s in P for a in P[s])
+        next_state = np.zeros((n_states, n_actions, k), dtype=np.int64)
+        prob = np.zeros((n_states, n_actions, k))
+        reward = np.zeros((n_states, n_actions, k))
+        terminated = np.zeros((n_states, n_actions, k), dtype=bool)
+        for s in range(n_states):
+            for a in range(n_actions):
+                for i, (p, s_next, r, t) in enumerate(P[s][a]):
+                    next_state[s, a, i] = s_next
+                    prob[s, a, i] = p
+                    reward[s, a, i] = r
+                    terminated[s, a, i] = t
+                next_state[s, a, len(P[s][a]):] = next_state[s, a, 0]
+        return cls(np.asarray(unwrapped.desc), next_state, prob, reward, terminated, np.asarray(unwrapped.initial_state_distrib, dtype=np.float64))
+
+    def intended_state(self, states, actions):
+        """Successor without slipping, used to detect slips."""
+        rows, cols = np.divmod(states, self.ncol)
+        rows = np.where(actions == DOWN, np.minimum(rows + 1, self.nrow - 1), np.where(actions == UP, np.maximum(rows - 1, 0), rows))
+        cols = np.where(actions == RIGHT, np.minimum(cols + 1, self.ncol - 1), np.where(actions == LEFT, np.maximum(cols - 1, 0), cols))
+        return rows * self.ncol + cols
+
+
+class BatchedFrozenLake:
+    """
+    Steps B independent FrozenLake episodes with one vectorized call.
+    Every env has its own counter based random stream (splitmix64 of seed and step counter), so an episode
+    is reproducible from its seed no matter how many other envs are in the batch.
+
+    Finished envs stay in their terminal state until they are reset (see step(auto_reset=...)).
+    """
+    def __init__(self, tables: TransitionTables, batch_size=1, seeds=None, max_episode_steps=None):
+        self.tables = tables
+        self.batch_size = batch_size
+        self.max_episode_steps = max_episode_steps
+        self.states = np.zeros(batch_size, dtype=np.int64)
+        self.done = np.zeros(batch_size, dtype=bool)
+        self.elapsed = np.zeros(batch_size, dtype=np.int64)
+        self._keys = np.zeros(batch_size, dtype=np.uint64)
+        self._counters = np.zeros(batch_size, dtype=np.uint64)
+        self._initial_cum = np.cumsum(tables.initial_distrib)
+        self.reset(seeds)
+
+    def _uniform(self, index=slice(None)) -> np.ndarray:
+        x = self._keys[index] + self._counters[index] * _GOLDEN
+        self._counters[index] += np.uint64(1)
+        return (_splitmix64(x) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    def reset(self, seeds=None, index=None):
+        """
+        Resets all envs (index=None) or the given env indices.
+        seeds: int (env i uses seed + i), sequence of per-env seeds or None for fresh entropy.
+        """
+        index = np.arange(self.batch_size) if index is None else np.atleast_1d(index)
+        if seeds is None:
+            keys = np.random.SeedSequence().generate_state(len(index), dtype=np.uint64)
+        elif np.isscalar(seeds):
+            keys = (np.uint64(seeds) + index.astype(np.uint64))
+        else:
+            keys = np.asarray(seeds, dtype=np.uint64)
+        self._keys[index] = _splitmix64(np.asarray(keys, dtype=np.uint64) ^ _GOLDEN)
+        self._counters[index] = 0
+        u = self._uniform(index)
+        self.states[index] = np.minimum(np.searchsorted(self._initial_cum, u, side="right"), self.tables.n_states - 1)
+        self.done[index] = False
+        self.elapsed[index] = 0
+        return self.states.copy()
+
+    def step(self, actions, auto_reset=False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Applies one action per env. Envs that are already done do not move and get reward 0.
+
+        Returns:
+            (states, rewards, terminated, truncated) arrays of length B
+        """
+        t = self.tables
+        actions = np.broadcast_to(np.asarray(actions, dtype=np.int64), self.states.shape)
+        u = self._uniform()
+        cum = t.cum_prob[self.states, actions] # [B, K]
+        slot = np.minimum((cum <= u[:, None]).sum(axis=1), cum.shape[1] - 1)
+        active = ~self.done
+        next_states = np.where(active, t.next_state[self.states, actions, slot], self.states)
+        rewards = np.where(active, t.reward[self.states, actions, slot], 0.0)
+        terminated = np.where(active, t.terminated[self.states, actions, slot], False)
+
+        self.elapsed += active
+        truncated = active & ~terminated & (self.elapsed >= self.max_episode_steps) if self.max_episode_steps else np.zeros_like(terminated)
+        self.states = next_states
+        self.done |= terminated | truncated
+        if auto_reset and self.done.any():
+            finished = np.flatnonzero(self.done)
+            self.reset(seeds=self._keys[finished] + self._counters[finished], index=finished)
+        return next_states, rewards, terminated, truncated
+
+    def rollout(self, policy, max_steps=1000):
+        """
+        Runs the tabular policy (array of actions per state) until all envs are done or max_steps is reached.
+
+        Returns:
+            (returns, steps, terminal_states) per env
+        """
+        policy = np.asarray(policy, dtype=np.int64)
+        returns = np.zeros(self.batch_size)
+        steps = np.zeros(self.batch_size, dtype=np.int64)
+        for _ in range(max_steps):
+            if self.done.all():
+                break
+            active = ~self.done
+            _, rewards, _, _ = self.step(policy[self.states])
+            returns += rewards
+            steps += active
+        return returns, steps, self.states.copy()
+
+
+class TabularFrozenLakeEnv:
+    """
+    Single env view of BatchedFrozenLake with the gymnasium interface FrozenLake relies on
+    (reset/step/close and unwrapped.desc/unwrapped.s), so it can be used as FrozenLake(env=...).
+    """
+    def __init__(self, tables: TransitionTables, max_episode_steps=100):
+        self.tables = tables
+        self.engine = BatchedFrozenLake(tables, batch_size=1, max_episode_steps=max_episode_steps)
+        self.desc = tables.desc
+        self.initial_state_distrib = tables.initial_distrib
+
+    @classmethod
+    def from_map(cls, desc, is_slippery=True, success_rate=1.0/3.0, reward_schedule=(1, 0, 0), max_episode_steps=100):
+        return cls(TransitionTables.from_desc(desc, is_slippery, success_rate, reward_schedule), max_episode_steps)
+
+    @property
+    def unwrapped(self):
+        return self
+
+    @property
+    def s(self) -> int:
+        return int(self.engine.states[0])
+
+    def reset(self, seed=None, options=None) -> Tuple[int, Dict[str, Any]]:
+        self.engine.reset(seeds=seed)
+        return self.s, {"prob": 1}
+
+    def step(self, action) -> Tuple[int, float, bool, bool, Dict[str, Any]]:
+        states, rewards, terminated, truncated = self.engine.step(int(action))
+        return int(states[0]), float(rewards[0]), bool(terminated[0]), bool(truncated[0]), {}
+
+    def close(self):
+        pass
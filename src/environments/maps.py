@@ -0,0 +1,36 @@
+# FrozenLake maps used in run.ipynb. S: start, F: frozen, H: hole, G: goal
+
+big_map = [
+    "SFFFFFHFFFF",
+    "FFFFFHFFFFF",
+    "FFFFFFHFHFF",
+    "FFFFFFFFFFF",
+    "FFFFFFFFFFF",
+    "FFFFFFFFFFF",
+    "FFHFFFFFFFF",
+    "FFFFFFFFFHF",
+    "FFFFFFFFFFF",
+    "FFFFFFFHFFF",
+    "FFFFFFFFFFG"
+]
+medium_map = [
+    "SFFFFHF",
+    "FFFFFHF",
+    "FHFFFFH",
+    "FFFFFFF",
+    "FFFHFFF",
+    "FFHFFFG"
+]
+small_map = [
+    "SFFF",
+    "FFFH",
+    "HFFH",
+    "FHFF",
+    "FFFG"
+]
+
+MAPS = {
+    "small_map": small_map,
+    "medium_map": medium_map,
+    "big_map": big_map,
+}
@@ -0,0 +1,317 @@
+"""
+Evaluates frozen playbook snapshots with Generator episodes only (no reflection or curation).
+Episodes run in parallel over --maps and consecutive seeds and are folded into the estimates as they finish:
+success rate with a Wilson interval, mean steps with a normal interval.
+
+With one --playbook the episodes stop as soon as the success rate is known to +-precision. With --against
+both snapshots play the same (map, seed) pairs and a sequential test on the paired success difference stops
+as soon as the comparison is decided: one snapshot is better, or they differ by less than --delta.
+The test looks at the data every --look-every pairs and splits alpha evenly over the possible looks, so the
+error rate holds no matter when it stops. The report compares the LLM calls made with the fixed-N evaluation
+of --max-pairs pairs; the calls of episodes still in flight at the decision are spent too and counted as unused.
+
+Run from src/:
+    python evaluate.py --playbook res/playbook.json --maps small_map big_map --precision 0.05
+    python evaluate.py --playbook res/runs/a/playbook.json --against res/runs/b/playbook.json --max-pairs 300
+"""
+import argparse
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from statistics import NormalDist
+
+from agents.budget import EpisodeBudget
+from agents.generator import Generator
+from agents.routing import ModelRouter
+from environments.EnvPool import EnvPool
+from environments.FrozenLake import FrozenLake
+from environments.maps import MAPS
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+
+
+def wilson_interval(successes, n, confidence=0.95):
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class RunningMean:
+    """Welford mean and variance of a stream of values."""
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+    def interval(self, confidence=0.95):
+        if self.n < 2:
+            return -math.inf, math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        half = z * math.sqrt(self._m2 / (self.n - 1) / self.n)
+        return self.mean - half, self.mean + half
+
+
+class Estimate:
+    """Success rate and mean steps of one snapshot, updated per episode."""
+    def __init__(self):
+        self.episodes = 0
+        self.successes = 0
+        self.steps = RunningMean()
+        self.calls = 0
+
+    def add(self, result):
+        self.episodes += 1
+        self.successes += result["success"]
+        self.steps.add(result["steps"])
+        self.calls += result["calls"]
+
+    def summary(self, confidence=0.95) -> dict:
+        return {
+            "episodes": self.episodes,
+            "success_rate": self.successes / self.episodes if self.episodes else 0.0,
+            "success_interval": wilson_interval(self.successes, self.episodes, confidence),
+            "mean_steps": self.steps.mean,
+            "steps_interval": self.steps.interval(confidence),
+            "llm_calls": self.calls,
+        }
+
+
+class PairedTest:
+    """
+    Sequential test of the paired success difference p_b - p_a. The interval uses the Agresti-Min adjustment
+    (half a pseudo pair in each discordant cell), so identical outcomes do not give a zero width interval.
+    """
+    def __init__(self, delta=0.1, alpha=0.05, max_pairs=200, min_pairs=20, look_every=10):
+        self.delta = delta
+        self.max_pairs = max_pairs
+        self.min_pairs = min_pairs
+        self.look_every = look_every
+        looks = max(1, math.ceil((max_pairs - min_pairs) / look_every) + 1)
+        self.z = NormalDist().inv_cdf(1 - alpha / (2 * looks)) # alpha spent evenly over the looks
+        self.pairs = 0
+        self.a_only = 0 # pairs only A solved
+        self.b_only = 0 # pairs only B solved
+
+    def add(self, success_a, success_b):
+        self.pairs += 1
+        self.a_only += success_a and not success_b
+        self.b_only += success_b and not success_a
+
+    def interval(self):
+        n = self.pairs + 2
+        a, b = self.a_only + 0.5, self.b_only + 0.5
+        difference = (b - a) / n
+        half = self.z * math.sqrt(max(0.0, (a + b) - (b - a) ** 2 / n)) / n
+        return difference - half, difference + half
+
+    def decision(self):
+        """"b_better", "a_better", "equivalent", "undecided" (budget used up) or None to go on."""
+        if self.pairs < self.min_pairs or ((self.pairs - self.min_pairs) % self.look_every and self.pairs < self.max_pairs):
+            return None
+        low, high = self.interval()
+        if low > 0:
+            return "b_better"
+        if high < 0:
+            return "a_better"
+        if -self.delta < low and high < self.delta:
+            return "equivalent"
+        return "undecided" if self.pairs >= self.max_pairs else None
+
+
+class Evaluator:
+    """
+    Plays Generator episodes for frozen Prompt snapshots (see Prompt.snapshot) on a thread pool.
+    Episode i runs on maps[i % len(maps)] with seed + i // len(maps), so two snapshots see the same episodes.
+    """
+    def __init__(self, client, model, maps, seed=0, workers=8, success_rate=0.7, engine="gym", generator_mode="step", budget: EpisodeBudget = None, router: ModelRouter = None):
+        self.client = client
+        self.model = model
+        self.maps = list(maps)
+        self.seed = seed
+        self.workers = workers
+        self.generator_mode = generator_mode
+        self.budget = budget
+        self.router = router
+        self.pools = {name: EnvPool(lambda name=name: FrozenLake.from_map(MAPS[name], success_rate=success_rate, engine=engine)) for name in self.maps}
+
+    def episode(self, snapshot, index) -> dict:
+        map_name = self.maps[index % len(self.maps)]
+        seed = self.seed + index // len(self.maps)
+        with self.pools[map_name].lease() as game:
+            game.reset(seed=seed)
+            generator = Generator(self.client, self.model, game, snapshot, mode=self.generator_mode, budget=self.budget, router=self.router)
+            _, steps = generator.run()
+            env = game.env.unwrapped
+            success = bool(env.desc.ravel()[env.s] == b'G')
+        return {"map": map_name, "seed": seed, "success": success, "steps": steps, "calls": len(generator.step_tokens)}
+
+    def evaluate(self, snapshot, precision=0.05, confidence=0.95, max_episodes=200, min_episodes=20, on_result=None) -> dict:
+        """Runs episodes until the success interval is at most +-precision wide (or max_episodes)."""
+        estimate = Estimate()
+        unused = [0] # LLM calls of episodes that finished after the decision
+
+        def done():
+            low, high = wilson_interval(estimate.successes, estimate.episodes, confidence)
+            return estimate.episodes >= min_episodes and (high - low) / 2 <= precision
+
+        def ignore(result):
+            unused[0] += result["calls"]
+
+        self._stream(lambda i: self.episode(snapshot, i), max_episodes, lambda result: (estimate.add(result), on_result and on_result(result)), done, ignore)
+        summary = estimate.summary(confidence)
+        summary["unused_llm_calls"] = unused[0]
+        summary["total_llm_calls"] = estimate.calls + unused[0]
+        summary["fixed_n_llm_calls"] = self._fixed_calls(estimate.calls, estimate.episodes, max_episodes)
+        return summary
+
+    def compare(self, a, b, delta=0.1, alpha=0.05, max_pairs=200, min_pairs=20, look_every=10, on_result=None) -> dict:
+        """Plays pairs of episodes until PairedTest decides; a pair is one episode of each snapshot on the same map and seed."""
+        test = PairedTest(delta, alpha, max_pairs, min_pairs, look_every)
+        estimates = (Estimate(), Estimate())
+        decision = [None]
+        unused = [0] # LLM calls of pairs that finished after the decision
+
+        def pair(i):
+            return self.episode(a, i), self.episode(b, i)
+
+        def add(results):
+            for estimate, result in zip(estimates, results):
+                estimate.add(result)
+            test.add(results[0]["success"], results[1]["success"])
+            decision[0] = test.decision()
+            if on_result is not None:
+                on_result(results)
+
+        def ignore(results):
+            unused[0] += sum(result["calls"] for result in results)
+
+        self._stream(pair, max_pairs, add, lambda: decision[0] is not None, ignore)
+        calls = estimates[0].calls + estimates[1].calls
+        return {
+            "decision": decision[0] or "undecided",
+            "pairs": test.pairs,
+            "difference_interval": test.interval(),
+            "a": estimates[0].summary(1 - alpha),
+            "b": estimates[1].summary(1 - alpha),
+            "llm_calls": calls,
+            "unused_llm_calls": unused[0],
+            "total_llm_calls": calls + unused[0],
+            "fixed_n_llm_calls": self._fixed_calls(calls, test.pairs, max_pairs),
+        }
+
+    def _stream(self, task, limit, add, done, ignore):
+        """
+        Keeps `workers` tasks in flight and feeds their results to add in completion order until done() or limit.
+        Tasks that already run at the decision cannot be cancelled, their results (and every other result that
+        finishes after it) go to ignore, so that their LLM calls are still accounted for.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            submitted, pending = 0, set()
+            while True:
+                while submitted < limit and len(pending) < self.workers and not done():
+                    pending.add(pool.submit(task, submitted))
+                    submitted += 1
+                if not pending:
+                    return
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if not done():
+                        add(future.result())
+                    else:
+                        ignore(future.result())
+                if done():
+                    running = [future for future in pending if not future.cancel()]
+                    for future in wait(running).done:
+                        ignore(future.result())
+                    return
+
+    @staticmethod
+    def _fixed_calls(calls, units, fixed_units):
+        """LLM calls a fixed-N evaluation of fixed_units episodes (or pairs) would make, at the observed calls per unit."""
+        return round(calls / units * fixed_units) if units else 0
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+
+def load_snapshot(playbook_path):
+    return FrozenLakePrompt(playbook_path=playbook_path).snapshot()
+
+
+def print_estimate(name, summary):
+    low, high = summary["success_interval"]
+    steps_low, steps_high = summary["steps_interval"]
+    print(f"{name}: {summary['episodes']} episodes, success {summary['success_rate']:.3f} [{low:.3f}, {high:.3f}], "
+          f"mean steps {summary['mean_steps']:.1f} [{steps_low:.1f}, {steps_high:.1f}], {summary['llm_calls']} LLM calls")
+
+
+def main():
+    # Client construction is shared with the runner
+    from runner import make_client
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playbook", required=True, help="Playbook of the snapshot to evaluate (A)")
+    parser.add_argument("--against", default=None, help="Playbook of the snapshot to compare with (B)")
+    parser.add_argument("--maps", nargs="+", choices=sorted(MAPS), default=["small_map"])
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first episode per map")
+    parser.add_argument("--model", default="openai/gpt-oss-120b")
+    parser.add_argument("--generator-mode", choices=["step", "plan"], default="step")
+    parser.add_argument("--max-steps", type=int, default=100, help="Moves per episode")
+    parser.add_argument("--small-model", default=None, help="Serve generator calls from safe states with this model, see agents.routing")
+    parser.add_argument("--safe-distance", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=8, help="Episodes in flight")
+    parser.add_argument("--success-rate", type=float, default=0.7)
+    parser.add_argument("--engine", choices=["gym", "tabular"], default="gym")
+    parser.add_argument("--precision", type=float, default=0.05, help="Single snapshot: half width of the success interval")
+    parser.add_argument("--max-episodes", type=int, default=200, help="Single snapshot: episodes of the fixed-N evaluation")
+    parser.add_argument("--delta", type=float, default=0.1, help="Comparison: success differences below this count as equivalent")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--max-pairs", type=int, default=200, help="Comparison: pairs of the fixed-N evaluation")
+    parser.add_argument("--min-pairs", type=int, default=20)
+    parser.add_argument("--look-every", type=int, default=10)
+    parser.add_argument("--client", choices=["openai", "offline"], default="openai")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency of the offline client")
+    parser.add_argument("--base-url", default="https://openrouter.ai/api/v1")
+    parser.add_argument("--api-key-env", default="OPENROUTER_API_KEY")
+    parser.add_argument("--rpm", type=float, default=None)
+    parser.add_argument("--tpm", type=float, default=None)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    client = make_client({**vars(args), "seed": args.seed})
+    router = ModelRouter(args.small_model, args.model, safe_distance=args.safe_distance) if args.small_model else None
+    evaluator = Evaluator(client, args.model, args.maps, seed=args.seed, workers=args.workers, success_rate=args.success_rate,
+                          engine=args.engine, generator_mode=args.generator_mode, budget=EpisodeBudget(max_steps=args.max_steps), router=router)
+    try:
+        if args.against is None:
+            summary = evaluator.evaluate(load_snapshot(args.playbook), precision=args.precision, max_episodes=args.max_episodes)
+            print_estimate(os.path.basename(args.playbook), summary)
+        else:
+            result = evaluator.compare(load_snapshot(args.playbook), load_snapshot(args.against), delta=args.delta, alpha=args.alpha,
+                                       max_pairs=args.max_pairs, min_pairs=args.min_pairs, look_every=args.look_every)
+            low, high = result["difference_interval"]
+            print(f"decision after {result['pairs']} pairs: {result['decision']}, success difference B - A in [{low:+.3f}, {high:+.3f}]")
+            print_estimate(f"A {args.playbook}", result["a"])
+            print_estimate(f"B {args.against}", result["b"])
+            summary = result
+        saved = summary["fixed_n_llm_calls"] - summary["total_llm_calls"]
+        print(f"LLM calls: {summary['total_llm_calls']} ({summary['llm_calls']} counted, {summary['unused_llm_calls']} of episodes finished after the decision), "
+              f"fixed-N evaluation: ~{summary['fixed_n_llm_calls']}, saved ~{saved} ({100 * saved / max(1, summary['fixed_n_llm_calls']):.0f}%)")
+    finally:
+        evaluator.close()
+
+
+if __name__ == "__main__":
+    main()
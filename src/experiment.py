@@ -0,0 +1,202 @@
+import time
+
+from agents.generator import Generator
+from agents.reflector import Reflector
+from agents.curator import Curator
+from agents.gating import CuratorGate
+from environments.FrozenLakeSolver import solve_env
+from prompts.Prompt import Prompt
+from utils.telemetry import NULL_TELEMETRY
+
+STAGES = ("generator", "reflector", "curator")
+
+class Experiment:
+    """
+    The Generator -> Reflector -> Curator learning loop of run.ipynb.
+    Every stage can be run on its own; the wall time of each stage call is recorded in self.timings.
+    With batch_size K > 1 the generator stage plays K episodes that are reflected and curated together,
+    one Reflector and one Curator call per K episodes.
+    """
+    def __init__(self, client, game_environment, prompt: Prompt, model="openai/gpt-oss-120b", reflector_model=None, curator_model=None, context_policy=None, telemetry=NULL_TELEMETRY, trajectory_store=None, batch_size=1, generator_mode="step", generator_stream=False, budget=None, router=None, curator_gate: CuratorGate = None, debug=False):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.client = client
+        self.game_environment = game_environment
+        self.prompt = prompt
+        self.generator_model = model
+        self.reflector_model = reflector_model or model
+        self.curator_model = curator_model or model
+        self.context_policy = context_policy
+        self.telemetry = telemetry
+        self.trajectory_store = trajectory_store # utils.trajectory.TrajectoryStore, every episode is appended if given
+        self.batch_size = batch_size
+        self.generator_mode = generator_mode # "step" or "plan", see Generator
+        self.generator_stream = generator_stream # Stream generator completions and dispatch moves early
+        self.budget = budget # agents.budget.EpisodeBudget of every episode, unbounded if None
+        self.router = router # agents.routing.ModelRouter, the generator model serves every call if None
+        self.curator_gate = curator_gate # Skips or trims Curator calls for reflections without anything new
+        self.debug = debug
+        self.timings = {stage: [] for stage in STAGES}
+        self.steps = []
+        self.step_tokens = [] # Prompt tokens per generator LLM call, one list per episode
+        self.time_to_action = [] # Seconds until the first move was dispatched per generator LLM call, one list per episode
+        self.step_models = [] # Model per generator LLM call, one list per episode
+        self.scores = [] # Every episode compared to the optimal policy, see Solution.score_episode
+        self._solution = None # (unwrapped env, Solution of its map), solved on the first score_episode
+        self.end_reasons = [] # Why every episode ended, see utils.trajectory.END_REASONS
+
+    def generate(self, seed=None):
+        """Plays batch_size episodes (seeds seed, seed + 1, ...) and hands them to the prompt."""
+        start = time.perf_counter()
+        outputs, starts, steps = self._generate_batch(seed, self.prompt)
+        self._set_outputs(outputs, starts, [self.prompt.playbook_version] * len(outputs))
+        self.timings["generator"].append(time.perf_counter() - start)
+        if self.batch_size == 1:
+            return outputs[0], steps[0]
+        return outputs, steps
+
+    def _generate_batch(self, seed, prompt):
+        """(outputs, starts, steps) of batch_size episodes played with prompt (the live prompt or a snapshot)."""
+        outputs, starts, steps = [], [], []
+        for j in range(self.batch_size):
+            generatorOutput, step, start_position = self._episode(None if seed is None else seed + j, prompt)
+            outputs.append(generatorOutput)
+            starts.append(start_position)
+            steps.append(step)
+        return outputs, starts, steps
+
+    def _set_outputs(self, outputs, starts, playbook_versions):
+        if len(outputs) == 1:
+            self.prompt.setGeneratorOutput(outputs[0], starts[0], playbook_versions[0], self._map())
+        else:
+            self.prompt.setGeneratorOutputs(outputs, starts, playbook_versions, self._map())
+        if self.trajectory_store is not None:
+            for trajectory in self.prompt.trajectories:
+                self.trajectory_store.append(trajectory)
+
+    def _map(self):
+        """The map of the game, shown once at the top of every rendered trajectory."""
+        return self.game_environment.env.unwrapped.desc
+
+    def _episode(self, seed, prompt=None):
+        self.game_environment.reset(seed=seed)
+        env = self.game_environment.env.unwrapped
+        start_position = divmod(int(env.s), env.desc.shape[1])
+        generatorLake = Generator(self.client, self.generator_model, self.game_environment, prompt=prompt or self.prompt, context_policy=self.context_policy, telemetry=self.telemetry,
+                                  mode=self.generator_mode, stream=self.generator_stream, budget=self.budget, router=self.router)
+        generatorOutput, step = generatorLake.run(debug=self.debug)
+        self.step_tokens.append(generatorLake.step_tokens)
+        self.time_to_action.append(generatorLake.time_to_action)
+        self.step_models.append(generatorLake.step_models)
+        self.end_reasons.append(generatorLake.end_reason)
+        self.steps.append(step)
+        self.scores.append(self.score_episode(step))
+        return generatorOutput[1:], step, start_position # skip generator prompt
+
+    def score_episode(self, step):
+        """Scores the finished episode against the optimum of the map (solved once per environment, no LLM calls)."""
+        env = self.game_environment.env.unwrapped
+        if self._solution is None or self._solution[0] is not env:
+            self._solution = (env, solve_env(self.game_environment))
+        solution = self._solution[1]
+        success = env.desc.ravel()[env.s] == b'G'
+        score = solution.score_episode(success, step)
+        if self.debug:
+            print(f"== Oracle: success={score['success']} in {step} steps, optimal success probability {score['optimal_success_probability']:.3f}")
+        return score
+
+    def reflect(self):
+        start = time.perf_counter()
+        reflectorLake = Reflector(self.client, self.reflector_model, self.prompt, telemetry=self.telemetry)
+        reflection = reflectorLake.run(debug=self.debug)
+        self.prompt.setReflection(reflection)
+        self.timings["reflector"].append(time.perf_counter() - start)
+        return reflection
+
+    def curate(self):
+        start = time.perf_counter()
+        self._run_curator()
+        self.timings["curator"].append(time.perf_counter() - start)
+
+    def _run_curator(self):
+        """Curator call on the current reflection, unless the curator gate finds nothing new in it."""
+        bullet_ids = None
+        if self.curator_gate is not None:
+            run, bullet_ids = self.curator_gate.review(self.prompt)
+            if not run: # the reflection's tags are already counted by setReflection
+                if self.debug:
+                    print("== Curator skipped: nothing new in the reflection")
+                return
+        curatorLake = Curator(self.client, self.curator_model, self.prompt, telemetry=self.telemetry, bullet_ids=bullet_ids)
+        curatorLake.run(debug=self.debug) # updates playbook
+        self.prompt.refreshPlaybook()
+
+    def run_stage(self, stage, seed=None):
+        """Runs one of STAGES; seed is only used by the generator."""
+        if stage == "generator":
+            return self.generate(seed=seed)
+        if stage == "reflector":
+            return self.reflect()
+        if stage == "curator":
+            return self.curate()
+        raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+
+    def state(self) -> dict:
+        """JSON serializable loop state: playbook, prompt inputs and the metrics collected so far."""
+        return {
+            "playbook": self.prompt.playbook,
+            "playbook_version": self.prompt.playbook_version,
+            "reflection": self.prompt.reflection,
+            "generatorOutputs": self.prompt.generatorOutputs,
+            "starts": [trajectory.start for trajectory in self.prompt.trajectories],
+            "playbook_versions": [trajectory.playbook_version for trajectory in self.prompt.trajectories],
+            "steps": self.steps,
+            "step_tokens": self.step_tokens,
+            "time_to_action": self.time_to_action,
+            "step_models": self.step_models,
+            "scores": self.scores,
+            "end_reasons": self.end_reasons,
+            "curator_gate": self.curator_gate.summary() if self.curator_gate is not None else None,
+            "timings": self.timings,
+        }
+
+    def restore(self, state: dict):
+        """Inverse of state(): writes the playbook back to the store and continues with the saved inputs and metrics."""
+        self.prompt.setPlaybook(state["playbook"])
+        self.prompt.playbook_version = max(self.prompt.playbook_version, state["playbook_version"]) # versions never go back, renders are memoized by version
+        self.prompt.reflection = state["reflection"]
+        versions = state.get("playbook_versions")
+        if len(state["generatorOutputs"]) == 1:
+            self.prompt.setGeneratorOutput(state["generatorOutputs"][0], (state["starts"] or [None])[0], (versions or [None])[0], self._map())
+        else:
+            self.prompt.setGeneratorOutputs(state["generatorOutputs"], state["starts"], versions, self._map())
+        self.steps = state["steps"]
+        self.step_tokens = state["step_tokens"]
+        self.time_to_action = state.get("time_to_action", [])
+        self.step_models = state.get("step_models", [])
+        self.scores = state["scores"]
+        self.end_reasons = state.get("end_reasons", ["terminated"] * len(self.steps))
+        self.timings = state["timings"]
+        if self.curator_gate is not None and state.get("curator_gate"):
+            self.curator_gate.restore(state["curator_gate"])
+        if self.trajectory_store is not None:
+            self.trajectory_store.truncate(len(self.steps)) # episodes generated after the checkpoint are run again
+
+    def run_iteration(self, i, seed=None):
+        self.telemetry.iteration = i + 1
+        if self.debug:
+            print(f"===== Iteration {i+1} =====")
+            print("=== Playbook ===")
+            print(self.prompt.getPlaybookAsString())
+            print("================")
+        self.generate(seed=seed)
+        self.reflect()
+        self.curate()
+        if self.debug:
+            print(f"=== End of Iteration {i+1} ===\n\n")
+
+    def run(self, max_iterations, seed=None):
+        for i in range(max_iterations):
+            self.run_iteration(i, seed=None if seed is None else seed + i * self.batch_size)
+        if self.telemetry.enabled:
+            self.telemetry.print_summary()
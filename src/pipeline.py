@@ -0,0 +1,134 @@
+import copy
+import queue
+import threading
+import time
+
+from agents.reflector import Reflector
+from experiment import Experiment
+
+_DONE = object() # end of a stage's output
+
+
+class PipelinedExperiment(Experiment):
+    """
+    Experiment with the generator, reflector and curator stages running concurrently, connected by bounded queues.
+    The Generator plays against the snapshot the Curator published last and may run max_staleness batches ahead
+    (0 is the sequential loop); the staleness of every batch is kept in self.staleness.
+    """
+    def __init__(self, *args, max_staleness=1, queue_size=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        if max_staleness < 0:
+            raise ValueError("max_staleness must be at least 0")
+        self.max_staleness = max_staleness
+        self.queue_size = queue_size
+        self.staleness = [] # Curated batches missing from the playbook snapshot, per generator batch
+
+    def run(self, max_iterations, seed=None):
+        self._published = self.prompt.snapshot()
+        self._curated = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        errors = []
+        reflect_queue = queue.Queue(maxsize=self.queue_size)
+        curate_queue = queue.Queue(maxsize=self.queue_size)
+
+        def stage(target, *args):
+            def run_stage():
+                try:
+                    target(*args)
+                except BaseException as e:
+                    errors.append(e)
+                    self._stop.set()
+                    with self._condition:
+                        self._condition.notify_all()
+            return threading.Thread(target=run_stage, name=target.__name__, daemon=True)
+
+        threads = [
+            stage(self._generator_stage, max_iterations, seed, reflect_queue),
+            stage(self._reflector_stage, reflect_queue, curate_queue),
+            stage(self._curator_stage, curate_queue),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        if self.telemetry.enabled:
+            self.telemetry.print_summary()
+
+    def _put(self, target_queue, item):
+        """Blocks while the queue is full, gives up once another stage failed."""
+        while not self._stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source_queue):
+        while not self._stop.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _generator_stage(self, max_iterations, seed, out_queue):
+        for i in range(max_iterations):
+            with self._condition:
+                self._condition.wait_for(lambda: self._curated >= i - self.max_staleness or self._stop.is_set())
+                if self._stop.is_set():
+                    return
+                snapshot, curated = self._published, self._curated
+            self.telemetry.iteration = i + 1
+            if self.debug:
+                print(f"===== Iteration {i+1}: generator on playbook version {snapshot.playbook_version} ({i - curated} batches stale) =====")
+            start = time.perf_counter()
+            outputs, starts, _ = self._generate_batch(None if seed is None else seed + i * self.batch_size, snapshot)
+            self.timings["generator"].append(time.perf_counter() - start)
+            self.staleness.append(i - curated)
+            if not self._put(out_queue, (i, outputs, starts, snapshot.playbook_version)):
+                return
+        self._put(out_queue, _DONE)
+
+    def _reflector_stage(self, in_queue, out_queue):
+        while True:
+            item = self._get(in_queue)
+            if item is _DONE:
+                self._put(out_queue, _DONE)
+                return
+            i, outputs, starts, version = item
+            self.telemetry.iteration = i + 1
+            with self._condition:
+                view = copy.copy(self._published) # own trajectory fields on the shared read-only snapshot
+            # the render memo and the retriever change on reads, the generator thread reads the snapshot concurrently
+            view._rendered = dict(view._rendered)
+            view.retriever = copy.deepcopy(view.retriever)
+            view.setGeneratorOutputs(outputs, starts, [version] * len(outputs), self._map())
+            start = time.perf_counter()
+            reflection = Reflector(self.client, self.reflector_model, view, telemetry=self.telemetry).run(debug=self.debug)
+            self.timings["reflector"].append(time.perf_counter() - start)
+            if not self._put(out_queue, (i, outputs, starts, version, reflection)):
+                return
+
+    def _curator_stage(self, in_queue):
+        while True:
+            item = self._get(in_queue)
+            if item is _DONE:
+                return
+            i, outputs, starts, version, reflection = item
+            self.telemetry.iteration = i + 1
+            start = time.perf_counter()
+            self._set_outputs(outputs, starts, [version] * len(outputs))
+            self.prompt.setReflection(reflection)
+            self._run_curator()
+            snapshot = self.prompt.snapshot()
+            with self._condition:
+                self._published = snapshot
+                self._curated += 1
+                self._condition.notify_all()
+            self.timings["curator"].append(time.perf_counter() - start)
+            if self.debug:
+                print(f"=== End of Iteration {i+1}: published playbook version {snapshot.playbook_version} ===\n\n")
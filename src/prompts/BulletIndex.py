@@ -0,0 +1,129 @@
+import re
+import zlib
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def shingles(text: str, size=5) -> frozenset:
+    """Character n-grams of the lower cased text with punctuation and whitespace collapsed to single spaces."""
+    normalized = _NON_WORD.sub(" ", text.lower()).strip()
+    if len(normalized) <= size:
+        return frozenset((normalized,)) if normalized else frozenset()
+    return frozenset(normalized[i:i + size] for i in range(len(normalized) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class BulletIndex:
+    """
+    Incremental MinHash/LSH index over bullet contents for near-duplicate lookups without an LLM.
+
+    Every bullet is reduced to its character shingles and a MinHash signature of `bands * rows` values.
+    The signature is cut into bands, bullets sharing any band are candidates, and candidates are verified
+    with the exact Jaccard similarity of their shingles. A lookup therefore only touches the buckets of the
+    query, independent of the number of bullets.
+
+    Args:
+        threshold: Default Jaccard similarity from which a bullet counts as a near duplicate.
+        bands, rows: LSH shape; the probability that a pair with similarity s becomes a candidate is
+            1 - (1 - s^rows)^bands (0.997 at s=0.7 and 0.28 at s=0.4 for the defaults).
+        shingle_size: Characters per shingle.
+    """
+    def __init__(self, threshold=0.7, bands=32, rows=5, shingle_size=5, seed=0):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing, uint64 arithmetic wraps around
+        self._a = rng.integers(1, 2**63, size=bands * rows, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=bands * rows, dtype=np.uint64)
+        self._shingles = {} # bullet id -> shingles
+        self._band_keys = {} # bullet id -> keys of its buckets
+        self._buckets = [{} for _ in range(bands)] # band -> bucket key -> set of bullet ids
+
+    def __len__(self):
+        return len(self._shingles)
+
+    def __contains__(self, bullet_id):
+        return bullet_id in self._shingles
+
+    def signature(self, shingle_set: frozenset) -> np.ndarray:
+        if not shingle_set:
+            return np.zeros(self.bands * self.rows, dtype=np.uint64)
+        x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        return ((self._a[:, None] * x[None, :] + self._b[:, None]) >> np.uint64(32)).min(axis=1)
+
+    def _keys(self, shingle_set):
+        signature = self.signature(shingle_set).reshape(self.bands, self.rows)
+        return [band.tobytes() for band in signature]
+
+    def add(self, bullet_id: str, content: str):
+        if bullet_id in self._shingles:
+            self.remove(bullet_id)
+        shingle_set = shingles(content, self.shingle_size)
+        keys = self._keys(shingle_set)
+        self._shingles[bullet_id] = shingle_set
+        self._band_keys[bullet_id] = keys
+        for buckets, key in zip(self._buckets, keys):
+            buckets.setdefault(key, set()).add(bullet_id)
+
+    def update(self, bullet_id: str, content: str):
+        self.add(bullet_id, content)
+
+    def remove(self, bullet_id: str):
+        keys = self._band_keys.pop(bullet_id, None)
+        if keys is None:
+            return
+        del self._shingles[bullet_id]
+        for buckets, key in zip(self._buckets, keys):
+            bucket = buckets[key]
+            bucket.discard(bullet_id)
+            if not bucket:
+                del buckets[key]
+
+    def similar(self, content: str, threshold=None, limit=5, exclude=None):
+        """
+        Bullets similar to content, most similar first.
+
+        Returns:
+            [(bullet_id, jaccard similarity), ...] with similarity >= threshold (self.threshold by default)
+        """
+        threshold = self.threshold if threshold is None else threshold
+        shingle_set = shingles(content, self.shingle_size)
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._keys(shingle_set)):
+            candidates |= buckets.get(key, set())
+        candidates.discard(exclude)
+        scored = [(bullet_id, jaccard(shingle_set, self._shingles[bullet_id])) for bullet_id in candidates]
+        scored = sorted((item for item in scored if item[1] >= threshold), key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def overlaps(self, content: str) -> dict:
+        """
+        Shingle overlap of content with every bullet sharing at least one shingle (a linear scan, no LSH).
+
+        Returns:
+            {bullet_id: (share of content's shingles in the bullet, share of the bullet's shingles in content)}
+        """
+        shingle_set = shingles(content, self.shingle_size)
+        if not shingle_set:
+            return {}
+        result = {}
+        for bullet_id, bullet_shingles in self._shingles.items():
+            common = len(shingle_set & bullet_shingles)
+            if common:
+                result[bullet_id] = (common / len(shingle_set), common / len(bullet_shingles))
+        return result
+
+    def clear(self):
+        self._shingles.clear()
+        self._band_keys.clear()
+        for buckets in self._buckets:
+            buckets.clear()
@@ -1,11 +1,10 @@
 from prompts.Prompt import Prompt
 
-class FrozenLakePrompt(Prompt):
-    def getGeneratorPrompt(self, state="") -> str:
-        return [
-            {
-                "role": "system",
-                "content": f'''
+# The static instructions of every prompt are module constants and always come first. Only the playbook
+# (re-rendered per playbook version) and then the volatile inputs (reflection, trajectory, state) follow,
+# so consecutive requests share a long identical prefix that providers can serve from their prompt cache.
+
+GENERATOR_INSTRUCTIONS = '''
 You are a multi-turn LLM Agent Navigator in a dynamic 2D environment. Your goal: reach position G from current position [] using the provided tools for movement.
 
 ## Multi-Turn Operation
@@ -41,58 +40,48 @@ Read the playbook and the reflection -> Apply rules, knowledge and strategies re
 ✗ Don't assume behaviors not observed in the trajectory
 
 ## Input Context
-PLAYBOOK_START
-{self.playbook if self.playbook is not None else 'No playbook available'}
-PLAYBOOK_END
+'''
 
-REFLECTION_START
-{self.reflection if self.reflection is not None else 'No prior mistakes recorded'}
-REFLECTION_END
+PLANNER_INSTRUCTIONS = '''
+You are a multi-turn LLM Agent Navigator in a dynamic 2D environment. Your goal: reach position G from current position [] using the provided tool for movement.
 
-STATE_START
-{state if state is not None else 'State unavailable'}
-STATE_END
+## Plan-and-Execute Operation
+Instead of a single move you submit a PLAN: a sequence of moves, each with the position (row, col) you expect to reach after it. Rows and columns are counted from the top-left cell (0,0).
+The environment executes the plan move by move and stops early as soon as the observed position differs from the one you expected (for example because the ice slipped) or the episode ends. You are then called again with the updated trace and plan from the new position.
+
+You receive a NAVIGATION TRAJECTORY containing:
+- All your previous plans and reasoning
+- Environment responses after each executed move (including the position reached and whether the ice slipped)
+- Current state resulting from the last executed move
+
+## Core Task
+Read the playbook and the reflection -> Apply rules, knowledge and strategies retrieved from those documents -> Plan the next moves from the given context
+
+## Decision Process
+1. **Apply Learning**
+   - PLAYBOOK: Proven strategies for similar situations, common failure patterns, environment dynamics
+   - REFLECTION: What worked and what failed, corrected approaches
+
+2. **Construct your plan** (from trajectory)
+   - Use the learned strategies to reason
+   - Prefer plans that stay away from holes, a slip is always possible
+
+3. **Execute the Plan**
+   - Reason concisely (this persists in your trace)
+   - Call exactly ONE tool: execute_plan, with every move and its expected position
+   - Environment executes until a divergence or the end of the plan → new state → next iteration begins
+
+## Critical Constraints
+✓ Remember you are navigating a dynamic 2D environment where the reaction of the environment to your moves is non-deterministic.
+✓ One execute_plan call per turn
+✓ Expected positions must follow from the previous position and the move (moves into the border keep you in place)
+✓ Your reasoning propagates forward—be clear and useful
+✗ Don't assume behaviors not observed in the trajectory
+
+## Input Context
 '''
-            }
-        ]
-    
-    def getGeneratorTools(self) -> str:
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "move_left",
-                    "description": "Moves the player left in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "move_right",
-                    "description": "Moves the player right in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "move_up",
-                    "description": "Moves the player up in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "move_down",
-                    "description": "Moves the player down in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
-                }
-            }
-        ]
-    
-    def getReflectorPrompt(self) -> str:
-        return [
-            {
-                "role": "system",
-                "content": f'''
+
+REFLECTOR_INSTRUCTIONS = '''
 You are an expert reflection agent analyzing a multi-turn navigation trajectory. The navigation agent operated iteratively: it received a trace, made ONE decision using guidance from a PLAYBOOK, got environment feedback, then was called again with the updated trace. Your job is to diagnose what went wrong across these iterations AND evaluate the playbook's effectiveness.
 Remind yourself: the environment the agent navigated is dynamic and non-deterministic. The agent must learn from its growing trace to adapt its strategy over time.
 
@@ -102,6 +91,7 @@ The NAVIGATION_TRAJECTORY shows:
 - Single action executed per turn
 - Environment's response after each action
 - How errors compounded or were corrected across iterations
+- STOPPED EARLY if the episode was cut off by its move, token or time budget or because the agent kept repeating the same move from the same position (no terminal state was reached, diagnose why the agent made no progress)
 
 ## Your Analysis Task
 1. **Trace the Decision Chain**: Follow how the agent interpreted its growing trace at each step
@@ -127,33 +117,62 @@ The NAVIGATION_TRAJECTORY shows:
 ✓ Provide actionable corrections applicable to future multi-turn episodes
 ✗ Don't learn specific positions or obstacle locations
 
-## Inputs
-NAVIGATION_TRAJECTORY_BEGIN
-{self.generatorOutput if self.generatorOutput is not None else ''}
-NAVIGATION_TRAJECTORY_END
-
-PLAYBOOK_BEGIN
-{self.playbook if self.playbook is not None else ''}
-PLAYBOOK_END
-
 ## Required Output (JSON only)
-{{
+{
   "reasoning": "[Trace the multi-turn decision chain: what did the agent observe, decide, and receive as feedback at each iteration? Which playbook strategies were applied? Where did the reasoning break down?]",
   "error_identification": "[Specific mistakes in trace interpretation, playbook application, tool usage, or strategy selection across turns]",
   "root_cause_analysis": "[Why did the agent fail to learn from its growing trace? What concept about multi-turn operation was misunderstood? Were playbook strategies misleading or misapplied?]",
   "correct_approach": "[Step-by-step: how should the agent have processed the trace, applied playbook guidance, and made decisions differently?]",
   "key_insight": "[Generalizable strategy for multi-turn navigation: principles for trace interpretation, feedback integration, playbook usage, or tool usage]",
-  "bullet_tags": [{{"id": "example_id", "tag": "helpful|harmful"}}]
-}}
+  "bullet_tags": [{"id": "example_id", "tag": "helpful|harmful"}]
+}
+
+## Inputs
 '''
-            }
-        ]
-    
-    def getCuratorPrompt(self) -> str:
-        return [
-            {
-                "role": "system",
-                "content": f'''
+
+BATCH_REFLECTOR_INSTRUCTIONS = '''
+You are an expert reflection agent analyzing several multi-turn navigation trajectories that were generated with the same PLAYBOOK. In each trajectory the navigation agent operated iteratively: it received a trace, made ONE decision using guidance from the PLAYBOOK, got environment feedback, then was called again with the updated trace. Your job is to diagnose what went wrong in each trajectory, find the patterns that repeat across them AND evaluate the playbook's effectiveness.
+Remind yourself: the environment the agent navigated is dynamic and non-deterministic. The agent must learn from its growing trace to adapt its strategy over time.
+
+## Understanding the Trajectories
+Every trajectory starts with a TRAJECTORY i OF k header and a summary line (moves, outcome, slips, total reward), followed by one entry per move:
+- The agent's reasoning before the move
+- The move and the resulting position (row, col), SLIPPED if the ice moved the agent elsewhere, END when the episode terminated
+A STOPPED EARLY line means the episode was cut off by its move, token or time budget or because the agent kept repeating the same move from the same position; diagnose why the agent made no progress.
+
+## Your Analysis Task
+1. **Per Trajectory**: Trace the decision chain, find the breaking points and tag the playbook bulletpoints that guided (or misled) the agent in THIS trajectory
+2. **Across Trajectories**: Which failures and successes repeat? Which playbook strategies consistently help or hurt?
+3. **Evaluate Each Playbook Bulletpoint**: Tag as 'helpful', 'harmful', or dont tag (skip) it if it was neutral, once per trajectory it influenced
+
+## Critical Constraints
+✓ Explicitly assess each playbook item's impact on navigation
+✓ Focus on strategy and tool usage patterns (not environment layout—it changes)
+✓ Ground analysis in actual environment feedback, not assumptions
+✓ Prefer insights supported by several trajectories over one-off observations
+✗ Don't learn specific positions or obstacle locations
+✗ Don't repeat per trajectory tags at the top level, they are aggregated automatically
+
+## Required Output (JSON only)
+{
+  "trajectories": [
+    {
+      "index": 1,
+      "outcome_analysis": "[What happened in this trajectory and where the reasoning broke down]",
+      "bullet_tags": [{"id": "example_id", "tag": "helpful|harmful"}]
+    }
+  ],
+  "reasoning": "[Patterns across the trajectories: which decisions, feedback interpretations and playbook applications repeat?]",
+  "error_identification": "[Mistakes that occurred in several trajectories]",
+  "root_cause_analysis": "[Why did the agent repeatedly fail to learn from its growing trace? Were playbook strategies misleading or misapplied?]",
+  "correct_approach": "[Step-by-step: how should the agent have processed the trace, applied playbook guidance, and made decisions differently?]",
+  "key_insight": "[Generalizable strategy for multi-turn navigation, supported by the trajectories]"
+}
+
+## Inputs
+'''
+
+CURATOR_INSTRUCTIONS = '''
 You are a master curator of 2D navigation knowledge. Your job is to maintain a clean, concise playbook by analyzing reflections and updating existing entries strategically.
 The playbook guides future naviagation agents in reaching goals efficiently while avoiding common pitfalls. You are provided with the playbook, the navigation trajectory generated by the agent, and the reflection analysis of its performance.
 Please use the tools described below to ADD, REMOVE, or MODIFY bulletpoints in the playbook based on your analysis.
@@ -184,20 +203,6 @@ Before adding ANY new content, check existing playbook:
 - **Clean format**: Each bulletpoint must be a single, clear statement (no sub-bullets or lists within)
 - **If no changes needed**: Don't call any tools
 
-## Inputs
-
-CURRENT_PLAYBOOK_BEGIN
-{self.playbook if self.playbook is not None else ''}
-CURRENT_PLAYBOOK_END
-
-NAVIGATION_TRAJECTORY_BEGIN
-{self.generatorOutput}
-NAVIGATION_TRAJECTORY_END
-
-REFLECTION_BEGIN
-{self.reflection}
-REFLECTION_END
-
 ## Your Task
 1. Analyze the reflection about the given navigation trajectory
 2. Analyze the given navigation trajectory with the reflection in mind
@@ -211,69 +216,205 @@ REFLECTION_END
 7. If a lot of entries were tagged 'harmful', REMOVE them
 
 Remember: A tight, well-curated playbook of 5-10 bulletpoints is far better than a bloated one with 20+ redundant entries.
+
+## Inputs
+
+'''
+
+GENERATOR_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "move_left",
+            "description": "Moves the player left in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "move_right",
+            "description": "Moves the player right in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "move_up",
+            "description": "Moves the player up in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "move_down",
+            "description": "Moves the player down in the 2D environment. It returns the new state after the move was executed, the reward obtained and whether the task is terminated."
+        }
+    }
+]
+
+PLANNER_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "execute_plan",
+            "description": "Executes a sequence of moves in the 2D environment. Execution stops early when the position reached differs from the expected position or the task is terminated. It returns the state, reward, position and slip flag after every executed move.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "moves": {
+                        "type": "array",
+                        "description": "The planned moves in execution order.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "move": {
+                                    "type": "string",
+                                    "enum": ["move_left", "move_right", "move_up", "move_down"],
+                                    "description": "The move to execute."
+                                },
+                                "expected_position": {
+                                    "type": "array",
+                                    "items": {"type": "integer"},
+                                    "description": "The position [row, col] expected after this move."
+                                }
+                            },
+                            "required": ["move", "expected_position"]
+                        }
+                    }
+                },
+                "required": ["moves"]
+            }
+        }
+    }
+]
+
+CURATOR_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "ADD",
+            "description": "Adds a new entry into the playbook to help future navigation tasks.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "section": {
+                        "type": "string",
+                        "description": "The section of the playbook to which the new entry should be added. If there is no appropriate section, it will create a new section with a relevant title. If you can please reuse existing sections.",
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "The content of the new entry to be added to the playbook. This could be a strategy, tip, common mistake to avoid, or any other relevant information that would help in future navigation tasks."
+                    }
+                },
+                "required": ["section", "content"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "REMOVE",
+            "description": "Removes an existing entry from the playbook that is deemed unhelpful or redundant for future navigation tasks.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "bullet_id": {
+                        "type": "string",
+                        "description": "The identifier of the bulletpoint to be removed from the playbook."
+                    }
+                },
+                "required": ["bullet_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "MODIFY",
+            "description": "Modifies an existing entry in the playbook to improve its clarity, accuracy, or relevance for future navigation tasks.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "bullet_id": {
+                        "type": "string",
+                        "description": "The identifier of the bulletpoint to be modified to the playbook."
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "The content which will overwrite the existing entry in the playbook."
+                    }
+                },
+                "required": ["bullet_id", "content"]
+            }
+        }
+    }
+]
+
+class FrozenLakePrompt(Prompt):
+    def getGeneratorPrompt(self, state="") -> list:
+        return [
+            {
+                "role": "system",
+                "content": self.getPlaybookPrefix(GENERATOR_INSTRUCTIONS, "PLAYBOOK_START", "PLAYBOOK_END", empty='No playbook available', query=f"{self.reflection}\n{state}") + f'''REFLECTION_START
+{self.reflection if self.reflection is not None else 'No prior mistakes recorded'}
+REFLECTION_END
+
+STATE_START
+{state if state is not None else 'State unavailable'}
+STATE_END
 '''
             }
         ]
     
-    def getCuratorTools(self) -> str:
+    def getGeneratorTools(self) -> list:
+        return GENERATOR_TOOLS
+
+    def getPlannerPrompt(self, state="") -> list:
         return [
             {
-                "type": "function",
-                "function": {
-                    "name": "ADD",
-                    "description": "Adds a new entry into the playbook to help future navigation tasks.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "section": {
-                                "type": "string",
-                                "description": "The section of the playbook to which the new entry should be added. If there is no appropriate section, it will create a new section with a relevant title. If you can please reuse existing sections.",
-                            },
-                            "content": {
-                                "type": "string",
-                                "description": "The content of the new entry to be added to the playbook. This could be a strategy, tip, common mistake to avoid, or any other relevant information that would help in future navigation tasks."
-                            }
-                        },
-                        "required": ["section", "content"]
-                    }
-                }
-            },
+                "role": "system",
+                "content": self.getPlaybookPrefix(PLANNER_INSTRUCTIONS, "PLAYBOOK_START", "PLAYBOOK_END", empty='No playbook available', query=f"{self.reflection}\n{state}") + f'''REFLECTION_START
+{self.reflection if self.reflection is not None else 'No prior mistakes recorded'}
+REFLECTION_END
+
+STATE_START
+{state if state is not None else 'State unavailable'}
+STATE_END
+'''
+            }
+        ]
+
+    def getPlannerTools(self) -> list:
+        return PLANNER_TOOLS
+    
+    def getReflectorPrompt(self) -> list:
+        # Several trajectories (see setGeneratorOutputs) are reflected in one call
+        instructions = BATCH_REFLECTOR_INSTRUCTIONS if len(self.trajectories) > 1 else REFLECTOR_INSTRUCTIONS
+        return [
             {
-                "type": "function",
-                "function": {
-                    "name": "REMOVE",
-                    "description": "Removes an existing entry from the playbook that is deemed unhelpful or redundant for future navigation tasks.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "bullet_id": {
-                                "type": "string",
-                                "description": "The identifier of the bulletpoint to be removed from the playbook."
-                            }
-                        },
-                        "required": ["bullet_id"]
-                    }
-                }
-            },
+                "role": "system",
+                "content": self.getPlaybookPrefix(instructions, "PLAYBOOK_BEGIN", "PLAYBOOK_END", query=self.getTrajectoryText()) + f'''NAVIGATION_TRAJECTORY_BEGIN
+{self.getTrajectoryText()}
+NAVIGATION_TRAJECTORY_END
+'''
+            }
+        ]
+    
+    def getCuratorPrompt(self, bullet_ids=None) -> list:
+        # The Curator edits the playbook and sees all of it unless the curator gate picked the relevant bullets
+        return [
             {
-                "type": "function",
-                "function": {
-                    "name": "MODIFY",
-                    "description": "Modifies an existing entry in the playbook to improve its clarity, accuracy, or relevance for future navigation tasks.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "bullet_id": {
-                                "type": "string",
-                                "description": "The identifier of the bulletpoint to be modified to the playbook."
-                            },
-                            "content": {
-                                "type": "string",
-                                "description": "The content which will overwrite the existing entry in the playbook."
-                            }
-                        },
-                        "required": ["bullet_id", "content"]
-                    }
-                }
+                "role": "system",
+                "content": self.getPlaybookPrefix(CURATOR_INSTRUCTIONS, "CURRENT_PLAYBOOK_BEGIN", "CURRENT_PLAYBOOK_END", bullet_ids=bullet_ids) + f'''NAVIGATION_TRAJECTORY_BEGIN
+{self.getTrajectoryText()}
+NAVIGATION_TRAJECTORY_END
+
+REFLECTION_BEGIN
+{self.reflection}
+REFLECTION_END
+'''
             }
-        ]
\ No newline at end of file
+        ]
+    
+    def getCuratorTools(self) -> list:
+        return CURATOR_TOOLS
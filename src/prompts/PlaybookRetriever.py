@@ -0,0 +1,129 @@
+import math
+import re
+from collections import Counter
+
+from utils.tokens import estimate_tokens
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have if in into is it its of on or so that the then there
+these this to was were when which while will with you your
+""".split())
+
+
+def terms(text: str) -> list:
+    """Lower cased words of the text without stopwords and single characters (grid cells such as F or H)."""
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def tag_weight(helpful, harmful) -> float:
+    """Multiplier from the reflection counters: 1 for an untagged bullet, towards 2 if helpful, towards 0 if harmful."""
+    return 2 * (helpful + 1) / (helpful + harmful + 2)
+
+
+class PlaybookRetriever:
+    """
+    Incremental BM25 index over bullet contents that picks the bullets relevant to a query (the current state,
+    reflection or trajectory) under a bullet and token budget, so prompts stay the same size as the playbook grows.
+    Scores are multiplied by tag_weight of the bullet's helpful/harmful counters if use_tags is set.
+    Bullets without a lexical match only fill the budget left over, best tagged first.
+
+    Args:
+        k: Maximum number of bullets selected.
+        max_tokens: Maximum estimated tokens of the selected bullet contents.
+        k1, b: BM25 term frequency saturation and length normalisation.
+        use_tags: Weight scores by the helpful/harmful counters.
+    """
+    def __init__(self, k=20, max_tokens=1500, k1=1.5, b=0.75, use_tags=True):
+        self.k = k
+        self.max_tokens = max_tokens
+        self.k1 = k1
+        self.b = b
+        self.use_tags = use_tags
+        self._postings = {} # term -> {bullet id: term frequency}
+        self._lengths = {} # bullet id -> number of terms
+        self._terms = {} # bullet id -> distinct terms
+        self._tokens = {} # bullet id -> estimated tokens of the rendered bullet
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, bullet_id, content):
+        if bullet_id in self._lengths:
+            self.remove(bullet_id)
+        counts = Counter(terms(content))
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[bullet_id] = count
+        self._lengths[bullet_id] = sum(counts.values())
+        self._terms[bullet_id] = tuple(counts)
+        self._tokens[bullet_id] = estimate_tokens(content) + 24 # id and counters of the rendered line
+        self._total_length += self._lengths[bullet_id]
+
+    def update(self, bullet_id, content):
+        self.add(bullet_id, content)
+
+    def remove(self, bullet_id):
+        length = self._lengths.pop(bullet_id, None)
+        if length is None:
+            return
+        self._tokens.pop(bullet_id)
+        self._total_length -= length
+        for term in self._terms.pop(bullet_id):
+            del self._postings[term][bullet_id]
+            if not self._postings[term]:
+                del self._postings[term]
+
+    def clear(self):
+        self._postings.clear()
+        self._lengths.clear()
+        self._terms.clear()
+        self._tokens.clear()
+        self._total_length = 0
+
+    def scores(self, query) -> dict:
+        """BM25 score of every bullet sharing a term with the query."""
+        n = len(self._lengths)
+        if n == 0:
+            return {}
+        average = self._total_length / n or 1.0
+        scores = {}
+        for term in set(terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for bullet_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[bullet_id] / average)
+                scores[bullet_id] = scores.get(bullet_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def select(self, query, bullets: dict, k=None, max_tokens=None) -> list:
+        """
+        Ids of the bullets to show for the query, best first.
+
+        Args:
+            query: Text the bullets should be relevant to.
+            bullets: bullet id -> bulletpoint dict (for the helpful/harmful counters).
+            k, max_tokens: Override the budgets of this retriever.
+        """
+        k = self.k if k is None else k
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        if len(self._lengths) <= k and sum(self._tokens.values()) <= max_tokens:
+            return list(self._lengths) # everything fits, nothing to choose
+        scores = self.scores(query)
+
+        def weight(bullet_id):
+            bp = bullets.get(bullet_id, {})
+            return tag_weight(bp.get("helpful", 0), bp.get("harmful", 0)) if self.use_tags else 1.0
+
+        matched = sorted(scores, key=lambda bullet_id: scores[bullet_id] * weight(bullet_id), reverse=True)
+        rest = sorted((bullet_id for bullet_id in self._lengths if bullet_id not in scores), key=weight, reverse=True)
+        selected, used = [], 0
+        for bullet_id in matched + rest:
+            if len(selected) == k:
+                break
+            if used + self._tokens[bullet_id] <= max_tokens:
+                selected.append(bullet_id)
+                used += self._tokens[bullet_id]
+        return selected
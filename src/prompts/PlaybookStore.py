@@ -0,0 +1,269 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import json
+import os
+import sqlite3
+import threading
+
+TAGS = ("helpful", "harmful")
+
+class PlaybookStore(ABC):
+    """
+    Persistence backend of the playbook used by Prompt.
+    Prompt keeps the playbook dict in memory and reports every mutation to the store.
+    Mutations inside `with store.transaction():` are persisted together (one write/commit).
+    """
+
+    @abstractmethod
+    def load(self) -> dict:
+        """Returns the playbook as {"sections": [{"title": ..., "bulletpoints": [...]}, ...]}."""
+        pass
+
+    @abstractmethod
+    def save(self, playbook: dict):
+        """Writes the whole playbook (JsonPlaybookStore replaces the file, SqlitePlaybookStore merges it)."""
+        pass
+
+    @abstractmethod
+    def add_bullet(self, section: str, bullet: dict):
+        pass
+
+    def has_bullet(self, bullet_id: str) -> bool:
+        """Whether the store holds bullet_id, e.g. added by another writer since the last load (single writer: never)."""
+        return False
+
+    @abstractmethod
+    def remove_bullet(self, bullet_id: str):
+        pass
+
+    @abstractmethod
+    def update_content(self, bullet_id: str, content: str):
+        pass
+
+    @abstractmethod
+    def increment(self, bullet_id: str, tag: str, amount: int = 1):
+        """Atomically adds amount to the 'helpful' or 'harmful' counter of a bullet."""
+        pass
+
+    @abstractmethod
+    @contextmanager
+    def transaction(self):
+        pass
+
+    def changed(self) -> bool:
+        """Whether another writer may have changed the stored playbook since this store last loaded or wrote it."""
+        return True
+
+    def export_json(self, path: str):
+        """Writes the stored playbook in the res/playbook.json format."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.load(), file, indent=4)
+
+
+class JsonPlaybookStore(PlaybookStore):
+    """
+    The original res/playbook.json file. Every mutation rewrites the whole file, batched to one write per transaction.
+    The file is replaced atomically but concurrent writers still overwrite each other, use SqlitePlaybookStore to share a playbook.
+    """
+    def __init__(self, path="res/playbook.json"):
+        self.path = path
+        self._playbook = {"sections": []}
+        self._depth = 0
+        self._dirty = False
+        self._stamp = None # (mtime_ns, size) of the file as last loaded or written
+
+    def load(self) -> dict:
+        stamp = self._file_stamp()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                content = file.read()
+                if not content.strip():
+                    self._playbook = {"sections": [{}]}
+                else:
+                    self._playbook = json.loads(content)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._playbook = {"sections": []}
+        self._stamp = stamp
+        return self._playbook
+
+    def changed(self) -> bool:
+        return self._stamp is None or self._file_stamp() != self._stamp
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def save(self, playbook: dict):
+        self._playbook = playbook
+        self._changed()
+
+    # Prompt already applied the mutation to the dict returned by load(), only the file is outdated
+    def add_bullet(self, section: str, bullet: dict):
+        self._changed()
+
+    def remove_bullet(self, bullet_id: str):
+        self._changed()
+
+    def update_content(self, bullet_id: str, content: str):
+        self._changed()
+
+    def increment(self, bullet_id: str, tag: str, amount: int = 1):
+        self._changed()
+
+    @contextmanager
+    def transaction(self):
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self._dirty:
+                self._write()
+
+    def _changed(self):
+        self._dirty = True
+        if self._depth == 0:
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._playbook, file, indent=4)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._stamp = self._file_stamp()
+
+
+class SqlitePlaybookStore(PlaybookStore):
+    """
+    SQLite (WAL mode) playbook that can be shared by parallel workers and processes.
+    Counter updates are single UPDATE statements, a transaction is one commit.
+    An empty database is seeded from json_path if given.
+    """
+    def __init__(self, path="res/playbook.sqlite", json_path=None, timeout=30.0):
+        self.path = path
+        self._local = threading.local()
+        self.timeout = timeout
+        with self.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS sections (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT UNIQUE)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bullets ("
+                "id TEXT PRIMARY KEY, section_id INTEGER NOT NULL REFERENCES sections(id), position INTEGER NOT NULL, "
+                "content TEXT NOT NULL, helpful INTEGER NOT NULL DEFAULT 0, harmful INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS bullets_by_section ON bullets (section_id, position)")
+            is_empty = connection.execute("SELECT COUNT(*) FROM sections").fetchone()[0] == 0
+        if is_empty and json_path is not None:
+            playbook = JsonPlaybookStore(json_path).load()
+            if playbook.get("sections"):
+                self.save(playbook)
+
+    @property
+    def connection(self):
+        # sqlite3 connections must not be shared between threads, every thread gets its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.depth = 0
+            self._local.data_version = None
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection
+        if self._local.depth == 0:
+            connection.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield connection
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                connection.execute("ROLLBACK")
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            connection.execute("COMMIT")
+
+    def load(self) -> dict:
+        sections = {}
+        self._local.data_version = self._data_version()
+        rows = self.connection.execute(
+            "SELECT s.id, s.title, b.id, b.content, b.helpful, b.harmful FROM sections s "
+            "LEFT JOIN bullets b ON b.section_id = s.id ORDER BY s.id, b.position"
+        )
+        for section_id, title, bullet_id, content, helpful, harmful in rows:
+            sec = sections.setdefault(section_id, {"title": title, "bulletpoints": []})
+            if bullet_id is not None:
+                sec["bulletpoints"].append({"id": bullet_id, "content": content, "helpful": helpful, "harmful": harmful})
+        return {"sections": list(sections.values())}
+
+    def save(self, playbook: dict):
+        """
+        Merges the playbook by bullet id instead of replacing the tables, so bullets and counters other workers
+        committed survive: new bullets are appended, stored ones take its content and the larger counters.
+        """
+        with self.transaction() as connection:
+            for sec in playbook.get("sections", []):
+                if "title" not in sec:
+                    continue
+                section_id = self._section_id(sec["title"])
+                for bp in sec.get("bulletpoints", []):
+                    connection.execute(
+                        "INSERT INTO bullets (id, section_id, position, content, helpful, harmful) "
+                        "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM bullets WHERE section_id = ?), ?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET content = excluded.content, "
+                        "helpful = MAX(helpful, excluded.helpful), harmful = MAX(harmful, excluded.harmful)",
+                        (bp["id"], section_id, section_id, bp.get("content", ""), bp.get("helpful", 0), bp.get("harmful", 0)),
+                    )
+
+    def add_bullet(self, section: str, bullet: dict):
+        with self.transaction() as connection:
+            section_id = self._section_id(section)
+            connection.execute(
+                "INSERT INTO bullets (id, section_id, position, content, helpful, harmful) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM bullets WHERE section_id = ?), ?, ?, ?)",
+                (bullet["id"], section_id, section_id, bullet.get("content", ""), bullet.get("helpful", 0), bullet.get("harmful", 0)),
+            )
+
+    def has_bullet(self, bullet_id: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM bullets WHERE id = ?", (bullet_id,)).fetchone() is not None
+
+    def remove_bullet(self, bullet_id: str):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM bullets WHERE id = ?", (bullet_id,))
+
+    def update_content(self, bullet_id: str, content: str):
+        with self.transaction() as connection:
+            connection.execute("UPDATE bullets SET content = ? WHERE id = ?", (content, bullet_id))
+
+    def increment(self, bullet_id: str, tag: str, amount: int = 1):
+        if tag not in TAGS:
+            raise ValueError(f"Unknown tag '{tag}', expected one of {TAGS}")
+        with self.transaction() as connection:
+            connection.execute(f"UPDATE bullets SET {tag} = {tag} + ? WHERE id = ?", (amount, bullet_id))
+
+    def changed(self) -> bool:
+        # data_version changes with every commit of another connection, not with the commits of this one
+        seen = getattr(self._local, "data_version", None)
+        return seen is None or self._data_version() != seen
+
+    def _data_version(self):
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _section_id(self, title):
+        connection = self.connection
+        connection.execute("INSERT OR IGNORE INTO sections (title) VALUES (?)", (title,))
+        return connection.execute("SELECT id FROM sections WHERE title = ?", (title,)).fetchone()[0]
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
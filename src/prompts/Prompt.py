@@ -1,119 +1,374 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from collections import Counter
+import copy
 import json
 import uuid
 
+from prompts.BulletIndex import BulletIndex
+from prompts.PlaybookRetriever import PlaybookRetriever
+from prompts.PlaybookStore import PlaybookStore, JsonPlaybookStore, TAGS
+from utils.trajectory import Trajectory
+
+DUPLICATE_MODES = ("fold", "flag", "add")
+BULLET_NAMESPACE = uuid.UUID("6f1c2b9e-3d4a-5e8f-9a0b-7c6d5e4f3a2b") # uuid5 namespace of the bullet ids
+
 class Prompt(ABC):    
-    def __init__(self, playbook='', reflection='', generatorOutput='', playbook_path="res/playbook.json"):
+    """
+    on_duplicate decides what addFromPlaybook does with content that is a near duplicate (Jaccard similarity
+    >= duplicate_threshold, see BulletIndex) of an existing bullet:
+        "fold": nothing is added, the existing bullet stands for it
+        "flag": the bullet is added anyway
+        "add": no duplicate check
+    Folded and flagged ADDs are recorded in self.duplicates.
+
+    trajectory_format decides how the generator output is shown to the Reflector and Curator:
+    "compact" (one line per move, see utils.trajectory.Trajectory.render) or "raw" (the message list).
+
+    With a retriever, prompts that pass a query only show the bullets relevant to it (see PlaybookRetriever);
+    without one, or without a query (the Curator), the whole playbook is shown. The Curator can be shown a
+    subset by bullet id instead (see agents.gating.CuratorGate).
+    """
+    def __init__(self, playbook='', reflection='', generatorOutput='', playbook_path="res/playbook.json", store: PlaybookStore = None, on_duplicate="fold", duplicate_threshold=0.7, trajectory_format="compact", retriever: PlaybookRetriever = None):
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown on_duplicate '{on_duplicate}', expected one of {DUPLICATE_MODES}")
         self.playbook_path = playbook_path
+        self.store = store if store is not None else JsonPlaybookStore(playbook_path)
+        self.playbook_version = 0 # Bumped on every playbook mutation, invalidates the rendered playbook
+        self._rendered = {} # key -> (playbook_version, text)
+        self.on_duplicate = on_duplicate
+        self.bullet_index = BulletIndex(threshold=duplicate_threshold)
+        self.retriever = retriever
+        self._indexed = {} # bullet id -> content as in bullet_index and retriever
+        self._transactions = 0 # depth of nested transaction() blocks
+        self.duplicates = [] # {"section", "content", "duplicate_of", "similarity", "action"} per near duplicate ADD
         self.playbook = self.readPlaybookFromFile() # Created by curator
         self.reflection = reflection # Created by reflector
-        self.generatorOutput = generatorOutput # Created by generator
+        self.reflection_tags = {} # bullet id -> {"helpful": n, "harmful": m} of the last reflection
+        self.trajectory_format = trajectory_format
+        self.setGeneratorOutput(generatorOutput) # Created by generator
         
     
     @abstractmethod
-    def getGeneratorPrompt(self, state='') -> str:
+    def getGeneratorPrompt(self, state='') -> list:
+        pass
+    
+    @abstractmethod
+    def getPlannerPrompt(self, state='') -> list:
+        pass
+    
+    @abstractmethod
+    def getPlannerTools(self) -> list:
         pass
     
     @abstractmethod
-    def getReflectorPrompt(self) -> str:
+    def getReflectorPrompt(self) -> list:
         pass
     
     @abstractmethod
-    def getCuratorPrompt(self) -> str:
+    def getCuratorPrompt(self, bullet_ids=None) -> list:
         pass
     
     @abstractmethod
-    def getGeneratorTools(self) -> str:
+    def getGeneratorTools(self) -> list:
         pass
     
     @abstractmethod
-    def getCuratorTools(self) -> str:
+    def getCuratorTools(self) -> list:
         pass
         
     def refreshPlaybook(self):
-        self.playbook = self.readPlaybookFromFile()
+        """Reloads the playbook if another writer changed the store since it was loaded or written."""
+        if self.store.changed():
+            self.playbook = self.readPlaybookFromFile()
+
+    def setPlaybook(self, playbook: dict):
+        """Replaces the playbook (e.g. from a checkpoint) and writes it to the store."""
+        self.playbook = playbook
+        self._index()
+        self.writePlaybookToFile()
         
     def setReflection(self, reflection: str):
+        """
+        Applies the bullet tags of a reflection in one pass. A batch reflection carries the tags per trajectory,
+        they are aggregated into one counter update per bullet and tag. The totals are kept in self.reflection_tags.
+        """
         self.reflection = reflection
         reflection_obj = json.loads(reflection) 
         
-        bullet_tags = reflection_obj.get("bullet_tags", [])
+        counts = Counter()
+        for tag in self._reflectionBulletTags(reflection_obj):
+            if isinstance(tag, dict) and tag.get("id") in self._bullets and tag.get("tag") in TAGS:
+                counts[(tag["id"], tag["tag"])] += 1
+        self.reflection_tags = {}
         
-        for tag in bullet_tags:
-            bullet_id = tag.get("id")
-            tag_type = tag.get("tag")
-            
-            for sec in self.playbook.get("sections", []):
-                for bp in sec.get("bulletpoints", []):
-                    if bullet_id == bp["id"]:
-                        bp[tag_type] += 1
-                        break
-        self.writePlaybookToFile()
+        with self.transaction():
+            for (bullet_id, tag_type), amount in counts.items():
+                bp = self._bullets[bullet_id]
+                bp[tag_type] = bp.get(tag_type, 0) + amount
+                self.store.increment(bullet_id, tag_type, amount)
+                self.reflection_tags.setdefault(bullet_id, dict.fromkeys(TAGS, 0))[tag_type] += amount
+        if counts:
+            self.playbook_version += 1
+
+    @staticmethod
+    def _reflectionBulletTags(reflection_obj):
+        trajectories = reflection_obj.get("trajectories")
+        if isinstance(trajectories, list):
+            return [tag for trajectory in trajectories if isinstance(trajectory, dict) for tag in trajectory.get("bullet_tags", [])]
+        return reflection_obj.get("bullet_tags", [])
         
-    def setGeneratorOutput(self, generatorOutput: str):
+    def setGeneratorOutput(self, generatorOutput, start=None, playbook_version=None, desc=None):
+        """
+        generatorOutput: the Generator messages after the prompt; start: (row, col) before the first move, if known;
+        playbook_version: the version of the playbook the episode ran on, if known; desc: the map, if known.
+        """
         self.generatorOutput = generatorOutput
+        self.generatorOutputs = [generatorOutput]
+        self.trajectories = [Trajectory.from_messages(generatorOutput, start, desc)] if isinstance(generatorOutput, list) else []
+        for trajectory in self.trajectories:
+            trajectory.playbook_version = playbook_version
+        self._trajectory_text = None
+
+    def setGeneratorOutputs(self, generatorOutputs, starts=None, playbook_versions=None, desc=None):
+        """Several episodes for one batched reflection and curation; generatorOutput is the last of them."""
+        starts = starts or [None] * len(generatorOutputs)
+        playbook_versions = playbook_versions or [None] * len(generatorOutputs)
+        self.generatorOutput = generatorOutputs[-1] if generatorOutputs else ''
+        self.generatorOutputs = list(generatorOutputs)
+        self.trajectories = [Trajectory.from_messages(output, start, desc) for output, start in zip(generatorOutputs, starts)]
+        for trajectory, version in zip(self.trajectories, playbook_versions):
+            trajectory.playbook_version = version
+        self._trajectory_text = None
+
+    def snapshot(self):
+        """
+        Read-only copy of this prompt at the current playbook version, for Generator and Reflector calls that run
+        while the Curator keeps changing this prompt (see pipeline.PipelinedExperiment). The snapshot has no store
+        and no similarity index, its playbook must not be mutated.
+        """
+        snapshot = copy.copy(self)
+        snapshot.playbook = copy.deepcopy(self.playbook)
+        snapshot.store = None
+        snapshot.bullet_index = None
+        snapshot.retriever = copy.deepcopy(self.retriever)
+        snapshot._rendered = dict(self._rendered) # renders of this version stay valid
+        snapshot._lookups()
+        return snapshot
+
+    @property
+    def trajectory(self):
+        return self.trajectories[-1] if self.trajectories else None
+
+    def getTrajectoryText(self) -> str:
+        """The generator output as it is shown to the Reflector and Curator, rendered once per episode (or batch)."""
+        if self._trajectory_text is None:
+            if len(self.trajectories) > 1:
+                self._trajectory_text = "\n\n".join(
+                    f"TRAJECTORY {i} OF {len(self.trajectories)}\n" + (trajectory.render() if self.trajectory_format == "compact" else str(output))
+                    for i, (trajectory, output) in enumerate(zip(self.trajectories, self.generatorOutputs), 1)
+                )
+            elif self.trajectory_format == "compact" and self.trajectories:
+                self._trajectory_text = self.trajectories[0].render()
+            else:
+                self._trajectory_text = '' if self.generatorOutput is None else str(self.generatorOutput)
+        return self._trajectory_text
         
-    def getPlaybookAsString(self) -> str:
+    def getPlaybookAsString(self, bullet_ids=None) -> str:
+        """The playbook as text; with bullet_ids only those bullets (in playbook order) and their sections."""
+        selected = None if bullet_ids is None else set(bullet_ids)
         out = []
+        hidden = [] # titles of the sections without a selected bullet
         for i, sec in enumerate(self.playbook.get("sections", []), 1):
+            bulletpoints = sec.get("bulletpoints", [])
             title = sec.get("title", "").strip() or f"Section {i}"
+            if selected is not None:
+                bulletpoints = [bp for bp in bulletpoints if bp.get("id") in selected]
+                if not bulletpoints:
+                    hidden.append(title)
+                    continue
             out.append(f"{i}. {title}")
-            for bp in sec.get("bulletpoints", []):
+            for bp in bulletpoints:
                 bid = bp.get("id", "")
                 content = bp.get("content", "")
                 helpful = bp.get("helpful", 0)
                 harmful = bp.get("harmful", 0)
                 out.append(f"   - [{bid}] {content.strip()}; helpful: {helpful}, harmful: {harmful}")
+        if selected is not None and len(selected) < len(self._bullets):
+            out.append(f"({len(selected)} of {len(self._bullets)} bulletpoints shown, selected for relevance to this situation)")
+            if hidden:
+                out.append("(other sections: " + ", ".join(hidden) + ")")
         return "\n".join(out)   
+
+    def selectBullets(self, query):
+        """Ids of the bullets relevant to query under the retriever's budget, None (= all) without a retriever."""
+        if self.retriever is None or query is None:
+            return None
+        return self.retriever.select(query, self._bullets)
+
+    def renderPlaybook(self, bullet_ids=None) -> str:
+        """getPlaybookAsString, rendered once per playbook version (and selection)."""
+        if bullet_ids is None:
+            return self._memoized("playbook", self.getPlaybookAsString)
+        return self._memoized(("playbook", frozenset(bullet_ids)), lambda: self.getPlaybookAsString(bullet_ids))
+
+    def getPlaybookPrefix(self, instructions: str, begin: str, end: str, empty='', query=None, bullet_ids=None) -> str:
+        """
+        The static instructions followed by the rendered playbook between the begin/end markers.
+        Built once per playbook version; volatile inputs are appended after it by the caller.
+        With a query and a retriever only the bullets relevant to the query are rendered, with bullet_ids only those.
+        """
+        if bullet_ids is None:
+            bullet_ids = self.selectBullets(query)
+        if bullet_ids is None:
+            return self._memoized(instructions, lambda: f"{instructions}{begin}\n{self.renderPlaybook() or empty}\n{end}\n\n")
+        return self._memoized((instructions, frozenset(bullet_ids)), lambda: f"{instructions}{begin}\n{self.renderPlaybook(bullet_ids) or empty}\n{end}\n\n")
+
+    def _memoized(self, key, render):
+        if len(self._rendered) > 256: # retrieved selections add keys, drop the renders of old versions
+            self._rendered = {k: v for k, v in self._rendered.items() if v[0] == self.playbook_version}
+        cached = self._rendered.get(key)
+        if cached is None or cached[0] != self.playbook_version:
+            cached = self._rendered[key] = (self.playbook_version, render())
+        return cached[1]
     
     def _find_section(self, title):
         if title is None:
             return None
-        for sec in self.playbook["sections"]:
-            if sec.get("title") == title:
-                return sec
-        return None
+        return self._sections.get(title)
+
+    def _lookups(self):
+        """Rebuilds the title -> section and bullet id -> bulletpoint lookups of the in-memory playbook."""
+        self._sections = {}
+        self._bullets = {}
+        self._bullet_sections = {}
+        for sec in self.playbook.get("sections", []):
+            if sec.get("title") is not None:
+                self._sections.setdefault(sec["title"], sec)
+            for bp in sec.get("bulletpoints", []):
+                self._bullets[bp["id"]] = bp
+                self._bullet_sections[bp["id"]] = sec
+
+    def _index(self):
+        """
+        Rebuilds the lookups of the in-memory playbook and brings the similarity and retrieval indexes in line
+        with it; only bullets that were added, removed or changed since they were indexed are (re-)indexed.
+        """
+        self._lookups()
+        for bullet_id in [bullet_id for bullet_id in self._indexed if bullet_id not in self._bullets]:
+            self._unindex(bullet_id)
+        for bullet_id, bp in self._bullets.items():
+            content = bp.get("content", "")
+            if self._indexed.get(bullet_id) != content:
+                self._reindex(bullet_id, content)
+
+    def _reindex(self, bullet_id, content):
+        self.bullet_index.update(bullet_id, content)
+        if self.retriever is not None:
+            self.retriever.update(bullet_id, content)
+        self._indexed[bullet_id] = content
+
+    def _unindex(self, bullet_id):
+        self.bullet_index.remove(bullet_id)
+        if self.retriever is not None:
+            self.retriever.remove(bullet_id)
+        del self._indexed[bullet_id]
+
+    def getBullets(self) -> dict:
+        """bullet id -> bulletpoint of the in-memory playbook, in playbook order; must not be mutated."""
+        return self._bullets
+
+    def findSimilarBullets(self, content, threshold=None, limit=5):
+        """[(bulletpoint, similarity), ...] of the bullets most similar to content."""
+        return [(self._bullets[bullet_id], similarity) for bullet_id, similarity in self.bullet_index.similar(content, threshold, limit)]
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Batches all playbook mutations inside the block into one write of the store. If the block raises, the
+        store rolls back and the in-memory playbook is reloaded from it, so both hold the same bullets again.
+        """
+        self._transactions += 1
+        try:
+            with self.store.transaction():
+                yield self
+        except BaseException:
+            if self._transactions == 1:
+                self.readPlaybookFromFile()
+            raise
+        finally:
+            self._transactions -= 1
     
     def addFromPlaybook(self, section, content):
-      sec = self._find_section(section)
-      if sec is None:
-          sec = {"title": section, "bulletpoints": []}
-          self.playbook["sections"].append(sec)
-      bullet_id = str(uuid.uuid4())
-      sec["bulletpoints"].append({"id": bullet_id, "content": content, "helpful": 0, "harmful": 0})  
-      self.writePlaybookToFile()
+      if self.on_duplicate != "add":
+          similar = self.bullet_index.similar(content, limit=1)
+          if similar:
+              duplicate_of, similarity = similar[0]
+              self.duplicates.append({"section": section, "content": content, "duplicate_of": duplicate_of, "similarity": similarity, "action": self.on_duplicate})
+              if self.on_duplicate == "fold":
+                  return duplicate_of
+      with self.transaction(): # the id check and the insert are atomic for stores shared by several writers
+          sec = self._find_section(section)
+          if sec is None:
+              sec = {"title": section, "bulletpoints": []}
+              self.playbook["sections"].append(sec)
+              self._sections[section] = sec
+          bullet_id = self._new_bullet_id(section, content)
+          bp = {"id": bullet_id, "content": content, "helpful": 0, "harmful": 0}
+          sec.setdefault("bulletpoints", []).append(bp)
+          self._bullets[bullet_id] = bp
+          self._bullet_sections[bullet_id] = sec
+          self._reindex(bullet_id, content)
+          self.store.add_bullet(section, bp)
+      self.playbook_version += 1
+      return bullet_id
     
+    def _new_bullet_id(self, section, content) -> str:
+        """
+        uuid5 of section and content, so a seeded run sends the same prompts again and can be replayed from a
+        response cache (see clients.CachedClient); a counter tells repeated contents apart, also from the bullets
+        other writers of a shared store added.
+        """
+        name, n = f"{section}\n{content}", 0
+        while True:
+            bullet_id = str(uuid.uuid5(BULLET_NAMESPACE, name if n == 0 else f"{name}\n{n}"))
+            if bullet_id not in self._bullets and not self.store.has_bullet(bullet_id):
+                return bullet_id
+            n += 1
+
     def removeFromPlaybook(self, bullet_id):
-        for sec in self.playbook["sections"]:
-            new_bullets = []
-            removed = False
-            for bp in sec["bulletpoints"]:
-                if bullet_id == bp["id"]:
-                    removed = True
-                    continue
-                new_bullets.append(bp)
-            if removed:
-                sec["bulletpoints"] = new_bullets
-        self.writePlaybookToFile()    
+        bp = self._bullets.get(bullet_id)
+        if bp is None:
+            return
+        with self.transaction():
+            del self._bullets[bullet_id]
+            sec = self._bullet_sections.pop(bullet_id)
+            sec["bulletpoints"] = [b for b in sec["bulletpoints"] if b is not bp]
+            self._unindex(bullet_id)
+            self.store.remove_bullet(bullet_id)
+        self.playbook_version += 1
     
     def modifyFromPlaybook(self, bullet_id, content):
-        for sec in self.playbook["sections"]:
-            for bp in sec["bulletpoints"]:
-                if bullet_id == bp["id"]:
-                    bp["content"] = content
-        self.writePlaybookToFile()
+        bp = self._bullets.get(bullet_id)
+        if bp is None:
+            return
+        with self.transaction():
+            bp["content"] = content
+            self._reindex(bullet_id, content)
+            self.store.update_content(bullet_id, content)
+        self.playbook_version += 1
     
     def readPlaybookFromFile(self):
-        try:
-            with open(self.playbook_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                if not content.strip():
-                    return {"sections": [{}]}
-                return json.loads(content)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"sections": []}
+        self.playbook = self.store.load()
+        self._index()
+        self.playbook_version += 1
+        return self.playbook
         
     def writePlaybookToFile(self):
-        with open(self.playbook_path, 'w', encoding='utf-8') as file:
-            json.dump(self.playbook, file, indent=4)    
-            
\ No newline at end of file
+        """Saves the in-memory playbook, which add/modify/remove already keep indexed (see setPlaybook to replace it)."""
+        self.store.save(self.playbook)
+        self.playbook_version += 1
+
+    def exportPlaybookToJson(self, path):
+        """Writes the stored playbook in the res/playbook.json format, independent of the store backend."""
+        self.store.export_json(path)
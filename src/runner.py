@@ -0,0 +1,281 @@
+"""
+Headless replacement of the run.ipynb loop. Runs every combination of --maps, --seeds and --models as an
+independent experiment on a process pool. Each run lives in its own directory under --out:
+
+    <out>/<run_id>/playbook.json     the run's playbook (seeded from --playbook)
+    <out>/<run_id>/checkpoint.json   loop state after the last completed stage
+    <out>/<run_id>/telemetry.jsonl   one line per LLM call
+    <out>/<run_id>/trajectories/     every episode, see utils.trajectory.TrajectoryStore
+
+The checkpoint is rewritten atomically after every stage, restarting the same command resumes every run
+at the stage after the last completed one (finished runs are skipped). --fresh discards old checkpoints.
+
+Run from src/:
+    python runner.py --maps small_map medium_map --seeds 0 1 2 --iterations 10 --workers 6
+    python runner.py --client offline --maps big_map --seeds 0 1 2 3 --iterations 5
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from agents.budget import CYCLE_ACTIONS, EpisodeBudget
+from agents.context import CONTEXT_POLICIES
+from agents.gating import CuratorGate
+from agents.routing import ModelRouter
+from environments.FrozenLake import FrozenLake
+from environments.StateEncoder import ENCODINGS
+from environments.maps import MAPS
+from experiment import Experiment, STAGES
+from prompts.FrozenLakePrompt import FrozenLakePrompt
+from prompts.PlaybookRetriever import PlaybookRetriever
+from utils.telemetry import Telemetry
+from utils.trajectory import TrajectoryStore
+
+CHECKPOINT_VERSION = 5
+
+
+def run_id(map_name, seed, model) -> str:
+    return f"{map_name}-seed{seed}-{model.replace('/', '_')}"
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return checkpoint if checkpoint.get("version") == CHECKPOINT_VERSION else None
+
+
+def write_checkpoint(path, checkpoint):
+    """Atomic replace, a crash leaves either the previous or the new checkpoint."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def next_stage(checkpoint):
+    """(iteration, stage index) that has to run next."""
+    if checkpoint is None or checkpoint["stage"] is None:
+        return (0 if checkpoint is None else checkpoint["iteration"]), 0
+    index = STAGES.index(checkpoint["stage"]) + 1
+    if index == len(STAGES):
+        return checkpoint["iteration"] + 1, 0
+    return checkpoint["iteration"], index
+
+
+def make_client(spec):
+    if spec["client"] == "offline":
+        from clients.OfflineClient import OfflineClient
+        client = OfflineClient(latency=spec["latency"], seed=spec["seed"])
+    else:
+        from clients.RateLimitedClient import RateLimitedClient, make_openai_client
+        client = make_openai_client(spec["base_url"], os.getenv(spec["api_key_env"]), timeout=spec["timeout"])
+        # The account quota is shared by all worker processes
+        client = RateLimitedClient(client, rpm=spec["rpm"], tpm=spec["tpm"], max_retries=spec["max_retries"], timeout=spec["timeout"])
+    if spec["cache_dir"]:
+        from clients.CachedClient import CachedClient
+        client = CachedClient(client, cache_dir=spec["cache_dir"])
+    return client
+
+
+def run_experiment(spec: dict) -> dict:
+    """Runs (or resumes) one experiment in the current process and returns its summary."""
+    run_dir = os.path.join(spec["out"], spec["run_id"])
+    os.makedirs(run_dir, exist_ok=True)
+    checkpoint_path = os.path.join(run_dir, "checkpoint.json")
+    playbook_path = os.path.join(run_dir, "playbook.json")
+    trajectories_path = os.path.join(run_dir, "trajectories")
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        shutil.rmtree(trajectories_path, ignore_errors=True) # episodes of a run without (compatible) checkpoint are not kept
+        if spec["playbook"] and os.path.exists(spec["playbook"]):
+            shutil.copy(spec["playbook"], playbook_path)
+
+    game = FrozenLake.from_map(MAPS[spec["map"]], success_rate=spec["success_rate"], engine=spec["engine"], encoding=spec["encoding"])
+    telemetry_path = os.path.join(run_dir, "telemetry.jsonl")
+    telemetry = Telemetry(jsonl_path=telemetry_path)
+    retriever = PlaybookRetriever(k=spec["retrieve_k"], max_tokens=spec["retrieve_tokens"]) if spec["retrieve_k"] else None
+    prompt = FrozenLakePrompt(playbook_path=playbook_path, retriever=retriever)
+    router = ModelRouter(spec["small_model"], spec["model"], safe_distance=spec["safe_distance"]) if spec["small_model"] else None
+    experiment = Experiment(make_client(spec), game, prompt, model=spec["model"], context_policy=CONTEXT_POLICIES[spec["context"]](), telemetry=telemetry,
+                            trajectory_store=TrajectoryStore(trajectories_path), batch_size=spec["batch_size"], generator_mode=spec["generator_mode"],
+                            generator_stream=spec["stream"], budget=EpisodeBudget(spec["max_steps"], spec["max_prompt_tokens"], spec["max_seconds"], spec["cycle_limit"], spec["on_cycle"]),
+                            router=router, curator_gate=CuratorGate(threshold=spec["gate_threshold"]) if spec["curator_gate"] else None)
+    if checkpoint is not None:
+        experiment.restore(checkpoint["state"])
+
+    iteration, stage_index = next_stage(checkpoint)
+    try:
+        while iteration < spec["iterations"]:
+            telemetry.iteration = iteration + 1
+            for stage in STAGES[stage_index:]:
+                experiment.run_stage(stage, seed=spec["seed"] + iteration * spec["batch_size"])
+                checkpoint = {
+                    "version": CHECKPOINT_VERSION,
+                    "run_id": spec["run_id"],
+                    "iteration": iteration,
+                    "stage": stage,
+                    "time": time.time(),
+                    "state": experiment.state(),
+                }
+                write_checkpoint(checkpoint_path, checkpoint)
+            iteration, stage_index = iteration + 1, 0
+    finally:
+        game.close()
+        telemetry.close()
+
+    scores = experiment.scores
+    models = [model for episode in experiment.step_models for model in episode]
+    return {
+        "run_id": spec["run_id"],
+        "episodes": len(experiment.steps),
+        "success_rate": sum(score["success"] for score in scores) / len(scores) if scores else 0.0,
+        "optimal_success_probability": scores[0]["optimal_success_probability"] if scores else 0.0,
+        "mean_steps": sum(experiment.steps) / len(experiment.steps) if experiment.steps else 0.0,
+        "stopped": sum(reason not in ("terminated", "error") for reason in experiment.end_reasons),
+        "small_model_share": sum(model == spec["small_model"] for model in models) / len(models) if models else 0.0,
+        "curator_gate": experiment.curator_gate.summary() if experiment.curator_gate is not None else None,
+        "bullets": sum(len(sec.get("bulletpoints", [])) for sec in prompt.playbook.get("sections", [])),
+        "telemetry_path": telemetry_path, # every LLM call of the run, including earlier (resumed) processes
+    }
+
+
+def build_specs(args, workers):
+    specs = []
+    for map_name, seed, model in itertools.product(args.maps, args.seeds, args.models):
+        specs.append({
+            "run_id": run_id(map_name, seed, model),
+            "map": map_name,
+            "seed": seed,
+            "model": model,
+            "iterations": args.iterations,
+            "batch_size": args.batch_size,
+            "generator_mode": args.generator_mode,
+            "stream": args.stream,
+            "max_steps": args.max_steps,
+            "max_prompt_tokens": args.max_prompt_tokens,
+            "max_seconds": args.max_seconds,
+            "cycle_limit": args.cycle_limit,
+            "on_cycle": args.on_cycle,
+            "retrieve_k": args.retrieve_k,
+            "retrieve_tokens": args.retrieve_tokens,
+            "small_model": args.small_model,
+            "safe_distance": args.safe_distance,
+            "curator_gate": args.curator_gate,
+            "gate_threshold": args.gate_threshold,
+            "success_rate": args.success_rate,
+            "engine": args.engine,
+            "encoding": args.encoding,
+            "context": args.context,
+            "client": args.client,
+            "latency": args.latency,
+            "base_url": args.base_url,
+            "api_key_env": args.api_key_env,
+            "cache_dir": args.cache_dir,
+            "rpm": args.rpm / workers if args.rpm else None,
+            "tpm": args.tpm / workers if args.tpm else None,
+            "max_retries": args.max_retries,
+            "timeout": args.timeout,
+            "playbook": args.playbook,
+            "out": args.out,
+        })
+    return specs
+
+
+def run_all(specs, workers):
+    """Runs the specs on a process pool; a failing run is reported and does not stop the others."""
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_experiment, spec): spec["run_id"] for spec in specs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append((futures[future], repr(e)))
+                print(f"== {futures[future]} failed: {e!r} (rerun to resume from its last checkpoint)")
+                continue
+            results.append(result)
+            print(f"== {result['run_id']} finished")
+    return sorted(results, key=lambda result: result["run_id"]), failures
+
+
+def print_report(results, failures):
+    print(f"{'run':<48} {'episodes':>10} {'success':>8} {'optimal':>8} {'steps':>7} {'stopped':>8} {'small':>6} {'bullets':>8}")
+    for result in results:
+        print(f"{result['run_id']:<48} {result['episodes']:>10} {result['success_rate']:>8.2f} {result['optimal_success_probability']:>8.2f} "
+              f"{result['mean_steps']:>7.1f} {result['stopped']:>8} {result['small_model_share']:>6.0%} {result['bullets']:>8}")
+        gate = result["curator_gate"]
+        if gate is not None:
+            print(f"{'':<48} curator skipped {gate['skipped']}/{gate['reviews']} ({gate['skip_rate']:.0%}), ~{gate['tokens_saved']} prompt tokens saved")
+    for name, error in failures:
+        print(f"{name:<48} FAILED {error}")
+    for result in results:
+        print(f"\n== {result['run_id']}: LLM calls per iteration")
+        Telemetry.load(result["telemetry_path"]).print_summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", nargs="+", choices=sorted(MAPS), default=["small_map"])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--models", nargs="+", default=["openai/gpt-oss-120b"])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1, help="Episodes per iteration, reflected and curated together")
+    parser.add_argument("--generator-mode", choices=["step", "plan"], default="step", help="One LLM call per move or plan-and-execute")
+    parser.add_argument("--stream", action="store_true", help="Stream generator completions and dispatch moves as soon as they are complete")
+    parser.add_argument("--max-steps", type=int, default=None, help="Moves per episode")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, help="Generator prompt tokens per episode")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Wall time per episode")
+    parser.add_argument("--cycle-limit", type=int, default=None, help="Repetitions of the same move from the same position that count as a cycle")
+    parser.add_argument("--on-cycle", choices=CYCLE_ACTIONS, default="stop", help="End the episode or warn the model once first")
+    parser.add_argument("--retrieve-k", type=int, default=None, help="Show the Generator and Reflector only the k most relevant bullets (BM25)")
+    parser.add_argument("--retrieve-tokens", type=int, default=1500, help="Token budget of the retrieved bullets")
+    parser.add_argument("--small-model", default=None, help="Serve generator calls from safe states with this model, see agents.routing")
+    parser.add_argument("--safe-distance", type=int, default=2, help="Moves to the nearest hole from which a state counts as safe")
+    parser.add_argument("--curator-gate", action="store_true", help="Skip the Curator for reflections without anything new, see agents.gating")
+    parser.add_argument("--gate-threshold", type=float, default=0.6, help="Shingle containment from which a reflection sentence counts as known")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="res/runs", help="Directory of the run directories")
+    parser.add_argument("--fresh", action="store_true", help="Discard existing checkpoints and playbooks of these runs")
+    parser.add_argument("--playbook", default="res/playbook.json", help="Initial playbook of every run")
+    parser.add_argument("--success-rate", type=float, default=0.7)
+    parser.add_argument("--engine", choices=["gym", "tabular"], default="gym")
+    parser.add_argument("--encoding", choices=sorted(ENCODINGS), default="grid", help="State encoding, see environments.StateEncoder")
+    parser.add_argument("--context", choices=sorted(CONTEXT_POLICIES), default="full", help="Generator context policy")
+    parser.add_argument("--client", choices=["openai", "offline"], default="openai")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency of the offline client")
+    parser.add_argument("--base-url", default="https://openrouter.ai/api/v1")
+    parser.add_argument("--api-key-env", default="OPENROUTER_API_KEY", help="Environment variable holding the API key")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests per minute of the account, split evenly across workers")
+    parser.add_argument("--tpm", type=float, default=None, help="Tokens per minute of the account, split evenly across workers")
+    parser.add_argument("--max-retries", type=int, default=6, help="Retries of rate limited, timed out or 5xx calls")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds per LLM call")
+    parser.add_argument("--cache-dir", default=None, help="Cache LLM responses in this directory (see clients.CachedClient)")
+    args = parser.parse_args()
+
+    workers = max(1, min(args.workers, len(args.maps) * len(args.seeds) * len(args.models)))
+    specs = build_specs(args, workers)
+    if args.fresh:
+        for spec in specs:
+            shutil.rmtree(os.path.join(args.out, spec["run_id"]), ignore_errors=True)
+    pending = []
+    for spec in specs:
+        checkpoint = read_checkpoint(os.path.join(args.out, spec["run_id"], "checkpoint.json"))
+        if checkpoint is not None and next_stage(checkpoint)[0] >= spec["iterations"]:
+            print(f"== {spec['run_id']} already finished, skipping")
+            continue
+        pending.append(spec)
+    results, failures = run_all(pending, workers)
+    print_report(results, failures)
+
+
+if __name__ == "__main__":
+    main()
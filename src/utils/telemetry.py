@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+class NullTelemetry:
+    """Disabled telemetry. Agents check `enabled` before timing anything, so this costs one attribute lookup per call."""
+    enabled = False
+    iteration = None
+
+    def record(self, agent, model, completion=None, latency=0.0, step=None, tool_calls=0, tool_time=0.0, time_to_action=None):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+def usage_tokens(completion):
+    """(prompt, completion, cached) tokens from response.usage, zeros if the response has no usage."""
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0, cached or 0
+
+
+class Telemetry(NullTelemetry):
+    """
+    Records one entry per LLM call: agent, iteration, step, model, prompt/completion/cached tokens, wall latency,
+    number of tool calls, tool execution time and (generator) time to the first tool dispatch.
+
+    Args:
+        jsonl_path: Every record is appended to this file as one JSON line (optional).
+        prometheus_path: Aggregated counters are written to this file in the Prometheus textfile format
+            on write_prometheus() and close() (optional).
+    """
+    enabled = True
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self._local = threading.local()
+        self.iteration = None # Set by the caller, e.g. Experiment.run_iteration
+        self.records = []
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._file = None
+        if jsonl_path is not None:
+            os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+            self._file = open(jsonl_path, 'a', encoding='utf-8', buffering=1)
+
+    @classmethod
+    def load(cls, jsonl_path):
+        """Telemetry with the records of a jsonl file written earlier, e.g. by a run in another process."""
+        telemetry = cls()
+        with open(jsonl_path, 'r', encoding='utf-8') as file:
+            telemetry.records = [json.loads(line) for line in file if line.strip()]
+        return telemetry
+
+    @property
+    def iteration(self):
+        """Per thread, so concurrent stages (pipeline.PipelinedExperiment) label their records with their own iteration."""
+        return getattr(self._local, "iteration", self._iteration)
+
+    @iteration.setter
+    def iteration(self, value):
+        self._local.iteration = value
+        self._iteration = value # default of threads that never set one
+
+    def record(self, agent, model, completion=None, latency=0.0, step=None, tool_calls=0, tool_time=0.0, time_to_action=None):
+        prompt_tokens, completion_tokens, cached_tokens = usage_tokens(completion)
+        entry = {
+            "time": time.time(),
+            "agent": agent,
+            "iteration": self.iteration,
+            "step": step,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "latency": latency,
+            "tool_calls": tool_calls,
+            "tool_time": tool_time,
+            "time_to_action": time_to_action, # Streaming generator: seconds until the first tool call was dispatched
+        }
+        with self._lock:
+            self.records.append(entry)
+            if self._file is not None:
+                self._file.write(json.dumps(entry) + "\n")
+
+    def summary(self):
+        """Per iteration and agent totals: {iteration: {agent: {...}}}."""
+        totals = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        for entry in self.records:
+            row = totals[entry["iteration"]][entry["agent"]]
+            row["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "latency", "tool_calls", "tool_time"):
+                row[key] += entry[key]
+        return totals
+
+    def print_summary(self):
+        print(f"{'iteration':>9} {'agent':<10} {'calls':>6} {'prompt':>9} {'cached':>9} {'completion':>10} {'latency [s]':>11} {'tools':>6} {'tool [s]':>9}")
+        for iteration, agents in self.summary().items():
+            for agent, row in agents.items():
+                print(f"{str(iteration):>9} {agent:<10} {int(row['calls']):>6} {int(row['prompt_tokens']):>9} {int(row['cached_tokens']):>9} "
+                      f"{int(row['completion_tokens']):>10} {row['latency']:>11.2f} {int(row['tool_calls']):>6} {row['tool_time']:>9.3f}")
+
+    def write_prometheus(self, path=None):
+        """Writes counters per agent and model for the node exporter textfile collector (atomically replaced)."""
+        path = path or self.prometheus_path
+        if path is None:
+            return
+        totals = defaultdict(lambda: defaultdict(float))
+        for entry in self.records:
+            row = totals[(entry["agent"], entry["model"])]
+            row["llm_calls_total"] += 1
+            row["llm_prompt_tokens_total"] += entry["prompt_tokens"]
+            row["llm_completion_tokens_total"] += entry["completion_tokens"]
+            row["llm_cached_tokens_total"] += entry["cached_tokens"]
+            row["llm_latency_seconds_total"] += entry["latency"]
+            row["llm_tool_calls_total"] += entry["tool_calls"]
+            row["llm_tool_seconds_total"] += entry["tool_time"]
+
+        lines = []
+        metrics = ("llm_calls_total", "llm_prompt_tokens_total", "llm_completion_tokens_total", "llm_cached_tokens_total",
+                   "llm_latency_seconds_total", "llm_tool_calls_total", "llm_tool_seconds_total")
+        for metric in metrics:
+            lines.append(f"# TYPE {metric} counter")
+            for (agent, model), row in totals.items():
+                lines.append(f'{metric}{{agent="{agent}",model="{model}"}} {row[metric]}')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self.write_prometheus()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,15 @@
+import json
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception: # tiktoken is optional, fall back to the usual ~4 characters per token estimate
+    _ENCODING = None
+
+def estimate_tokens(text) -> int:
+    """Counts the tokens of a string (or of the JSON form of messages) with tiktoken if available, else estimates them."""
+    if not isinstance(text, str):
+        text = json.dumps(text, default=str, ensure_ascii=False)
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
@@ -0,0 +1,318 @@
+import json
+import os
+
+import numpy as np
+
+ACTIONS = ("move_left", "move_down", "move_right", "move_up") # Index = Move value
+NO_ACTION = -1 # The model answered without a (valid) tool call
+
+OUTCOMES = ("unfinished", "goal", "hole", "error")
+# Why an episode ended: the environment terminated it, a tool failed, no end was recorded, or a bound of
+# agents.budget.EpisodeBudget stopped it
+END_REASONS = ("terminated", "error", "unfinished", "max_steps", "max_prompt_tokens", "max_seconds", "cycle")
+
+STEP_DTYPE = np.dtype([
+    ("episode", np.int32),
+    ("step", np.int32),
+    ("action", np.int8),
+    ("row", np.int16),
+    ("col", np.int16),
+    ("slipped", np.bool_),
+    ("reward", np.float32),
+    ("terminated", np.bool_),
+    ("reasoning_offset", np.int64), # Byte range of the reasoning in reasoning.txt
+    ("reasoning_length", np.int32),
+    ("model", np.int16), # Line of models.txt of the model that chose the move, -1 if unknown
+])
+
+EPISODE_DTYPE = np.dtype([
+    ("episode", np.int32),
+    ("first_step", np.int64), # Row of the first step in steps.bin
+    ("n_steps", np.int32),
+    ("outcome", np.int8), # Index into OUTCOMES
+    ("start_row", np.int16),
+    ("start_col", np.int16),
+    ("reasoning_end", np.int64), # Size of reasoning.txt after this episode
+    ("end_reason", np.int8), # Index into END_REASONS
+    ("playbook_version", np.int64), # Version of the playbook the episode ran on, -1 if unknown
+])
+
+STORE_VERSION = 1 # Bump with every change of the store layout that the dtypes do not show
+
+
+def store_format() -> dict:
+    """Contents of format.json: the store version and the record layouts."""
+    return {
+        "version": STORE_VERSION,
+        "steps": [list(field) for field in STEP_DTYPE.descr],
+        "episodes": [list(field) for field in EPISODE_DTYPE.descr],
+    }
+
+
+def map_rows(desc) -> list:
+    """Rows of a map desc (gym's byte array or rows of strings) as strings."""
+    return ["".join(cell.decode() if isinstance(cell, bytes) else cell for cell in row) for row in desc]
+
+
+class Trajectory:
+    """
+    One Generator episode as columns, one entry per move: action (index into ACTIONS), position after the move,
+    slip flag, reward, terminated flag, the reasoning the model gave before the move (its reasoning field followed
+    by its content) and the model that chose it.
+    The grid state of every tool result is dropped, the position is enough to reconstruct it from the map,
+    which is rendered once at the top if known.
+    """
+    def __init__(self, start=None, desc=None):
+        self.start = start # (row, col) before the first move, if known
+        self.desc = None if desc is None else map_rows(desc) # rows of the map, if known
+        self.action = []
+        self.row = []
+        self.col = []
+        self.slipped = []
+        self.reward = []
+        self.terminated = []
+        self.reasoning = []
+        self.model = [] # Model that served the move, None if unknown
+        self.error = None
+        self.stop_reason = None # Set if the Generator stopped the episode early (budget or cycle)
+        self.playbook_version = None # Prompt.playbook_version the episode ran on, if known
+
+    def __len__(self):
+        return len(self.action)
+
+    def append(self, action, position, slipped, reward, terminated, reasoning="", model=None):
+        self.action.append(action)
+        self.row.append(position[0])
+        self.col.append(position[1])
+        self.slipped.append(bool(slipped))
+        self.reward.append(float(reward))
+        self.terminated.append(bool(terminated))
+        self.reasoning.append(reasoning or "")
+        self.model.append(model)
+
+    @classmethod
+    def from_messages(cls, contextMessage, start=None, desc=None):
+        """Parses a Generator contextMessage (with or without the leading generator prompt)."""
+        trajectory = cls(start, desc)
+        reasoning, position, acted, model = "", start or (-1, -1), True, None
+        for message in contextMessage:
+            role = message.get("role")
+            if role == "assistant":
+                if not acted: # the previous answer had no tool call
+                    trajectory.append(NO_ACTION, position, False, 0.0, False, reasoning, model)
+                reasoning = "\n".join(part for part in (message.get("reasoning"), message.get("content")) if part)
+                acted, model = False, message.get("model")
+            elif role == "tool":
+                try:
+                    result = json.loads(message["content"])
+                except (TypeError, ValueError):
+                    continue
+                name = message.get("tool_name")
+                position = tuple(result.get("position") or position)
+                trajectory.append(ACTIONS.index(name) if name in ACTIONS else NO_ACTION, position, result.get("slipped", False),
+                                  result.get("reward", 0.0), result.get("isTerminated", False), reasoning, model)
+                reasoning, acted = "", True
+            elif role == "system" and len(trajectory) + (not acted) > 0:
+                trajectory.error = message.get("content")
+            elif message.get("end_reason"):
+                trajectory.stop_reason = message["end_reason"]
+        if not acted:
+            trajectory.append(NO_ACTION, position, False, 0.0, False, reasoning, model)
+        return trajectory
+
+    @property
+    def outcome(self) -> str:
+        if self.error is not None:
+            return "error"
+        if not self.terminated or not self.terminated[-1]:
+            return "unfinished"
+        return "goal" if self.reward[-1] > 0 else "hole"
+
+    @property
+    def end_reason(self) -> str:
+        if self.stop_reason is not None:
+            return self.stop_reason
+        if self.error is not None:
+            return "error"
+        return "unfinished" if self.outcome == "unfinished" else "terminated"
+
+    def render(self, max_reasoning=None) -> str:
+        """
+        Compact text for the Reflector and Curator: one line per move with the reasoning that led to it.
+        max_reasoning truncates the reasoning of every step to that many characters.
+        """
+        lines = [f"EPISODE: {len(self)} moves, outcome: {self.outcome}, slips: {sum(self.slipped)}, total reward: {sum(self.reward):g}"]
+        if self.stop_reason is not None:
+            lines.append(f"STOPPED EARLY: {self.stop_reason} (the episode was cut off before reaching a terminal state)")
+        if self.desc is not None:
+            lines.append("map (S start, F frozen, H hole, G goal; positions are (row,col) from the top left (0,0)):")
+            lines += [f"   {row}" for row in self.desc]
+        if self.start is not None:
+            lines.append(f"start at ({self.start[0]},{self.start[1]})")
+        for i in range(len(self)):
+            reasoning = " ".join(self.reasoning[i].split())
+            if max_reasoning is not None and len(reasoning) > max_reasoning:
+                reasoning = reasoning[:max_reasoning] + "..."
+            action = ACTIONS[self.action[i]] if self.action[i] != NO_ACTION else "no move (no valid tool call)"
+            result = f"({self.row[i]},{self.col[i]})"
+            if self.slipped[i]:
+                result += " SLIPPED"
+            if self.terminated[i]:
+                result += f" END reward={self.reward[i]:g}"
+            lines.append(f"{i + 1}. reasoning: {reasoning or '-'}")
+            lines.append(f"   {action} -> {result}")
+        if self.error is not None:
+            lines.append(f"ERROR: {self.error}")
+        return "\n".join(lines)
+
+
+class TrajectoryStore:
+    """
+    Append-only on-disk columnar store of trajectories for analysis across many episodes.
+
+        <path>/steps.bin      STEP_DTYPE records, one per move
+        <path>/episodes.bin   EPISODE_DTYPE records, one per episode, written last (an episode exists once its record does)
+        <path>/reasoning.txt  utf-8 reasoning texts, referenced by byte range
+        <path>/models.txt     model names, one per line, referenced by line
+        <path>/format.json    store version and record layouts, see store_format()
+
+    steps() and episodes() memory-map the files, so thousands of episodes can be analysed with NumPy
+    without loading them. One writer per store. A store written in another format is refused with a ValueError
+    instead of being read back as garbage records.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._check_format()
+        self._steps_path = os.path.join(path, "steps.bin")
+        self._episodes_path = os.path.join(path, "episodes.bin")
+        self._reasoning_path = os.path.join(path, "reasoning.txt")
+        self._models_path = os.path.join(path, "models.txt")
+        self.models = self._read_models()
+        self.truncate(len(self)) # drops steps of an episode whose write was interrupted
+
+    def _check_format(self):
+        format_path = os.path.join(self.path, "format.json")
+        expected = store_format()
+        if os.path.exists(format_path):
+            with open(format_path, "r", encoding="utf-8") as file:
+                found = json.load(file)
+            if found != expected:
+                raise ValueError(f"Trajectory store {self.path} was written in another format (version {found.get('version')}), "
+                                 f"expected version {STORE_VERSION} with the current record layouts")
+            return
+        if any(os.path.exists(os.path.join(self.path, name)) for name in ("steps.bin", "episodes.bin")):
+            raise ValueError(f"Trajectory store {self.path} has no format.json, it was written by an older version")
+        with open(format_path, "w", encoding="utf-8") as file:
+            json.dump(expected, file, indent=1)
+
+    def __len__(self):
+        return self._count(self._episodes_path, EPISODE_DTYPE)
+
+    @staticmethod
+    def _count(path, dtype):
+        return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+    @staticmethod
+    def _map(path, dtype):
+        count = TrajectoryStore._count(path, dtype)
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def _read_models(self) -> list:
+        if not os.path.exists(self._models_path):
+            return []
+        with open(self._models_path, "r", encoding="utf-8") as file:
+            return file.read().splitlines()
+
+    def _model_index(self, model) -> int:
+        """Line of model in models.txt, appended if new; -1 for an unknown model."""
+        if model is None:
+            return -1
+        if model not in self.models:
+            with open(self._models_path, "a", encoding="utf-8") as file:
+                file.write(model + "\n")
+            self.models.append(model)
+        return self.models.index(model)
+
+    def steps(self) -> np.ndarray:
+        return self._map(self._steps_path, STEP_DTYPE)[:self._steps_end(len(self))]
+
+    def episodes(self) -> np.ndarray:
+        return self._map(self._episodes_path, EPISODE_DTYPE)
+
+    def append(self, trajectory: Trajectory) -> int:
+        """Writes one trajectory, returns its episode index."""
+        episode = len(self)
+        first_step = self._steps_end(episode)
+        reasoning_offset = os.path.getsize(self._reasoning_path) if os.path.exists(self._reasoning_path) else 0
+
+        texts = [text.encode("utf-8") for text in trajectory.reasoning]
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        steps = np.zeros(len(trajectory), dtype=STEP_DTYPE)
+        steps["episode"] = episode
+        steps["step"] = np.arange(len(trajectory))
+        steps["action"] = trajectory.action
+        steps["row"] = trajectory.row
+        steps["col"] = trajectory.col
+        steps["slipped"] = trajectory.slipped
+        steps["reward"] = trajectory.reward
+        steps["terminated"] = trajectory.terminated
+        steps["reasoning_offset"] = reasoning_offset + np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(texts) else 0
+        steps["reasoning_length"] = lengths
+        steps["model"] = [self._model_index(model) for model in trajectory.model]
+
+        record = np.zeros(1, dtype=EPISODE_DTYPE)
+        record["episode"] = episode
+        record["first_step"] = first_step
+        record["n_steps"] = len(trajectory)
+        record["outcome"] = OUTCOMES.index(trajectory.outcome)
+        record["start_row"], record["start_col"] = trajectory.start if trajectory.start is not None else (-1, -1)
+        record["reasoning_end"] = reasoning_offset + int(lengths.sum())
+        record["end_reason"] = END_REASONS.index(trajectory.end_reason)
+        record["playbook_version"] = -1 if trajectory.playbook_version is None else trajectory.playbook_version
+
+        with open(self._reasoning_path, "ab") as file:
+            file.write(b"".join(texts))
+        with open(self._steps_path, "ab") as file:
+            file.write(steps.tobytes())
+        with open(self._episodes_path, "ab") as file:
+            file.write(record.tobytes())
+        return episode
+
+    def load(self, episode: int) -> Trajectory:
+        record = self.episodes()[episode]
+        steps = self.steps()[record["first_step"]:record["first_step"] + record["n_steps"]]
+        trajectory = Trajectory(None if record["start_row"] < 0 else (int(record["start_row"]), int(record["start_col"])))
+        with open(self._reasoning_path, "rb") as file:
+            for step in steps:
+                file.seek(int(step["reasoning_offset"]))
+                reasoning = file.read(int(step["reasoning_length"])).decode("utf-8")
+                model = self.models[step["model"]] if step["model"] >= 0 else None
+                trajectory.append(int(step["action"]), (int(step["row"]), int(step["col"])), step["slipped"], step["reward"], step["terminated"], reasoning, model)
+        if OUTCOMES[record["outcome"]] == "error":
+            trajectory.error = "tool execution failed"
+        if END_REASONS[record["end_reason"]] not in ("terminated", "error", "unfinished"):
+            trajectory.stop_reason = END_REASONS[record["end_reason"]]
+        if record["playbook_version"] >= 0:
+            trajectory.playbook_version = int(record["playbook_version"])
+        return trajectory
+
+    def truncate(self, n_episodes: int):
+        """Drops every episode from n_episodes on, e.g. to roll back to a checkpoint."""
+        ends = [(self._episodes_path, n_episodes * EPISODE_DTYPE.itemsize),
+                (self._steps_path, self._steps_end(n_episodes) * STEP_DTYPE.itemsize),
+                (self._reasoning_path, self._reasoning_end(n_episodes))]
+        for path, size in ends:
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _steps_end(self, n_episodes):
+        if n_episodes == 0:
+            return 0
+        record = self.episodes()[n_episodes - 1]
+        return int(record["first_step"] + record["n_steps"])
+
+    def _reasoning_end(self, n_episodes):
+        return int(self.episodes()[n_episodes - 1]["reasoning_end"]) if n_episodes else 0